@@ -1,187 +1,545 @@
 # ------------------- imports -------------------
-from flask import Flask
-from flask_socketio import SocketIO, emit
+from arranque import arranque   # primero: marca el inicio del proceso
+from flask import Flask, Response, abort, jsonify, request, send_file
 from flask_cors import CORS
-import cv2, base64, threading, time, random, os
-from PIL import Image
-from dj_ai2 import analizar_ambiente, generar_voz_dj
+import base64, functools, time, os
+import dj_ai2
+from dj_ai2 import (analizar_ambiente, generar_frase, sintetizar_voz,
+                    sintetizar_voz_stream, FRASE_RESPALDO, VOICE_IDS, TTS_MODEL_ID)
+from sesiones import Salas, Planificador
+from cache_voz import CacheVoz, clave, situacion
+from banco_frases import BancoFrases
+from historial import historial, HISTORIAL_PUNTOS
+from pipeline import POOL_VISION, POOL_VOZ, POOL_SPOTIFY, lanzar, tiempos
+import presupuesto
+import metricas
+from metricas import perfilador
+import transporte
+from transporte import emit, join_room, leave_room, sid_actual
 
-# ---- Spotipy ----------------------------------
-from spotipy import Spotify
-from spotipy.oauth2 import SpotifyOAuth
-from spotipy.exceptions import SpotifyException
+# ---- Spotify ----------------------------------
+from spotify_controller import cargar_generos
+import spotify_controller
 
 # ----------------- Flask / Socket.IO ----------
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'tu_clave_secreta_super_segura'
 CORS(app, origins="*")
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = transporte.crear(app)   # SERVIDOR_MODO=dev (Werkzeug) | asgi (uvicorn)
+socketio.emit = metricas.medir_emisiones(socketio.emit)
 
-# ------------ Spotify setup --------------------
-PLAYLIST_ID = "37i9dQZF1DX9C8KzGEUKV4"
+# ------------ grabación / replay ---------------
+# GRABAR_EN=<dir> graba la sesión en vivo; REPLAY_DE=<dir> la reproduce con
+# dobles locales (cámara, Gemini, ElevenLabs y Spotify). Ver grabacion.py.
+GRABAR_EN = os.getenv("GRABAR_EN")
+REPLAY_DE = os.getenv("REPLAY_DE")
+FUENTE    = 0   # cámara de las salas sin SALAS_FUENTES
 
-PLAYLIST_URI = f"spotify:playlist:{PLAYLIST_ID}"
+if REPLAY_DE:
+    from grabacion import Replay
+    replay = Replay(REPLAY_DE, velocidad=float(os.getenv("REPLAY_VELOCIDAD", 1)))
+    analizar_ambiente, generar_frase = replay.analizar_ambiente, replay.generar_frase
+    sintetizar_voz, sintetizar_voz_stream = replay.sintetizar_voz, replay.sintetizar_voz_stream
+    spotify_controller.sp.sp = replay.spotify()
+    FUENTE = replay.fuente
+    print(f"⏯️  Replay de {REPLAY_DE}: {replay.stats()['grabados']}")
+elif GRABAR_EN:
+    import cv2
+    from grabacion import Grabadora
+    grabadora = Grabadora(GRABAR_EN)
+    analizar_ambiente = grabadora.cronometrar("vision", analizar_ambiente)
+    generar_frase     = grabadora.cronometrar("frase", generar_frase)
+    sintetizar_voz_stream = grabadora.audio_stream(sintetizar_voz_stream)
+    sintetizar_voz    = lambda frase, personaje: b"".join(sintetizar_voz_stream(frase, personaje))
+    spotify_controller.sp.sp = grabadora.spotify(spotify_controller.sp.inicializar())
+    FUENTE = lambda: grabadora.fuente(cv2.VideoCapture(0))
+    print(f"⏺️  Grabando la sesión en {GRABAR_EN}")
 
-sp = Spotify(auth_manager=SpotifyOAuth(
-    client_id=os.getenv("SPOTIPY_CLIENT_ID"),
-    client_secret=os.getenv("SPOTIPY_CLIENT_SECRET"),
-    redirect_uri=os.getenv("SPOTIPY_REDIRECT_URI"),   # p. ej.  http://localhost:8888/callback
-    scope=("user-modify-playback-state user-read-playback-state "
-           "playlist-read-private playlist-read-collaborative")
-))
-
-def cargar_tracks(pid: str, market="PE") -> list[str]:
-    """Devuelve todas las canciones de la playlist para el market dado."""
-    try:
-        res = sp.playlist_items(pid, market=market, limit=100,
-                                fields="items.track.uri,next",
-                                additional_types=["track"])
-        uris = [i["track"]["uri"] for i in res["items"] if i.get("track")]
-        while res.get("next"):
-            res = sp.next(res)
-            uris.extend([i["track"]["uri"] for i in res["items"] if i.get("track")])
-        return uris
-    except SpotifyException as e:
-        print(f"⚠️  Error al cargar la playlist ({e.http_status}): {e.msg or e.reason}")
-        return []
-
-tracks = cargar_tracks(PLAYLIST_ID) or [PLAYLIST_URI]
-print(f"✅ Se cargaron {len(tracks)} pistas.") if len(tracks) > 1 else \
-      print("⚠️  Solo se pudo acceder a la URI de la playlist (no a sus pistas).")
-
-third = max(1, len(tracks)//3)
-LOW_ENERGY, MID_ENERGY, HIGH_ENERGY = tracks[:third], tracks[third:2*third], tracks[2*third:] or tracks
+# ------------ calentamiento --------------------
+# Nada de esto bloquea el arranque (ver arranque.py): SDKs y playlists se
+# cargan en segundo plano y /readyz avisa cuando todo está listo.
+if not REPLAY_DE:
+    arranque.tarea("gemini", lambda: dj_ai2.cliente("gemini"))
+    arranque.tarea("elevenlabs", lambda: dj_ai2.cliente("elevenlabs"))
+# Playlists por género desde el catálogo local; las viejas se refrescan desde Spotify
+arranque.tarea("playlists", lambda: cargar_generos(esperar=True))
 
 # ---------- parámetros ajustables --------------
-COOLDOWN          = 15    # segundos mínimos entre saltos normales
-FRECUENCIA_CAMBIO = 1     # 1=cada análisis, 2=c/2, 3=c/3…
+AUDIO_STREAMING   = os.getenv("AUDIO_STREAMING", "1") == "1"  # reenviar el TTS por chunks
+AUDIO_CHUNK_BYTES = 16 * 1024        # agrupación de chunks por evento
+AUDIO_MAX_BYTES   = 2 * 1024 * 1024  # tope por frase (~50 s de MP3 a 320 kbps)
+FRASE_CLIP        = "🎶 ¡Que siga la fiesta!"   # texto para clips pregrabados sin transcripción
+HISTORIAL_REPLAY_S = float(os.getenv("HISTORIAL_REPLAY_S", 1800))  # historial que recibe un cliente al entrar
 # -----------------------------------------------
 
-# ------------- estado global -------------------
-cap = analysis_timer = None
-analysis_lock = threading.Lock()
-current_analysis = current_dj_phrase = None
-current_voice   = "bad_bunny"
-LAST_TRACK_URI  = None
-LAST_CHANGE_TS  = 0
-ANALYSIS_COUNT  = 0
-# ------------------------------------------------
+cache_voz = CacheVoz()
+arranque.tarea("clips", lambda: print(f"🗃️  Caché de voz: {cache_voz.precalentar()} clips pregrabados registrados."),
+               obligatoria=False)
+banco = BancoFrases()
+arranque.tarea("banco", lambda: print(f"🗃️  Banco de frases: {banco.cargar()} clips pre-renderizados."),
+               obligatoria=False)
 
 # ============ Spotify helper ===================
-def reproducir_cancion(nivel: int, force=False):
-    global LAST_TRACK_URI, LAST_CHANGE_TS
-    if not tracks: return
+def energia_local_cambio(sesion, nivel: int):
+    """
+    El estimador local de una sala detectó un cambio sostenido de energía entre
+    análisis. Entra al Suavizador como un análisis local más (pesa menos en la
+    EMA y pasa por la histéresis): solo un cambio confirmado fuerza a la música.
+    """
+    analisis = sesion.detector.fusionar(dict(sesion.estimador.analisis_local(), nivel_energia=nivel))
+    analisis, cambio = sesion.suavizador.actualizar(analisis)
+    print(f"🏃 [{sesion.sala}] Energía local → {nivel} (suavizada {analisis['nivel_energia']}"
+          f"{', cambio' if cambio else ''})")
+    lanzar(POOL_SPOTIFY, etapa_spotify, sesion, analisis, cambio)
 
-    ahora = time.time()
-    if not force and (ahora - LAST_CHANGE_TS) < COOLDOWN:
-        return
+salas = Salas(socketio, fuente=FUENTE, al_cambiar_energia=energia_local_cambio)
+sala_de = {}   # sid -> sala
+# ------------------------------------------------
 
-    pool = LOW_ENERGY if nivel <= 4 else MID_ENERGY if nivel <= 7 else HIGH_ENERGY
-    if not pool: return
+# ============ Visión + IA =======================
+# El ciclo va por etapas en pools distintos (ver pipeline.py):
+#   planificador → captura + filtro → [vision] → [spotify] y [voz: frase → TTS] en paralelo
+# El siguiente análisis se programa desde el inicio del ciclo (sin deriva por
+# lo que tarde la visión) con un intervalo que reparte el presupuesto de nube.
+def intervalo_para(sesion) -> float:
+    return presupuesto.intervalo(salas.activas(), sesion.volatilidad, sesion.tendencia())
 
-    # Si solo tenemos la playlist, saltamos a posición aleatoria
-    if pool == [PLAYLIST_URI]:
-        try:
-            sp.start_playback(context_uri=PLAYLIST_URI,
-                              offset={"position": random.randint(0, 99)})
-            LAST_TRACK_URI, LAST_CHANGE_TS = PLAYLIST_URI, ahora
-            print("🎵 Spotify → salto aleatorio dentro de la playlist")
-        except SpotifyException as e:
-            print("Spotify error:", e); return
+def capture_and_analyze(sesion):
+    if not sesion.activa: return
+    gen, t0 = sesion.gen, time.perf_counter()
+    sesion.t_ciclo = time.monotonic()
+    with tiempos.medir("captura"):
+        _, frame = sesion.camara.ultimo()
+        if frame is None:
+            # La cámara acaba de abrir y aún no hay frame; reintentamos pronto
+            planificador.programar(sesion, 1, gen); return
+        # Pre-filtro local: si la escena no cambió, el último análisis sigue valiendo
+        cambio = sesion.filtro.evaluar(frame)
+        sesion.anotar_escena()
+
+    if sesion.vacia():
+        # El detector local no ve a nadie y la imagen está quieta: no se paga la nube
+        print(f"🫥 [{sesion.sala}] Sala vacía según el detector local, sin análisis remoto.")
+        metricas.saltados.inc(motivo="sala_vacia")
+        lanzar(POOL_VISION, etapa_vision, sesion, frame, gen, t0, False)
         return
 
-    track = random.choice(pool)
-    if len(pool) > 1:
-        while track == LAST_TRACK_URI:
-            track = random.choice(pool)
+    if not cambio and sesion.analisis:
+        print(f"🟰 [{sesion.sala}] Escena sin cambios, se reutiliza el último análisis.")
+        metricas.saltados.inc(motivo="escena")
+        sesion.filtro.saltar()
+        planificador.programar(sesion, intervalo_para(sesion), gen, desde=sesion.t_ciclo)
+        return
 
-    try:
-        sp.start_playback(uris=[track])
-        LAST_TRACK_URI, LAST_CHANGE_TS = track, ahora
-        print("🎵 Spotify →", track)
-    except SpotifyException as e:
-        print("Spotify error:", e)
-# ------------------------------------------------
+    lanzar(POOL_VISION, etapa_vision, sesion, frame, gen, t0)
 
-# ============ Visión + IA =======================
-def capture_and_analyze():
-    global cap, analysis_timer, current_analysis, current_dj_phrase, ANALYSIS_COUNT
-    if cap is None or not cap.isOpened(): return
-    ret, frame = cap.read()
-    if not ret: return
+planificador = Planificador(capture_and_analyze)
 
-    pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-    analisis = analizar_ambiente(pil)
+def etapa_vision(sesion, frame, gen, t0, nube=True):
+    analisis = None
+    if nube and presupuesto.gemini.consumir():
+        # Ráfaga (VISION_RAFAGA > 1): fotogramas clave desde el último análisis + el
+        # actual, en un solo pedido. Cada uno con recorte + resize + JPEG/WebP
+        frames = sesion.claves.tomar() + [frame]
+        mapa = sesion.estimador.mapa_movimiento()
+        imagenes = [sesion.preproceso.procesar(f, mapa) for f in frames]
+        total = sum(i["bytes"] for i in imagenes)
+        prep_ms = sum(i["ms"] for i in imagenes)
+        tiempos.registrar("preproceso", prep_ms / 1000)
+        blobs = [{"mime_type": i["mime_type"], "data": i["data"]} for i in imagenes]
+        t_vision = time.perf_counter()
+        analisis = analizar_ambiente(blobs if len(blobs) > 1 else blobs[0])
+        t_vision = time.perf_counter() - t_vision
+        tiempos.registrar("vision", t_vision)
+        metricas.bytes_subidos.observar(total)
+        sesion.ultima_subida = {"bytes": total, "imagenes": len(imagenes), "preproceso_ms": round(prep_ms, 1),
+                                "vision_ms": round(t_vision * 1000, 1), "recorte": imagenes[-1]["recorte"]}
+        print(f"📤 [{sesion.sala}] {len(imagenes)} imagen(es), {total / 1024:.0f} KB subidos, "
+              f"{prep_ms:.0f} ms preproceso + {t_vision * 1000:.0f} ms visión")
+    elif nube:
+        print(f"💸 [{sesion.sala}] Presupuesto de Gemini agotado esta hora.")
+        metricas.saltados.inc(motivo="presupuesto")
+    if gen != sesion.gen: return
 
     if analisis:
-        frase, audio_bytes = generar_voz_dj(analisis, current_voice)
-        nivel = analisis.get("nivel_energia", 5)
+        sesion.filtro.aceptar()
+        sesion.estimador.registrar_etiqueta(analisis.get("nivel_energia", 5))
+    else:
+        if nube:
+            print(f"☁️  [{sesion.sala}] Sin análisis de la nube, se usa la energía local.")
+            metricas.respaldos.inc(tipo="energia_local")
+        analisis = sesion.estimador.analisis_local()
+    # Conteo del detector local: una respuesta remota equivocada no vacía una sala con gente
+    analisis = sesion.detector.fusionar(analisis)
+
+    sesion.anotar_nivel(analisis.get("nivel_energia", 5))
+    # Música y voz deciden sobre el estado suavizado (ver suavizado.py): solo un
+    # cambio sostenido de cubeta, presencia o género fuerza el salto de pista
+    analisis, cambio = sesion.suavizador.actualizar(analisis)
+    historial.registrar_analisis(sesion.sala, analisis)   # solo encola: el disco va por lotes en otro hilo
+    with sesion.lock:
+        sesion.conteo += 1
+        ciclo = sesion.conteo
+        sesion.analisis = analisis
+
+    # La música solo necesita el nivel: no espera a la frase ni al TTS
+    lanzar(POOL_SPOTIFY, etapa_spotify, sesion, analisis, cambio)
+    lanzar(POOL_VOZ, etapa_voz, sesion, analisis, sesion.persona, ciclo, t0)
 
-        ANALYSIS_COUNT += 1
-        force = (ANALYSIS_COUNT % FRECUENCIA_CAMBIO) == 0
-        reproducir_cancion(nivel, force=force)
+    sesion.emitir("analysis_update", {"analysis": analisis})
 
-        with analysis_lock:
-            current_analysis, current_dj_phrase = analisis, frase
+    planificador.programar(sesion, intervalo_para(sesion), gen, desde=sesion.t_ciclo)
 
-        socketio.emit("analysis_update", {
-            "analysis": analisis,
-            "dj_phrase": frase,
-            "audio_base64": base64.b64encode(audio_bytes).decode() if audio_bytes else None
-        })
+def etapa_spotify(sesion, analisis, force):
+    with tiempos.medir("spotify"):
+        sesion.musica.actualizar_musica_spotify(analisis, force=force)
 
-        intervalo = 20 if nivel <= 4 else 40 if nivel <= 7 else 60
+def etapa_voz(sesion, analisis, personaje, ciclo, t0):
+    sit = situacion(analisis)
+    voice_id = VOICE_IDS.get(personaje, VOICE_IDS["bad_bunny"])
+
+    # Banco pre-renderizado (banco_frases.py): sale al instante y el cliente baja el MP3 estático
+    clip = banco.elegir(personaje, sit)
+    if clip:
+        with sesion.lock:
+            if ciclo < sesion.ultima_voz: return
+            sesion.ultima_voz, sesion.frase, sesion.audio_url = ciclo, clip["frase"], clip["url"]
+        historial.registrar_frase(sesion.sala, personaje, clip["frase"], clip["url"])
+        sesion.emitir("dj_update", {"dj_phrase": clip["frase"], "audio": None, "audio_url": clip["url"]})
+        tiempos.registrar("ciclo_primer_audio", time.perf_counter() - t0)
+        tiempos.registrar("ciclo", time.perf_counter() - t0)
+        return
+
+    # Una parte de los pedidos se sirve con clips ya pagados: ni Gemini ni ElevenLabs
+    reuso = cache_voz.reusar(personaje, sit)
+    k_audio = None   # clave en cache_voz del audio que sale, para servirlo después por /audio
+    if reuso:
+        frase, audio_bytes, k_audio = reuso
+        frase = frase or FRASE_CLIP
+    elif not presupuesto.gemini.consumir():
+        # Sin presupuesto: la frase de respaldo no pasa por ElevenLabs
+        frase, audio_bytes = FRASE_RESPALDO, None
+        metricas.respaldos.inc(tipo="frase_sin_presupuesto")
     else:
-        intervalo = 40
+        try:
+            with tiempos.medir("frase"):
+                frase = generar_frase(analisis, personaje)
+        except Exception as e:
+            print(f"Error al generar la frase del DJ: {e}")
+            metricas.errores_api.inc(servicio="gemini_texto")
+            metricas.respaldos.inc(tipo="frase_error")
+            frase = FRASE_RESPALDO
+        audio_bytes = cache_voz.obtener(personaje, voice_id, TTS_MODEL_ID, frase) \
+            if frase != FRASE_RESPALDO else None
+        if audio_bytes: k_audio = clave(personaje, voice_id, TTS_MODEL_ID, frase)
+
+    # La síntesis solo si queda presupuesto de ElevenLabs; si no, va solo el texto
+    sintetizar = audio_bytes is None and frase != FRASE_RESPALDO and presupuesto.elevenlabs.consumir()
+
+    if sintetizar and AUDIO_STREAMING:
+        with sesion.lock:
+            if ciclo < sesion.ultima_voz: return
+            sesion.ultima_voz, sesion.frase, sesion.audio_url = ciclo, frase, None
+        audio_bytes = emitir_audio_stream(sesion, frase, personaje, ciclo, t0)
+        if audio_bytes:
+            k_audio = cache_voz.guardar(personaje, voice_id, TTS_MODEL_ID, frase, audio_bytes, sit)
+            with sesion.lock:
+                if sesion.ultima_voz == ciclo: sesion.audio_url = url_audio(k_audio)
+        historial.registrar_frase(sesion.sala, personaje, frase, url_audio(k_audio))
+        return
+
+    if sintetizar:
+        try:
+            with tiempos.medir("tts"):
+                audio_bytes = sintetizar_voz(frase, personaje)
+            k_audio = cache_voz.guardar(personaje, voice_id, TTS_MODEL_ID, frase, audio_bytes, sit)
+        except Exception as e:
+            print(f"Error al generar el audio del DJ: {e}")
+            metricas.errores_api.inc(servicio="elevenlabs")
+
+    with sesion.lock:
+        # Con varios TTS en vuelo, uno viejo que termina tarde no pisa al nuevo
+        if ciclo < sesion.ultima_voz: return
+        sesion.ultima_voz, sesion.frase, sesion.audio_url = ciclo, frase, url_audio(k_audio)
+    historial.registrar_frase(sesion.sala, personaje, frase, url_audio(k_audio))
+
+    sesion.emitir("dj_update", {"dj_phrase": frase, "audio": audio_bytes})   # MP3 como adjunto binario
+    tiempos.registrar("ciclo", time.perf_counter() - t0)
+
+def url_audio(k):
+    """URL para volver a bajar un audio de la caché de voz (historial, clientes que llegan tarde)."""
+    return f"/audio/{k}" if k else None
+
+def emitir_audio_stream(sesion, frase, personaje, ciclo, t0):
+    """
+    Reenvía el MP3 de ElevenLabs como eventos binarios mientras se sintetiza.
+    Devuelve el audio completo para la caché, o None si falló o superó
+    AUDIO_MAX_BYTES (el buffer por frase nunca pasa de ese tope).
+    """
+    audio_id = f"{sesion.sala}-{sesion.gen}-{ciclo}"
+    sesion.emitir("dj_update", {"dj_phrase": frase, "audio": None, "audio_stream": audio_id})
+
+    t_tts = time.perf_counter()
+    buf, partes, seq, total, completo = bytearray(), [], 0, 0, False
+    def enviar():
+        nonlocal buf, seq
+        if seq == 0:
+            ahora = time.perf_counter()
+            tiempos.registrar("tts_primer_audio", ahora - t_tts)
+            tiempos.registrar("ciclo_primer_audio", ahora - t0)
+        datos = bytes(buf)
+        partes.append(datos)
+        sesion.emitir("dj_audio_chunk", {"id": audio_id, "seq": seq, "data": datos})
+        buf, seq = bytearray(), seq + 1
 
-    analysis_timer = threading.Timer(intervalo, capture_and_analyze)
-    analysis_timer.daemon = True
-    analysis_timer.start()
+    try:
+        for chunk in sintetizar_voz_stream(frase, personaje):
+            buf += chunk
+            total += len(chunk)
+            # El primer chunk sale cuanto antes; el resto se agrupa para no saturar el socket
+            if seq == 0 or len(buf) >= AUDIO_CHUNK_BYTES:
+                enviar()
+            if total >= AUDIO_MAX_BYTES:
+                print("⚠️  Audio del DJ truncado: superó AUDIO_MAX_BYTES."); break
+        else:
+            completo = True
+        if buf: enviar()
+    except Exception as e:
+        print(f"Error al generar el audio del DJ: {e}")
+        metricas.errores_api.inc(servicio="elevenlabs")
+    finally:
+        sesion.emitir("dj_audio_end", {"id": audio_id, "bytes": total})
+
+    ahora = time.perf_counter()
+    tiempos.registrar("tts", ahora - t_tts)
+    tiempos.registrar("ciclo", ahora - t0)
+    return b"".join(partes) if completo else None
 # ================================================
 
 # ------------------ Socket.IO -------------------
+# Cada cliente pertenece a una sala (room de Socket.IO); sin join_session
+# queda en la sala por defecto. Los datos de los eventos pueden traer "sala".
+def sesion_de(data=None):
+    sala = (data or {}).get("sala") if isinstance(data, dict) else None
+    return salas.obtener(sala or sala_de.get(sid_actual()))
+
+def _unir(sesion):
+    sid = sid_actual()
+    previa = sala_de.get(sid)
+    if previa == sesion.sala: return
+    if previa:
+        leave_room(previa)
+        salas.obtener(previa).clientes.discard(sid)
+        salas.obtener(previa).preview.desuscribir(sid)
+    join_room(sesion.sala)
+    sala_de[sid] = sesion.sala
+    sesion.clientes.add(sid)
+
+def _replay(sesion):
+    if sesion.activa:
+        emit("camera_started", {"sala": sesion.sala})
+    if sesion.analisis and sesion.frase:
+        # Sin audio: solo la referencia, el cliente decide si lo baja
+        emit("analysis_update", {"analysis": sesion.analisis, "dj_phrase": sesion.frase,
+                                 "audio_url": sesion.audio_url})
+    # Lo que pasó antes de conectarse: línea de tiempo reducida, frases y pistas
+    emit("historial", historial.resumen(sesion.sala, time.time() - HISTORIAL_REPLAY_S))
+
+def con_sesion(handler):
+    """
+    El handler recibe (sesion, data). Si la sala no se puede crear (MAX_SALAS)
+    el cliente recibe "error", igual en todos los eventos.
+    """
+    @functools.wraps(handler)
+    def manejador(data=None):
+        try:
+            sesion = sesion_de(data)
+        except ValueError as e:
+            emit("error", {"message": str(e)}); return None
+        return handler(sesion, data if isinstance(data, dict) else {})
+    return manejador
+
+@socketio.on("join_session")
+@con_sesion
+def join_session(sesion, data):
+    _unir(sesion)
+    emit("session_joined", {"sala": sesion.sala, "persona": sesion.persona})
+    _replay(sesion)
+    # Ack: el cliente espera la unión antes de suscribirse al preview
+    return {"sala": sesion.sala}
+
 @socketio.on("start_camera")
-def start_camera():
-    global cap, analysis_timer, ANALYSIS_COUNT
-    ANALYSIS_COUNT = 0
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
+@con_sesion
+def start_camera(sesion, data):
+    if not sesion.iniciar():
         emit("error", {"message": "No se puede abrir la cámara"}); return
-    emit("camera_started")
-    if analysis_timer: analysis_timer.cancel()
-    capture_and_analyze()
+    sesion.emitir("camera_started", {"sala": sesion.sala})
+    capture_and_analyze(sesion)
 
 @socketio.on("stop_camera")
-def stop_camera():
-    global cap, analysis_timer
-    if analysis_timer: analysis_timer.cancel()
-    if cap: cap.release(); cap = None
-    emit("camera_stopped")
+@con_sesion
+def stop_camera(sesion, data):
+    sesion.detener()
+    sesion.emitir("camera_stopped", {"sala": sesion.sala})
+
+@socketio.on("subscribe_preview")
+@con_sesion
+def subscribe_preview(sesion, data):
+    sesion.preview.suscribir(sid_actual())
+
+@socketio.on("unsubscribe_preview")
+@con_sesion
+def unsubscribe_preview(sesion, data):
+    sesion.preview.desuscribir(sid_actual())
 
 @socketio.on("get_frame")
-def get_frame():
-    if cap and cap.isOpened():
-        ret, frame = cap.read()
-        if ret:
-            _, buf = cv2.imencode(".jpg", frame)
-            emit("frame_update", {"frame": base64.b64encode(buf).decode()})
+@con_sesion
+def get_frame(sesion, data):
+    # Compatibilidad con clientes que aún hacen polling: reutiliza el JPEG ya codificado
+    jpeg = sesion.preview.ultimo_jpeg()
+    if jpeg:
+        emit("frame_update", {"frame": base64.b64encode(jpeg).decode()})
 
 @socketio.on("change_voice_model")
-def change_voice(data):
-    global current_voice
+@con_sesion
+def change_voice(sesion, data):
     if data.get("voice_model"):
-        current_voice = data["voice_model"]
-        print("→ voz DJ cambiada a:", current_voice)
+        sesion.persona = data["voice_model"]
+        print(f"→ [{sesion.sala}] voz DJ cambiada a:", sesion.persona)
+
+@socketio.on("calibrar_energia")
+@con_sesion
+def calibrar_energia(sesion, data):
+    # Modo calibración: cada análisis de Gemini reajusta la escala del estimador local
+    estimador = sesion.estimador
+    estimador.calibrando = bool(data.get("activo"))
+    if not estimador.calibrando:
+        estimador.calibrar()
+    emit("energia_calibracion", estimador.stats())
+
+@socketio.on("get_historial")
+@con_sesion
+def get_historial(sesion, data):
+    # {"sala", "desde", "hasta" (epoch s), "puntos"}: por defecto los últimos HISTORIAL_REPLAY_S
+    ahora = time.time()
+    emit("historial", historial.resumen(sesion.sala, float(data.get("desde") or ahora - HISTORIAL_REPLAY_S),
+                                        float(data.get("hasta") or ahora),
+                                        int(data.get("puntos") or HISTORIAL_PUNTOS)))
 
 @socketio.on("connect")
 def on_connect():
     print("✅ Cliente conectado.")
-    if current_analysis and current_dj_phrase:
-        emit("analysis_update", {
-            "analysis": current_analysis,
-            "dj_phrase": current_dj_phrase,
-            "audio_base64": None
-        })
+    sesion = salas.obtener()
+    _unir(sesion)
+    _replay(sesion)
+
+@socketio.on("disconnect")
+def on_disconnect():
+    sid = sid_actual()
+    sala = sala_de.pop(sid, None)
+    if sala:
+        sesion = salas.obtener(sala)
+        sesion.clientes.discard(sid)
+        sesion.preview.desuscribir(sid)
+
+# ------------------ HTTP -------------------------
+@app.route("/video_feed")
+def video_feed():
+    sesion = salas.buscar(request.args.get("sala"))   # solo lectura: no abre salas nuevas
+    if sesion is None: abort(404)
+    if not sesion.activa:
+        return Response("Cámara inactiva", status=503)
+    return Response(sesion.preview.mjpeg(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+@app.route("/stats")
+def stats():
+    return jsonify({"salas": salas.stats(),
+                    "planificador": planificador.stats(),
+                    "presupuesto": presupuesto.stats(),
+                    "perfilador": perfilador.stats(),
+                    "transporte": transporte.stats(),
+                    "arranque": arranque.stats(),
+                    "cache_voz": cache_voz.stats(),
+                    "banco_frases": banco.stats(),
+                    "historial": historial.stats(),
+                    "spotify": spotify_controller.stats(),
+                    "tiempos": tiempos.resumen()})
+
+@app.route("/historial")
+def historial_http():
+    # ?sala=&desde=&hasta=&puntos= (epoch s); mismo formato que el evento "historial"
+    a = request.args
+    sesion = salas.buscar(a.get("sala"))   # solo lectura: no abre salas nuevas
+    if sesion is None: abort(404)
+    ahora = time.time()
+    return jsonify(historial.resumen(sesion.sala, a.get("desde", ahora - HISTORIAL_REPLAY_S, type=float),
+                                     a.get("hasta", ahora, type=float), a.get("puntos", HISTORIAL_PUNTOS, type=int),
+                                     a.get("frases", 10, type=int)))
+
+@app.route("/audio/<k>")
+def audio_cache(k):
+    # Audio de la caché de voz referenciado desde el historial
+    ruta = cache_voz.ruta(k)
+    if ruta is None: abort(404)
+    return send_file(ruta, mimetype="audio/mpeg", max_age=86400)
+
+# ------------------ métricas ---------------------
+# Lo que ya cuentan los componentes se lee en cada scrape
+metricas.Medidor("camara_fps", "Frames por segundo de la cámara de cada sala",
+                 lambda: {(s.sala,): s.camara.fps for s in salas if s.activa}, ("sala",))
+metricas.Medidor("clientes", "Clientes Socket.IO por sala",
+                 lambda: {(s.sala,): len(s.clientes) for s in salas}, ("sala",))
+metricas.Medidor("cache_voz_total", "Pedidos a la caché de voz por resultado",
+                 lambda: {(k,): cache_voz.stats()[k] for k in ("aciertos", "fallos", "reusos")},
+                 ("resultado",), tipo="counter")
+metricas.Medidor("banco_frases_total", "Frases pedidas al banco pre-renderizado por resultado",
+                 lambda: {(k,): banco.stats()[k] for k in ("servidos", "sin_clip")},
+                 ("resultado",), tipo="counter")
+metricas.Medidor("historial_filas_total", "Filas escritas en el historial (SQLite)",
+                 lambda: historial.stats()["escritas"], tipo="counter")
+metricas.Medidor("spotify_total", "Llamadas y eventos del cliente de Spotify",
+                 lambda: {(k,): v for k, v in spotify_controller.sp.stats().items()},
+                 ("tipo",), tipo="counter")
+metricas.Medidor("presupuesto_usado", "Llamadas a la nube en la última hora",
+                 lambda: {(k,): v["usadas_ultima_hora"] for k, v in presupuesto.stats().items()},
+                 ("servicio",))
+metricas.Medidor("listo", "1 cuando terminó el calentamiento obligatorio", lambda: arranque.listo())
+metricas.Medidor("planificador_pendientes", "Salas con un análisis programado",
+                 lambda: planificador.stats()["pendientes"])
+metricas.Medidor("emisiones_saltadas_total", "Eventos de estado no enviados a clientes con la cola llena",
+                 lambda: transporte.stats().get("saltos_cliente_lento", 0), tipo="counter")
+
+@app.route("/healthz")
+def healthz():
+    # Vivo: si el proceso contesta, está vivo; no depende de servicios externos
+    return jsonify({"vivo": True})
+
+@app.route("/readyz")
+def readyz():
+    estado = arranque.stats()
+    return jsonify(estado), (200 if estado["listo"] else 503)
+
+@app.route("/metrics")
+def metrics():
+    return Response(metricas.exponer(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/profiler", methods=["GET", "POST"])
+def profiler():
+    # POST {"activo": true|false} prende/apaga el muestreo; GET devuelve las pilas colapsadas
+    if request.method == "POST":
+        if (request.get_json(silent=True) or {}).get("activo"):
+            perfilador.iniciar()
+        else:
+            perfilador.detener()
+        return jsonify(perfilador.stats())
+    return Response(perfilador.colapsado(), mimetype="text/plain")
+
+if metricas.PROFILER:
+    perfilador.iniciar()
+
+asgi = transporte.asgi()   # SERVIDOR_MODO=asgi uvicorn app:asgi
+
+arranque.servidor_armado()
 
 # ---------------- run ----------------
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+# arranque.py
+#
+# Arranque perezoso. El servidor se levanta sin esperar a los SDK ni a la
+# red; lo pesado (importar/configurar Gemini y ElevenLabs, cargar playlists,
+# registrar clips pregrabados) corre como tareas de calentamiento en segundo
+# plano. Cada tarea deja su estado, lo que separa:
+#   - vivo  (/healthz): el proceso responde,
+#   - listo (/readyz):  todas las tareas obligatorias terminaron bien.
+# Si algo no se puede calentar (sin claves, sin red), el servidor sigue vivo,
+# el ciclo usa sus caminos de respaldo y la tarea se reintenta con backoff:
+# cuando vuelve la red, /readyz se recupera solo.
+
+import os, threading, time
+
+# ---------- parámetros ajustables --------------
+ARRANQUE_PEREZOSO = os.getenv("ARRANQUE_PEREZOSO", "1") == "1"   # 0 = calentar todo antes de servir
+ARRANQUE_REINTENTO_S   = float(os.getenv("ARRANQUE_REINTENTO_S", 5))     # espera tras el primer fallo; se duplica
+ARRANQUE_REINTENTO_MAX = float(os.getenv("ARRANQUE_REINTENTO_MAX", 300))
+# -----------------------------------------------
+
+T0 = time.perf_counter()   # lo más cerca posible del inicio del proceso: se importa primero
+
+
+class Arranque:
+    """Tareas de calentamiento con estado: pendiente -> listo | error (-> reintento -> listo)."""
+
+    def __init__(self):
+        self._tareas = {}   # nombre -> {"estado", "obligatoria", "s", "error"}
+        self._lock = threading.Lock()
+        self.servidor_s = None   # segundos hasta tener el servidor armado
+
+    def tarea(self, nombre, fn, obligatoria=True, esperar=not ARRANQUE_PEREZOSO):
+        """
+        Corre `fn` en un hilo propio (o en línea con esperar=True) y registra el
+        resultado. Si falla, se reintenta en segundo plano con backoff exponencial.
+        """
+        with self._lock:
+            self._tareas[nombre] = {"estado": "pendiente", "obligatoria": obligatoria, "s": None,
+                                    "error": None, "intentos": 0}
+        def correr() -> bool:
+            t = time.perf_counter()
+            try:
+                fn()
+                estado, error = "listo", None
+            except Exception as e:
+                estado, error = "error", repr(e)
+                print(f"⚠️  Calentamiento de {nombre} falló: {e}")
+            with self._lock:
+                tarea = self._tareas[nombre]
+                tarea.update(estado=estado, error=error, intentos=tarea["intentos"] + 1,
+                             s=round(time.perf_counter() - t, 3),
+                             listo_desde_inicio_s=round(time.perf_counter() - T0, 3))
+            return estado == "listo"
+        def reintentar():
+            espera = ARRANQUE_REINTENTO_S
+            while True:
+                time.sleep(espera)
+                if correr(): return
+                espera = min(ARRANQUE_REINTENTO_MAX, espera * 2)
+        def correr_y_reintentar():
+            if not correr(): reintentar()
+        if esperar:
+            if not correr():
+                threading.Thread(target=reintentar, name=f"calentar_{nombre}", daemon=True).start()
+        else:
+            threading.Thread(target=correr_y_reintentar, name=f"calentar_{nombre}", daemon=True).start()
+
+    def servidor_armado(self):
+        self.servidor_s = round(time.perf_counter() - T0, 3)
+        print(f"🚀 Servidor armado en {self.servidor_s:.2f}s "
+              f"({'calentando en segundo plano' if ARRANQUE_PEREZOSO else 'todo cargado'}).")
+
+    def listo(self) -> bool:
+        with self._lock:
+            return all(t["estado"] == "listo" for t in self._tareas.values() if t["obligatoria"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"listo": all(t["estado"] == "listo" for t in self._tareas.values() if t["obligatoria"]),
+                    "perezoso": ARRANQUE_PEREZOSO,
+                    "servidor_s": self.servidor_s,
+                    "desde_inicio_s": round(time.perf_counter() - T0, 3),
+                    "tareas": {k: dict(v) for k, v in self._tareas.items()}}
+
+
+arranque = Arranque()
@@ -0,0 +1,206 @@
+# banco_frases.py
+#
+# Banco de frases del DJ pre-renderizadas. Un trabajo por lotes genera con
+# Gemini muchas frases distintas por persona (VOICE_IDS) y por situación
+# (cubeta de energía, gente aburrida, sala vacía), las sintetiza con
+# ElevenLabs con concurrencia acotada y las deja en static/banco con un
+# índice. En vivo, `elegir()` toma un clip de la situación en O(1) sin
+# repetir hasta agotar los de esa situación, y el cliente lo baja como
+# archivo estático: ni Gemini ni ElevenLabs ni base64 en el socket.
+#
+#     cd backend && python banco_frases.py [--por-situacion 30] [--concurrencia 4]
+#
+# Se puede volver a correr: solo genera lo que falta para llegar al objetivo.
+
+import argparse, json, os, random, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cache_voz import CUBETAS, clave, normalizar
+
+# ---------- parámetros ajustables --------------
+BANCO_DIR           = os.path.join(os.path.dirname(__file__), "static", "banco")  # servido por Flask
+BANCO_URL           = "/static/banco"
+# Fracción de frases servidas del banco si hay clips; el resto va a la caché de voz
+# y a la generación en vivo (1.0 apaga las frases en vivo donde haya banco)
+BANCO_USO           = float(os.getenv("BANCO_USO", 0.7))
+BANCO_POR_SITUACION = 30      # frases objetivo por persona y situación
+BANCO_CONCURRENCIA  = 4       # pedidos simultáneos a Gemini / ElevenLabs en el lote
+BANCO_LOTE          = 10      # frases por pedido a Gemini
+BANCO_REINTENTOS    = 3
+# -----------------------------------------------
+
+# Situación (misma clave que cache_voz.situacion) -> cómo se la describimos a Gemini
+_ENERGIA = {"energia_baja": "energía baja, casi nadie se mueve",
+            "energia_media": "energía media, algunos bailan",
+            "energia_alta": "energía alta, todos bailando"}
+SITUACIONES = {"nadie_presente": "la pista está vacía, no hay nadie"}
+for _c in CUBETAS:
+    SITUACIONES[_c] = _ENERGIA[_c]
+    SITUACIONES[_c + "_aburridos"] = _ENERGIA[_c] + ", y la gente se ve aburrida"
+
+
+class BancoFrases:
+    """Índice en memoria del banco + bolsas barajadas por (persona, situación)."""
+
+    def __init__(self, directorio=BANCO_DIR, uso=BANCO_USO):
+        self.dir, self.uso = directorio, uso
+        self._lock  = threading.Lock()
+        self._clips = {}    # (persona, situacion) -> [{"frase", "archivo", "bytes", "url"}]
+        self._bolsas = {}   # (persona, situacion) -> [orden barajado, posición]
+        self.servidos = self.sin_clip = 0
+
+    def _ruta_indice(self):
+        return os.path.join(self.dir, "indice.json")
+
+    def cargar(self) -> int:
+        """Lee el índice (los clips cuyo archivo falta se ignoran). Devuelve cuántos clips hay."""
+        try:
+            with open(self._ruta_indice(), encoding="utf-8") as f:
+                indice = json.load(f)
+        except FileNotFoundError:
+            indice = {}
+        clips = {}
+        for persona, por_sit in indice.get("clips", {}).items():
+            for sit, lista in por_sit.items():
+                vivos = [dict(c, url=f"{BANCO_URL}/{persona}/{sit}/{c['archivo']}") for c in lista
+                         if os.path.exists(os.path.join(self.dir, persona, sit, c["archivo"]))]
+                if vivos: clips[(persona, sit)] = vivos
+        with self._lock:
+            self._clips, self._bolsas = clips, {}
+        return sum(len(v) for v in clips.values())
+
+    def _guardar_indice(self):
+        indice = {"version": 1, "clips": {}}
+        for (persona, sit), lista in sorted(self._clips.items()):
+            indice["clips"].setdefault(persona, {})[sit] = [
+                {k: c[k] for k in ("frase", "archivo", "bytes")} for c in lista]
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self._ruta_indice() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(indice, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._ruta_indice())
+
+    # ------------------ en vivo ------------------
+    def elegir(self, persona, sit):
+        """
+        Clip para esta persona y situación (con `uso` de probabilidad), o None.
+        Cada situación es una bolsa barajada: no se repite un clip hasta que
+        salieron todos, y al rebarajar el primero no es el último que sonó.
+        """
+        if self.uso <= 0 or random.random() >= self.uso:
+            return None
+        with self._lock:
+            k = (persona, sit)
+            if k not in self._clips: k = (persona, sit.replace("_aburridos", ""))
+            clips = self._clips.get(k)
+            if not clips:
+                self.sin_clip += 1
+                return None
+            bolsa = self._bolsas.get(k)
+            if bolsa is None or bolsa[1] >= len(bolsa[0]):
+                ultimo = bolsa[0][-1] if bolsa else None
+                orden = random.sample(range(len(clips)), len(clips))
+                if len(orden) > 1 and orden[0] == ultimo:
+                    orden[0], orden[-1] = orden[-1], orden[0]
+                bolsa = self._bolsas[k] = [orden, 0]
+            clip = clips[bolsa[0][bolsa[1]]]
+            bolsa[1] += 1
+            self.servidos += 1
+        return clip
+
+    # ------------------ lote ------------------
+    def frases(self, persona, sit) -> list:
+        with self._lock:
+            return [c["frase"] for c in self._clips.get((persona, sit), ())]
+
+    def agregar(self, persona, sit, frase, archivo, audio: bytes):
+        """Escribe el MP3 y lo suma al índice (que se guarda enseguida: el lote se puede cortar)."""
+        carpeta = os.path.join(self.dir, persona, sit)
+        os.makedirs(carpeta, exist_ok=True)
+        with open(os.path.join(carpeta, archivo), "wb") as f:
+            f.write(audio)
+        with self._lock:
+            self._clips.setdefault((persona, sit), []).append(
+                {"frase": frase, "archivo": archivo, "bytes": len(audio),
+                 "url": f"{BANCO_URL}/{persona}/{sit}/{archivo}"})
+            self._bolsas.pop((persona, sit), None)
+            self._guardar_indice()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"clips": sum(len(v) for v in self._clips.values()),
+                    "situaciones": len(self._clips),
+                    "servidos": self.servidos, "sin_clip": self.sin_clip, "uso": self.uso}
+
+
+def _con_reintentos(fn, *args):
+    for intento in range(BANCO_REINTENTOS):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if intento == BANCO_REINTENTOS - 1: raise
+            espera = 2 ** intento
+            print(f"⚠️  {getattr(fn, '__name__', 'pedido')} falló ({e}); reintento en {espera}s")
+            time.sleep(espera)
+
+
+def generar(banco, personas, por_situacion=BANCO_POR_SITUACION, concurrencia=BANCO_CONCURRENCIA):
+    """
+    Completa el banco hasta `por_situacion` frases por persona y situación.
+    1) textos: un pedido a Gemini por cada BANCO_LOTE frases, sin repetir
+       (normalizadas) las que ya están; 2) audio: ElevenLabs con a lo sumo
+       `concurrencia` síntesis en vuelo.
+    """
+    from dj_ai2 import VOICE_IDS, TTS_MODEL_ID, generar_frases, sintetizar_voz
+
+    def textos(persona, sit):
+        vistas = {normalizar(f) for f in banco.frases(persona, sit)}
+        nuevas, intentos = [], 0
+        while len(vistas) < por_situacion and intentos < 2 * por_situacion // BANCO_LOTE + 2:
+            intentos += 1
+            pedidas = min(BANCO_LOTE, por_situacion - len(vistas))
+            for f in _con_reintentos(generar_frases, persona, SITUACIONES[sit], pedidas,
+                                     banco.frases(persona, sit) + nuevas):
+                if normalizar(f) not in vistas and len(vistas) < por_situacion:
+                    vistas.add(normalizar(f)); nuevas.append(f)
+        return [(persona, sit, f) for f in nuevas]
+
+    def audio(persona, sit, frase):
+        archivo = clave(persona, VOICE_IDS[persona], TTS_MODEL_ID, frase)[:32] + ".mp3"
+        banco.agregar(persona, sit, frase, archivo, _con_reintentos(sintetizar_voz, frase, persona))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="banco") as pool:
+        pendientes = []
+        for fut in as_completed([pool.submit(textos, p, s) for p in personas for s in SITUACIONES]):
+            try:
+                pendientes.extend(fut.result())
+            except Exception as e:
+                print(f"Error generando frases: {e}")
+        print(f"📝 {len(pendientes)} frases nuevas en {time.perf_counter() - t0:.0f}s; sintetizando…")
+
+        hechas = 0
+        for fut in as_completed([pool.submit(audio, *p) for p in pendientes]):
+            try:
+                fut.result(); hechas += 1
+            except Exception as e:
+                print(f"Error sintetizando: {e}")
+    print(f"🔊 {hechas}/{len(pendientes)} clips nuevos en {time.perf_counter() - t0:.0f}s. {banco.stats()}")
+    return hechas
+
+
+def main():
+    from dj_ai2 import VOICE_IDS
+    ap = argparse.ArgumentParser(description="Genera el banco de frases pre-renderizadas del DJ")
+    ap.add_argument("--personas", default=",".join(VOICE_IDS))
+    ap.add_argument("--por-situacion", type=int, default=BANCO_POR_SITUACION)
+    ap.add_argument("--concurrencia", type=int, default=BANCO_CONCURRENCIA)
+    args = ap.parse_args()
+
+    banco = BancoFrases()
+    print(f"🗃️  Banco actual: {banco.cargar()} clips en {banco.dir}")
+    generar(banco, [p for p in args.personas.split(",") if p in VOICE_IDS],
+            args.por_situacion, args.concurrencia)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# bench_arranque.py
+#
+# Tiempo de arranque en frío. Cada corrida es un intérprete nuevo que importa
+# app.py y anota cuándo quedó armado el servidor y cuándo quedó listo (todas
+# las tareas de calentamiento obligatorias terminadas). Con --importtime
+# lista además los módulos que más tardan en importarse.
+#
+#     cd backend && python -m benchmarks.bench_arranque [--corridas 5] [--importtime]
+#     cd backend && ARRANQUE_PEREZOSO=0 python -m benchmarks.bench_arranque   # para comparar
+
+import argparse, json, os, re, subprocess, sys, time
+
+HIJO = r"""
+import json, sys, time
+sys.path.insert(0, ".")
+import app
+from arranque import arranque
+limite = time.perf_counter() + %(espera)s
+while not arranque.listo() and time.perf_counter() < limite:
+    time.sleep(0.05)
+print("@@" + json.dumps(arranque.stats()))
+sys.stdout.flush()
+import os; os._exit(0)
+"""
+
+
+def corrida(espera):
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-c", HIJO % {"espera": espera}],
+                       capture_output=True, text=True, env=os.environ)
+    total = time.perf_counter() - t0
+    linea = next((l for l in p.stdout.splitlines() if l.startswith("@@")), None)
+    if linea is None:
+        sys.exit(f"La corrida falló:\n{p.stderr[-2000:]}")
+    return json.loads(linea[2:]), total
+
+
+def importtime(top=15):
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sys; sys.path.insert(0, '.'); import app"],
+                       capture_output=True, text=True, env=os.environ)
+    filas = []
+    for l in p.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", l)
+        if m: filas.append((int(m.group(2)), int(m.group(1)), m.group(4)))
+    return sorted(filas, reverse=True)[:top]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Tiempo de arranque en frío de app.py")
+    ap.add_argument("--corridas", type=int, default=5)
+    ap.add_argument("--espera", type=float, default=60, help="s máximos esperando a que quede listo")
+    ap.add_argument("--importtime", action="store_true")
+    args = ap.parse_args()
+
+    servidor, listo, procesos, tareas = [], [], [], {}
+    for _ in range(args.corridas):
+        st, total = corrida(args.espera)
+        servidor.append(st["servidor_s"])
+        procesos.append(total)
+        if st["listo"]:
+            listo.append(max(t.get("listo_desde_inicio_s") or 0 for t in st["tareas"].values()))
+        for k, t in st["tareas"].items():
+            tareas.setdefault(k, []).append(t["s"] if t["estado"] == "listo" else t["estado"])
+
+    med = lambda v: sorted(v)[len(v) // 2] if v else None
+    print(f"modo: {'perezoso' if os.getenv('ARRANQUE_PEREZOSO', '1') == '1' else 'ansioso'}")
+    print(f"servidor armado (mediana):  {med(servidor)} s   {servidor}")
+    print(f"listo (mediana):            {med(listo)} s   ({len(listo)}/{args.corridas} corridas llegaron)")
+    print(f"proceso completo (mediana): {med(procesos):.2f} s")
+    for k, v in tareas.items():
+        print(f"   {k:<12} {v}")
+
+    if args.importtime:
+        print(f"\n{'acumulado ms':>13} {'propio ms':>10}  módulo")
+        for acum, propio, mod in importtime():
+            print(f"{acum / 1000:>13.1f} {propio / 1000:>10.1f}  {mod}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# bench_carga.py
+#
+# Prueba de carga con cientos de dashboards simulados contra un servidor ya
+# levantado (mejor con REPLAY_DE para tener cámara, frases y audio sin red):
+#
+#     SERVIDOR_MODO=asgi REPLAY_DE=data/grabaciones/fiesta1 python app.py
+#     cd backend && python -m benchmarks.bench_carga --clientes 300 --lentos 0.1 --segundos 60
+#
+# Cada cliente se conecta por WebSocket, entra a la sala y se suscribe al
+# preview, como el dashboard. Los "lentos" tardan en procesar cada frame
+# (confirman tarde). Se mide:
+#   - tiempo de conexión,
+#   - fps del preview por cliente, rápidos vs. lentos,
+#   - dispersión del fan-out: para cada evento a la sala (análisis, chunk de
+#     audio) la diferencia entre el primer y el último cliente rápido que lo
+#     recibe. Si un lento trabara al resto, crecería con --lentos.
+# Todos los clientes corren en un solo loop de asyncio (AsyncClient; requiere aiohttp).
+
+import argparse, asyncio, json, sys, time, urllib.request
+from collections import defaultdict
+import numpy as np
+import socketio
+
+
+class Dashboard:
+    def __init__(self, i, url, sala, lento_s, registro):
+        self.i, self.url, self.sala, self.lento_s = i, url, sala, lento_s
+        self.registro = registro     # clave de evento -> [monotonic de llegada por cliente rápido]
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.frames = self.bytes = self.analisis = self.chunks = 0
+        self.conectar_s = None
+        self.desconectado = self.cerrando = False
+
+        @self.sio.on("frame_jpeg")
+        async def frame(datos):
+            self.frames += 1; self.bytes += len(datos)
+            if self.lento_s: await asyncio.sleep(self.lento_s)   # decodificar/pintar lento
+            return True   # ack: el servidor puede mandar el siguiente
+
+        @self.sio.on("analysis_update")
+        async def analisis(datos):
+            self.analisis += 1
+            self._llegada(("analisis", self.analisis))
+
+        @self.sio.on("dj_audio_chunk")
+        async def chunk(datos):
+            self.chunks += 1; self.bytes += len(datos.get("data") or b"")
+            self._llegada(("audio", datos.get("id"), datos.get("seq")))
+
+        @self.sio.on("disconnect")
+        async def desconexion(*_):
+            self.desconectado = not self.cerrando   # solo cuentan las caídas durante la prueba
+
+    def _llegada(self, clave):
+        if not self.lento_s: self.registro[clave].append(time.monotonic())
+
+    async def conectar(self):
+        t0 = time.perf_counter()
+        await self.sio.connect(self.url, transports=["websocket"])
+        self.conectar_s = time.perf_counter() - t0
+        await self.sio.call("join_session", {"sala": self.sala})   # espera el ack, como el dashboard
+        await self.sio.emit("subscribe_preview", {"sala": self.sala})
+
+
+def p(valores, q):
+    return float(np.percentile(valores, q)) if len(valores) else float("nan")
+
+
+async def correr(args):
+    registro = defaultdict(list)
+    n_lentos = int(args.clientes * args.lentos)
+    clientes = [Dashboard(i, args.url, args.sala, args.lento_ms / 1000 if i < n_lentos else 0, registro)
+                for i in range(args.clientes)]
+
+    # Conexiones en tandas, como una sala que se va llenando
+    for i in range(0, len(clientes), args.tanda):
+        res = await asyncio.gather(*(c.conectar() for c in clientes[i:i + args.tanda]), return_exceptions=True)
+        for r in res:
+            if isinstance(r, Exception): print(f"⚠️  Conexión fallida: {r!r}")
+    conectados = [c for c in clientes if c.conectar_s is not None]
+    print(f"🔌 {len(conectados)}/{len(clientes)} conectados ({n_lentos} lentos)")
+
+    if args.iniciar:
+        await conectados[-1].sio.emit("start_camera", {"sala": args.sala})
+    t0 = time.perf_counter()
+    await asyncio.sleep(args.segundos)
+    dur = time.perf_counter() - t0
+    for c in conectados: c.cerrando = True
+    await asyncio.gather(*(c.sio.disconnect() for c in conectados), return_exceptions=True)
+    return conectados, registro, dur
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Carga con dashboards simulados")
+    ap.add_argument("--url", default="http://localhost:5000")
+    ap.add_argument("--sala", default="principal")
+    ap.add_argument("--clientes", type=int, default=300)
+    ap.add_argument("--lentos", type=float, default=0.1, help="fracción de clientes lentos")
+    ap.add_argument("--lento-ms", type=float, default=500, help="demora por frame de un cliente lento")
+    ap.add_argument("--tanda", type=int, default=50, help="conexiones simultáneas al arrancar")
+    ap.add_argument("--segundos", type=float, default=60)
+    ap.add_argument("--iniciar", action="store_true", help="enviar start_camera a la sala")
+    args = ap.parse_args()
+
+    clientes, registro, dur = asyncio.run(correr(args))
+    if not clientes:
+        sys.exit("Ningún cliente pudo conectarse.")
+    rapidos = [c for c in clientes if not c.lento_s]
+    lentos  = [c for c in clientes if c.lento_s]
+    conexion = [c.conectar_s * 1000 for c in clientes]
+    print(f"\nconexión ms  p50 {p(conexion, 50):.0f}  p95 {p(conexion, 95):.0f}  máx {max(conexion):.0f}")
+    for nombre, grupo in (("rápidos", rapidos), ("lentos", lentos)):
+        if not grupo: continue
+        fps = [c.frames / dur for c in grupo]
+        print(f"{nombre:<8} n={len(grupo):<4} fps p50 {p(fps, 50):5.1f}  p5 {p(fps, 5):5.1f}  "
+              f"análisis/cliente {np.mean([c.analisis for c in grupo]):.1f}  "
+              f"chunks/cliente {np.mean([c.chunks for c in grupo]):.1f}")
+    # Solo eventos que les llegaron a casi todos los rápidos (los que se conectaron antes de emitirse)
+    dispersion = [(max(t) - min(t)) * 1000 for t in registro.values() if len(t) >= 0.9 * len(rapidos)]
+    if dispersion:
+        print(f"fan-out ms   p50 {p(dispersion, 50):.1f}  p95 {p(dispersion, 95):.1f}  "
+              f"máx {max(dispersion):.1f}  ({len(dispersion)} eventos)")
+    print(f"recibido {sum(c.bytes for c in clientes) / dur / 2**20:.2f} MB/s, "
+          f"desconexiones {sum(c.desconectado for c in clientes)}")
+
+    try:
+        with urllib.request.urlopen(args.url + "/stats", timeout=5) as r:
+            stats = json.load(r)
+        print("servidor:", json.dumps({"transporte": stats.get("transporte"),
+                                       "preview": stats["salas"].get(args.sala, {}).get("preview")},
+                                      ensure_ascii=False))
+    except Exception as e:
+        print(f"(sin /stats: {e})")
+
+
+if __name__ == "__main__":
+    main()
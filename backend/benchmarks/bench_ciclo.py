@@ -0,0 +1,152 @@
+# bench_ciclo.py
+#
+# Benchmark de punta a punta del ciclo capture_and_analyze sobre una
+# grabación (ver grabacion.py): cámara, Gemini, ElevenLabs y Spotify son los
+# dobles del replay, con las latencias medidas al grabar. Reporta p50/p95/p99
+# por etapa, throughput, memoria y bytes emitidos por Socket.IO, y compara
+# contra una corrida base para cortar regresiones antes de desplegar.
+#
+#     cd backend && python -m benchmarks.bench_ciclo data/grabaciones/fiesta1 \
+#         --salas 2 --segundos 60 --guardar base.json
+#     cd backend && python -m benchmarks.bench_ciclo data/grabaciones/fiesta1 \
+#         --salas 2 --segundos 60 --base base.json     # sale con 1 si hay regresión
+
+import argparse, json, os, resource, sys, tempfile, threading, time
+from collections import Counter
+
+sys.path.insert(0, ".")
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def correr(args):
+    # Configuración del replay antes de importar la app
+    tmp = tempfile.mkdtemp(prefix="bench_ciclo_")
+    os.environ.update({
+        "REPLAY_DE": args.grabacion,
+        "REPLAY_VELOCIDAD": str(args.velocidad),
+        "INTERVALO_MIN": str(args.intervalo),
+        "GEMINI_POR_HORA": "1000000", "ELEVENLABS_POR_HORA": "1000000",
+        "VOZ_REUSO": "0",                        # medir el camino completo frase -> TTS
+        "CACHE_VOZ_DIR": os.path.join(tmp, "cache_voz"),
+        "HISTORIAL_DB": os.path.join(tmp, "historial.db"),
+        "ENERGIA_CALIBRACION": os.path.join(tmp, "energia.json"),
+        "MAX_SALAS": str(args.salas + 1),
+    })
+    for var in ("GEMINI_API_KEY", "ELEVENLABS_API_KEY", "SPOTIPY_CLIENT_ID",
+                "SPOTIPY_CLIENT_SECRET", "SPOTIPY_REDIRECT_URI"):
+        os.environ.setdefault(var, "replay")
+    import app
+    from pipeline import tiempos
+    from metricas import tamaño_payload
+
+    # Sin clientes reales: se cuenta lo emitido y se confirma al instante
+    eventos, bytes_eventos = Counter(), Counter()
+    def emitir(evento, datos=None, *a, callback=None, **kw):
+        eventos[evento] += 1
+        bytes_eventos[evento] += tamaño_payload(datos)
+        if callback: callback()
+    app.socketio.emit = emitir
+
+    rss0 = rss_mb()
+    salas = [app.salas.obtener(f"bench{i}") for i in range(args.salas)]
+    for s in salas:
+        s.preview.suscribir(f"sid-{s.sala}")
+        if not s.iniciar(): sys.exit(f"No se pudo abrir la fuente de replay de {s.sala}")
+        app.capture_and_analyze(s)
+
+    memoria, vivo = [], threading.Event()
+    vivo.set()
+    def muestrear():
+        while vivo.is_set():
+            memoria.append(rss_mb()); time.sleep(0.5)
+    threading.Thread(target=muestrear, daemon=True).start()
+
+    c0, t0 = time.process_time(), time.perf_counter()
+    time.sleep(args.segundos)
+    cpu, dur = time.process_time() - c0, time.perf_counter() - t0
+    vivo.clear()
+    frames = sum(s.camara.frames_leidos for s in salas)
+    analisis = sum(s.conteo for s in salas)
+    for s in salas: s.detener()
+
+    etapas = tiempos.resumen()
+    return {
+        "config": {"salas": args.salas, "segundos": args.segundos, "velocidad": args.velocidad,
+                   "intervalo_min": args.intervalo},
+        "etapas": etapas,
+        "throughput": {
+            "analisis_por_min": round(analisis / dur * 60, 2),
+            "ciclos_por_min": round(etapas.get("ciclo", {}).get("n", 0) / dur * 60, 2),
+            "fps_por_sala": round(frames / dur / args.salas, 1),
+        },
+        "cpu_nucleos": round(cpu / dur, 2),
+        "memoria_mb": {"inicio": round(rss0, 1), "max": round(max(memoria or [rss0]), 1),
+                       "final": round(memoria[-1] if memoria else rss0, 1)},
+        "socket": {"bytes_por_s": round(sum(bytes_eventos.values()) / dur),
+                   "eventos": {e: {"n": eventos[e], "bytes": bytes_eventos[e]} for e in eventos}},
+        "replay": app.replay.stats(),
+    }
+
+
+def regresiones(actual, base, tolerancia):
+    """Lista de textos con lo que empeoró más de `tolerancia` respecto de la base."""
+    malas = []
+    for etapa, m in base.get("etapas", {}).items():
+        nueva = actual["etapas"].get(etapa)
+        if not nueva: continue
+        for p in ("p50_ms", "p95_ms", "p99_ms"):
+            if m.get(p) and nueva[p] > m[p] * (1 + tolerancia):
+                malas.append(f"{etapa} {p}: {m[p]} -> {nueva[p]}")
+    for k, v in base.get("throughput", {}).items():
+        if v and actual["throughput"].get(k, 0) < v * (1 - tolerancia):
+            malas.append(f"throughput {k}: {v} -> {actual['throughput'].get(k)}")
+    if actual["memoria_mb"]["max"] > base["memoria_mb"]["max"] * (1 + tolerancia):
+        malas.append(f"memoria máx: {base['memoria_mb']['max']} -> {actual['memoria_mb']['max']} MB")
+    if actual["socket"]["bytes_por_s"] > base["socket"]["bytes_por_s"] * (1 + tolerancia):
+        malas.append(f"socket bytes/s: {base['socket']['bytes_por_s']} -> {actual['socket']['bytes_por_s']}")
+    return malas
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark del ciclo completo sobre una grabación")
+    ap.add_argument("grabacion", help="directorio grabado con GRABAR_EN")
+    ap.add_argument("--salas", type=int, default=1)
+    ap.add_argument("--segundos", type=float, default=60)
+    ap.add_argument("--velocidad", type=float, default=1.0, help="acelera las latencias grabadas")
+    ap.add_argument("--intervalo", type=float, default=2.0, help="INTERVALO_MIN para el replay (s)")
+    ap.add_argument("--guardar", help="escribir el resultado en este JSON")
+    ap.add_argument("--base", help="JSON de una corrida anterior para comparar")
+    ap.add_argument("--tolerancia", type=float, default=0.2, help="empeoramiento aceptado (0.2 = 20 %%)")
+    args = ap.parse_args()
+
+    res = correr(args)
+    print(f"\n{'etapa':<20} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for etapa, m in sorted(res["etapas"].items()):
+        print(f"{etapa:<20} {m['n']:>5} {m['p50_ms']:>9} {m['p95_ms']:>9} {m['p99_ms']:>9}")
+    print(f"\nthroughput: {res['throughput']}")
+    print(f"CPU: {res['cpu_nucleos']} núcleos   memoria: {res['memoria_mb']} MB")
+    print(f"socket: {res['socket']['bytes_por_s'] / 1024:.1f} KB/s")
+    for e, v in sorted(res["socket"]["eventos"].items()):
+        print(f"   {e:<18} {v['n']:>6} eventos {v['bytes'] / 1024:>10.1f} KB")
+
+    if args.guardar:
+        with open(args.guardar, "w") as f: json.dump(res, f, indent=2, ensure_ascii=False)
+    if args.base:
+        with open(args.base) as f: base = json.load(f)
+        malas = regresiones(res, base, args.tolerancia)
+        if malas:
+            print("\n❌ Regresiones:\n   " + "\n   ".join(malas))
+            os._exit(1)
+        print("\n✅ Sin regresiones respecto de la base.")
+    os._exit(0)   # sin esperar a que los pools de pipeline.py terminen lo que quedó en vuelo
+
+
+if __name__ == "__main__":
+    main()
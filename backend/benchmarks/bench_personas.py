@@ -0,0 +1,67 @@
+# bench_personas.py
+#
+# Costo por frame del detector de personas local. Pasa los mismos frames (un
+# video, una carpeta de imágenes o, sin ruta, frames sintéticos) por cada
+# backend y tamaño de entrada, y reporta reloj y CPU por frame, personas
+# detectadas y la CPU que se lleva el detector en vivo con DETECTOR_CADA a
+# 30 fps. Un hilo, como en producción.
+#
+#     cd backend && python -m benchmarks.bench_personas [fiesta.mp4] [--lados 320,480,640] [--modos hog,dnn]
+
+import argparse, sys, time
+import numpy as np
+
+sys.path.insert(0, ".")
+from personas import crear_backend, reducir_a, DETECTOR_CADA
+from benchmarks.replay_preproceso import leer_frames
+
+FPS = 30
+
+
+def sinteticos(n, forma=(720, 1280, 3), semilla=0):
+    rnd = np.random.default_rng(semilla)
+    for _ in range(n):
+        yield rnd.integers(0, 255, forma, dtype=np.uint8)
+
+
+def medir(backend, frames, lado):
+    reloj, cpu, conteos = [], [], []
+    for frame in frames:
+        t0, c0 = time.perf_counter(), time.thread_time()
+        conteos.append(backend.contar(reducir_a(frame, lado)))   # el reducido también lo paga el detector
+        reloj.append(time.perf_counter() - t0)
+        cpu.append(time.thread_time() - c0)
+    return np.array(reloj) * 1000, np.array(cpu) * 1000, conteos
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Costo de CPU del detector de personas")
+    ap.add_argument("ruta", nargs="?", help="video o carpeta de imágenes (sin ruta: frames sintéticos)")
+    ap.add_argument("--cada", type=int, default=10, help="usar 1 de cada N frames del video")
+    ap.add_argument("--max", type=int, default=60, help="máximo de frames")
+    ap.add_argument("--lados", default="320,480,640")
+    ap.add_argument("--modos", default="hog,dnn")
+    args = ap.parse_args()
+
+    fuente = leer_frames(args.ruta, args.cada) if args.ruta else sinteticos(args.max)
+    frames = [f for _, f in zip(range(args.max), fuente)]
+    if not frames:
+        sys.exit("No se leyó ningún frame.")
+    print(f"{len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"detector cada {DETECTOR_CADA} frames a {FPS} fps\n")
+
+    print(f"{'modo':<5} {'lado':>5} {'ms p50':>7} {'ms p95':>7} {'CPU ms':>7} {'personas':>9} {'CPU en vivo':>12}")
+    for modo in args.modos.split(","):
+        backend = crear_backend(modo)
+        if backend.nombre != modo: continue   # dnn sin modelo: ya se midió como hog
+        backend.contar(reducir_a(frames[0], 320))   # calentar (reserva de buffers, carga de la red)
+        for lado in (int(l) for l in args.lados.split(",")):
+            reloj, cpu, conteos = medir(backend, frames, lado)
+            # Fracción de un núcleo que consume el hilo detector en producción
+            en_vivo = cpu.mean() / 1000 * FPS / DETECTOR_CADA
+            print(f"{modo:<5} {lado:>5} {np.percentile(reloj, 50):>7.1f} {np.percentile(reloj, 95):>7.1f} "
+                  f"{cpu.mean():>7.1f} {np.mean(conteos):>9.2f} {en_vivo:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bench_salas.py
+#
+# Costo de CPU por sala. Levanta N salas con una cámara sintética a 30 fps
+# (capturador + filtro de escena + estimador de energía + preview JPEG con un
+# suscriptor) y mide el tiempo de CPU del proceso durante una ventana fija.
+# Sin red ni Spotify: solo el trabajo local que escala con las salas.
+#
+#     cd backend && python -m benchmarks.bench_salas [max_salas] [segundos]
+
+import sys, threading, time
+import numpy as np
+
+sys.path.insert(0, ".")
+from camara import Capturador
+from preview import DifusorPreview
+from escena import FiltroEscena
+from energia_local import EstimadorEnergia
+
+FPS        = 30
+RESOLUCION = (720, 1280)
+
+
+class CamaraSintetica:
+    """Misma interfaz que cv2.VideoCapture; un bloque que se mueve sobre ruido fijo."""
+
+    def __init__(self, fps=FPS, forma=RESOLUCION, semilla=0):
+        rnd = np.random.default_rng(semilla)
+        self.fondo = rnd.integers(0, 255, forma + (3,), dtype=np.uint8)
+        self.periodo = 1.0 / fps
+        self.t = time.monotonic()
+        self.n = 0
+        self.abierta = True
+
+    def isOpened(self):
+        return self.abierta
+
+    def release(self):
+        self.abierta = False
+
+    def read(self, destino=None):
+        espera = self.t + self.periodo - time.monotonic()
+        if espera > 0: time.sleep(espera)
+        self.t = max(self.t + self.periodo, time.monotonic() - self.periodo)
+        frame = destino if destino is not None and destino.shape == self.fondo.shape else np.empty_like(self.fondo)
+        np.copyto(frame, self.fondo)
+        x = (self.n * 8) % (frame.shape[1] - 200)
+        frame[200:400, x:x + 200] = 255
+        self.n += 1
+        return True, frame
+
+
+class SocketNulo:
+    """Responde el ack al instante, como un cliente rápido."""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def emit(self, evento, datos=None, to=None, callback=None, **_):
+        if isinstance(datos, (bytes, bytearray)): self.bytes += len(datos)
+        if callback: callback()
+
+
+def sala(i, socket):
+    camara = Capturador(CamaraSintetica(semilla=i))
+    camara.iniciar()
+    preview, filtro = DifusorPreview(socket), FiltroEscena()
+    estimador = EstimadorEnergia(ruta=f"/tmp/bench_energia_{i}.json")
+    preview.suscribir(f"sid{i}")
+    preview.iniciar(camara)
+    estimador.iniciar(camara)
+
+    # El planificador evalúa el filtro de escena ~1 vez/s por sala
+    vivo = threading.Event(); vivo.set()
+    def ciclo():
+        while vivo.is_set():
+            _, frame = camara.ultimo()
+            if frame is not None:
+                if filtro.evaluar(frame): filtro.aceptar()
+                else: filtro.saltar()
+            time.sleep(1)
+    threading.Thread(target=ciclo, daemon=True).start()
+
+    def detener():
+        vivo.clear(); preview.detener(); estimador.detener(); camara.detener()
+    return camara, detener
+
+
+def medir(n, segundos):
+    socket = SocketNulo()
+    salas = [sala(i, socket) for i in range(n)]
+    time.sleep(1)                                   # calentamiento: anillos reservados
+    c0, t0 = time.process_time(), time.perf_counter()
+    leidos0 = sum(c.frames_leidos for c, _ in salas)
+    time.sleep(segundos)
+    cpu, pared = time.process_time() - c0, time.perf_counter() - t0
+    fps = (sum(c.frames_leidos for c, _ in salas) - leidos0) / pared / n
+    for _, detener in salas: detener()
+    return cpu / pared, fps, socket.bytes / pared
+
+
+if __name__ == "__main__":
+    max_salas = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    segundos  = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"{'salas':>5} {'CPU (núcleos)':>14} {'por sala':>9} {'marginal':>9} {'fps/sala':>9} {'preview KB/s':>13}")
+    previo = 0.0
+    for n in range(1, max_salas + 1):
+        cpu, fps, bps = medir(n, segundos)
+        print(f"{n:>5} {cpu:>14.2f} {cpu / n:>9.2f} {cpu - previo:>9.2f} {fps:>9.1f} {bps / 1024:>13.0f}")
+        previo = cpu
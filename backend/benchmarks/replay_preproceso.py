@@ -0,0 +1,121 @@
+# replay_preproceso.py
+#
+# Replay local para ajustar el preproceso de visión. Pasa los mismos frames
+# (un video o una carpeta de imágenes) por varias configuraciones de
+# Preprocesador y reporta bytes y latencia de cada una. Con --gemini además
+# manda cada variante a Gemini y la compara con la imagen a resolución
+# completa (nivel_energia, número de personas, hay_personas).
+#
+#     cd backend && python -m benchmarks.replay_preproceso fiesta.mp4 [--cada 30] [--gemini]
+
+import argparse, glob, os, sys, time
+import cv2
+import numpy as np
+
+sys.path.insert(0, ".")
+from escena import reducir
+from energia_local import ENERGIA_PIXEL
+from preproceso import Preprocesador
+
+CONFIGS = [
+    # (lado, formato, calidad, recorte)
+    (0,    "jpeg", 95, False),    # referencia: resolución completa
+    (1024, "jpeg", 85, False),
+    (768,  "jpeg", 80, False),
+    (512,  "jpeg", 75, False),
+    (768,  "webp", 75, False),
+    (768,  "jpeg", 80, True),
+    (512,  "webp", 70, True),
+]
+
+
+def leer_frames(ruta, cada=1):
+    """Frames BGR de un video o de una carpeta de imágenes (orden alfabético), uno de cada `cada`."""
+    if os.path.isdir(ruta):
+        archivos = sorted(f for ext in ("jpg", "jpeg", "png", "webp")
+                          for f in glob.glob(os.path.join(ruta, f"*.{ext}")))
+        for i, f in enumerate(archivos):
+            if i % cada == 0:
+                frame = cv2.imread(f)
+                if frame is not None: yield frame
+        return
+    cap = cv2.VideoCapture(ruta)
+    i = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok: break
+        if i % cada == 0: yield frame
+        i += 1
+    cap.release()
+
+
+def con_mapa(frames):
+    """Agrega a cada frame un mapa de movimiento como el de EstimadorEnergia."""
+    previo = mapa = None
+    for frame in frames:
+        peq = reducir(frame)
+        if previo is not None:
+            mascara = (cv2.absdiff(peq, previo) > ENERGIA_PIXEL).astype(np.float32)
+            if mapa is None: mapa = np.zeros_like(mascara)
+            cv2.accumulateWeighted(mascara, mapa, 0.3)   # pocos frames por análisis: memoria corta
+        previo = peq
+        yield frame, (None if mapa is None else mapa.copy())
+
+
+def comparar(ref, otro):
+    if not ref or not otro: return None
+    return {
+        "dif_energia": abs((ref.get("nivel_energia") or 0) - (otro.get("nivel_energia") or 0)),
+        "dif_personas": abs((ref.get("numero_personas") or 0) - (otro.get("numero_personas") or 0)),
+        "hay_personas_ok": ref.get("hay_personas") == otro.get("hay_personas"),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay del preproceso de visión")
+    ap.add_argument("ruta", help="video o carpeta de imágenes")
+    ap.add_argument("--cada", type=int, default=30, help="analizar 1 de cada N frames")
+    ap.add_argument("--max", type=int, default=50, help="máximo de frames analizados")
+    ap.add_argument("--gemini", action="store_true", help="comparar también la respuesta de Gemini")
+    args = ap.parse_args()
+
+    analizar = None
+    if args.gemini:
+        from dj_ai2 import analizar_ambiente as analizar
+
+    prepros = [Preprocesador(lado=l, formato=f, calidad=q, recorte=r) for l, f, q, r in CONFIGS]
+    resultados = [{"bytes": [], "ms": [], "vision_ms": [], "comparaciones": []} for _ in prepros]
+
+    n = 0
+    for frame, mapa in con_mapa(leer_frames(args.ruta, args.cada)):
+        if n >= args.max: break
+        n += 1
+        ref = None
+        for i, (pp, res) in enumerate(zip(prepros, resultados)):
+            img = pp.procesar(frame, mapa)
+            res["bytes"].append(img["bytes"]); res["ms"].append(img["ms"])
+            if analizar:
+                t0 = time.perf_counter()
+                analisis = analizar({"mime_type": img["mime_type"], "data": img["data"]})
+                res["vision_ms"].append((time.perf_counter() - t0) * 1000)
+                if i == 0: ref = analisis
+                else: res["comparaciones"].append(comparar(ref, analisis))
+
+    if not n:
+        sys.exit("No se leyó ningún frame.")
+    print(f"{n} frames\n")
+    print(f"{'config':<24} {'KB medio':>9} {'prep ms':>8} {'visión ms':>10} {'Δenergía':>9} {'Δpersonas':>10} {'hay_p ok':>9}")
+    for (l, f, q, r), res in zip(CONFIGS, resultados):
+        nombre = f"{l or 'orig'}/{f}/q{q}{'/roi' if r else ''}"
+        kb = np.mean(res["bytes"]) / 1024
+        ms = np.mean(res["ms"])
+        vis = f"{np.mean(res['vision_ms']):.0f}" if res["vision_ms"] else "-"
+        comps = [c for c in res["comparaciones"] if c]
+        de = f"{np.mean([c['dif_energia'] for c in comps]):.2f}" if comps else "-"
+        dp = f"{np.mean([c['dif_personas'] for c in comps]):.2f}" if comps else "-"
+        ok = f"{np.mean([c['hay_personas_ok'] for c in comps]):.0%}" if comps else "-"
+        print(f"{nombre:<24} {kb:>9.1f} {ms:>8.1f} {vis:>10} {de:>9} {dp:>10} {ok:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# spotify_falso.py
+#
+# Servidor HTTP local que imita los endpoints de Spotify que usa el backend,
+# con un límite de tasa propio que responde 429 + Retry-After. Sirve para
+# ejercitar ClienteSpotify sin cuenta ni red:
+#
+#     cd backend && python -m benchmarks.spotify_falso
+#
+# Como módulo, `iniciar(puerto)` levanta el servidor en un hilo y devuelve
+# el prefijo para ClienteSpotify(prefijo=..., auth="falso").
+
+import json, random, re, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+LIMITE_POR_SEGUNDO = 8
+RETRY_AFTER        = 1
+
+estado = {
+    "is_playing": False, "item": None, "progress_ms": 0, "cola": [],
+    "peticiones": 0, "respuestas_429": 0, "comandos": 0,
+}
+_ventana = {"t": 0, "n": 0}
+_lock = threading.Lock()
+
+
+def _pistas(pid, n=250):
+    return [f"spotify:track:{pid[:6]}{i:05d}" for i in range(n)]
+
+
+class Manejador(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _limitado(self):
+        with _lock:
+            estado["peticiones"] += 1
+            seg = int(time.time())
+            if _ventana["t"] != seg:
+                _ventana["t"], _ventana["n"] = seg, 0
+            _ventana["n"] += 1
+            if _ventana["n"] > LIMITE_POR_SEGUNDO:
+                estado["respuestas_429"] += 1
+                return True
+        return False
+
+    def _responder(self, codigo, cuerpo=None, headers=None):
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else b""
+        self.send_response(codigo)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if datos:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _despachar(self, metodo):
+        if self._limitado():
+            return self._responder(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                                   {"Retry-After": str(RETRY_AFTER)})
+        url = urlparse(self.path)
+        ruta, qs = url.path.removeprefix("/v1/").rstrip("/"), parse_qs(url.query)
+
+        if metodo == "GET" and ruta == "me/player":
+            with _lock:
+                return self._responder(200, {k: estado[k] for k in ("is_playing", "item", "progress_ms")})
+        if metodo == "PUT" and ruta in ("me/player/play", "me/player/pause"):
+            with _lock:
+                estado["comandos"] += 1
+                estado["is_playing"] = ruta.endswith("play")
+                largo = int(self.headers.get("Content-Length") or 0)
+                cuerpo = json.loads(self.rfile.read(largo) or b"{}") if largo else {}
+                if cuerpo.get("uris"):
+                    estado["item"] = {"uri": cuerpo["uris"][0], "duration_ms": 200000}
+                    estado["progress_ms"] = 0
+            return self._responder(204)
+        if metodo == "POST" and ruta in ("me/player/next", "me/player/queue"):
+            with _lock:
+                estado["comandos"] += 1
+                if ruta.endswith("queue"):
+                    estado["cola"].append(qs.get("uri", [None])[0])
+                elif estado["cola"]:
+                    estado["item"] = {"uri": estado["cola"].pop(0), "duration_ms": 200000}
+            return self._responder(204)
+
+        # spotipy 2.26 pide /items; las versiones anteriores, /tracks
+        m = re.fullmatch(r"playlists/([^/]+)(?:/(tracks|items))?", ruta)
+        if metodo == "GET" and m:
+            pid = m.group(1)
+            if not m.group(2):
+                return self._responder(200, {"snapshot_id": f"snap-{pid}"})
+            offset = int(qs.get("offset", ["0"])[0])
+            pistas = _pistas(pid)
+            pagina = pistas[offset:offset + 100]
+            siguiente = (f"http://{self.headers['Host']}/v1/playlists/{pid}/{m.group(2)}?offset={offset + 100}"
+                         if offset + 100 < len(pistas) else None)
+            return self._responder(200, {"items": [{"track": {"uri": u}} for u in pagina], "next": siguiente})
+        if metodo == "GET" and ruta == "audio-features":
+            ids = qs.get("ids", [""])[0].split(",")
+            rnd = random.Random(ids[0])
+            return self._responder(200, {"audio_features": [
+                {"uri": f"spotify:track:{i}", "tempo": rnd.uniform(80, 160),
+                 "energy": rnd.random(), "danceability": rnd.random()} for i in ids if i]})
+        return self._responder(404, {"error": {"status": 404, "message": "no implementado"}})
+
+    def do_GET(self):  self._despachar("GET")
+    def do_PUT(self):  self._despachar("PUT")
+    def do_POST(self): self._despachar("POST")
+
+
+def iniciar(puerto=0):
+    """Levanta el servidor en segundo plano. Devuelve (servidor, prefijo_api)."""
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/v1/"
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ".")
+    from spotify_controller.cliente import ClienteSpotify
+
+    servidor, prefijo = iniciar()
+    cliente = ClienteSpotify(prefijo=prefijo, auth="falso")
+
+    # Ráfaga de saltos desde varios hilos + lecturas de estado
+    t0 = time.perf_counter()
+    futuros = []
+    def saltar(n):
+        for i in range(25):
+            futuros.append(cliente.comando("start_playback", uris=[f"spotify:track:h{n}-{i}"]))
+            time.sleep(0.01)
+    hilos = [threading.Thread(target=saltar, args=(n,)) for n in range(4)]
+    for h in hilos: h.start()
+    for _ in range(20):
+        cliente.current_playback()
+    for h in hilos: h.join()
+    for f in futuros: f.result(timeout=60)
+    dt = time.perf_counter() - t0
+
+    print(f"Duración:                 {dt:.2f}s")
+    print(f"Comandos pedidos:         {len(futuros)}")
+    print(f"Cliente:                  {cliente.stats()}")
+    print(f"Servidor (peticiones/429): {estado['peticiones']} / {estado['respuestas_429']}")
+    print(f"Pista final:              {estado['item']['uri'] if estado['item'] else None}")
+    servidor.shutdown()
@@ -0,0 +1,208 @@
+# cache_voz.py
+#
+# Caché en disco de frases del DJ y su audio sintetizado. El audio se guarda
+# direccionado por contenido: sha256(persona | voice_id | model_id | frase
+# normalizada). Cada entrada recuerda además la "situación" (cubeta de
+# energía, sala vacía, gente aburrida) para poder reutilizar clips ya pagados
+# —o los pregrabados de static/audio_files— en una fracción de los pedidos.
+
+import hashlib, json, os, random, re, threading, time, unicodedata
+from collections import OrderedDict
+from energia_local import cubeta
+
+# ---------- parámetros ajustables --------------
+CACHE_DIR       = os.getenv("CACHE_VOZ_DIR", os.path.join(os.path.dirname(__file__), "data", "cache_voz"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_VOZ_MAX_MB", 200)) * 1024 * 1024
+CACHE_MAX_EDAD  = float(os.getenv("CACHE_VOZ_MAX_DIAS", 30)) * 86400
+VOZ_REUSO       = float(os.getenv("VOZ_REUSO", 0.3))   # fracción de pedidos servidos desde caché/clips
+CLIPS_DIR       = os.path.join(os.path.dirname(__file__), "static", "audio_files")
+# -----------------------------------------------
+
+CUBETAS = ("energia_baja", "energia_media", "energia_alta")
+TODAS   = "*"   # persona comodín de los clips pregrabados
+
+
+def normalizar(frase: str) -> str:
+    f = unicodedata.normalize("NFC", frase).strip().strip('"“”').lower()
+    return re.sub(r"\s+", " ", f)
+
+
+def clave(persona, voice_id, model_id, frase) -> str:
+    return hashlib.sha256(f"{persona}|{voice_id}|{model_id}|{normalizar(frase)}".encode()).hexdigest()
+
+
+def situacion(analisis: dict) -> str:
+    """Clave de situación en cubetas: energia_{baja,media,alta}[_aburridos] o nadie_presente."""
+    if analisis.get("hay_personas") is False:
+        return "nadie_presente"
+    s = CUBETAS[cubeta(analisis.get("nivel_energia", 5))]
+    return s + "_aburridos" if analisis.get("personas_aburridas") else s
+
+
+class CacheVoz:
+    """LRU en disco con desalojo por tamaño y edad."""
+
+    def __init__(self, directorio=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                 max_edad=CACHE_MAX_EDAD, reuso=VOZ_REUSO):
+        self.dir       = directorio
+        self.max_bytes = max_bytes
+        self.max_edad  = max_edad
+        self.reuso     = reuso
+
+        self._lock     = threading.Lock()
+        self._entradas = OrderedDict()    # clave -> meta; orden = LRU (el último es el más reciente)
+        self._por_sit  = {}               # (persona, situacion) -> set(claves)
+        self._bytes    = 0
+
+        self.aciertos = self.fallos = self.reusos = 0
+        os.makedirs(self.dir, exist_ok=True)
+        self._cargar()
+
+    # ------------------ índice ------------------
+    def _ruta_indice(self):
+        return os.path.join(self.dir, "indice.json")
+
+    def _cargar(self):
+        try:
+            with open(self._ruta_indice()) as f:
+                entradas = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️  Índice de caché de voz ilegible, se empieza vacío: {e}"); return
+        for k, meta in sorted(entradas.items(), key=lambda kv: kv[1]["usado"]):
+            if os.path.exists(meta["ruta"]):
+                self._indexar(k, meta)
+        self._desalojar()
+
+    def _guardar_indice(self):
+        tmp = self._ruta_indice() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({k: m for k, m in self._entradas.items() if not m.get("fija")}, f)
+        os.replace(tmp, self._ruta_indice())
+
+    def _indexar(self, k, meta):
+        self._entradas[k] = meta
+        self._por_sit.setdefault((meta["persona"], meta["situacion"]), set()).add(k)
+        if not meta.get("fija"):
+            self._bytes += meta["bytes"]
+
+    def _quitar(self, k, borrar=True):
+        meta = self._entradas.pop(k)
+        self._por_sit.get((meta["persona"], meta["situacion"]), set()).discard(k)
+        if not meta.get("fija"):
+            self._bytes -= meta["bytes"]
+            if borrar:
+                try: os.remove(meta["ruta"])
+                except OSError: pass
+
+    def _desalojar(self):
+        ahora = time.time()
+        for k in [k for k, m in self._entradas.items()
+                  if not m.get("fija") and ahora - m["creado"] > self.max_edad]:
+            self._quitar(k)
+        for k in list(self._entradas):
+            if self._bytes <= self.max_bytes: break
+            if not self._entradas[k].get("fija"):
+                self._quitar(k)
+
+    # ------------------ API ------------------
+    def obtener(self, persona, voice_id, model_id, frase):
+        """Audio ya sintetizado para exactamente esta frase, o None."""
+        k = clave(persona, voice_id, model_id, frase)
+        with self._lock:
+            meta = self._entradas.get(k)
+            if meta is None or time.time() - meta["creado"] > self.max_edad:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(k)
+            meta["usado"] = time.time()
+            self.aciertos += 1
+        return self._leer(meta)
+
+    def guardar(self, persona, voice_id, model_id, frase, audio: bytes, sit: str) -> str:
+        """Guarda el audio y devuelve su clave (ver `ruta`)."""
+        k = clave(persona, voice_id, model_id, frase)
+        ruta = os.path.join(self.dir, k + ".mp3")
+        # Escritura atómica: dos hilos de voz con la misma frase escriben el mismo archivo
+        tmp = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, ruta)
+        ahora = time.time()
+        with self._lock:
+            # La entrada vieja (vencida o de otro hilo) apunta al archivo recién escrito: no se borra
+            if k in self._entradas: self._quitar(k, borrar=self._entradas[k]["ruta"] != ruta)
+            self._indexar(k, {"ruta": ruta, "frase": frase, "persona": persona, "situacion": sit,
+                              "bytes": len(audio), "creado": ahora, "usado": ahora})
+            self._desalojar()
+            self._guardar_indice()
+        return k
+
+    def ruta(self, k):
+        """Archivo de la entrada `k` (guardada, reusada o pregrabada), o None si ya no está."""
+        with self._lock:
+            meta = self._entradas.get(k)
+        return meta["ruta"] if meta and os.path.exists(meta["ruta"]) else None
+
+    def reusar(self, persona, sit):
+        """
+        Con probabilidad `reuso` devuelve (frase, audio, clave) de un clip ya
+        existente para esta persona y situación (o un pregrabado genérico). Si
+        no, None.
+        """
+        if self.reuso <= 0 or random.random() >= self.reuso:
+            return None
+        with self._lock:
+            candidatos = list(self._por_sit.get((persona, sit), ())) \
+                       + list(self._por_sit.get((TODAS, sit.replace("_aburridos", "")), ()))
+            if not candidatos: return None
+            k = random.choice(candidatos)
+            meta = self._entradas[k]
+            self._entradas.move_to_end(k)
+            meta["usado"] = time.time()
+            self.reusos += 1
+        audio = self._leer(meta)
+        return (meta["frase"], audio, k) if audio else None
+
+    def precalentar(self, directorio=CLIPS_DIR, persona=TODAS) -> int:
+        """
+        Registra los clips pregrabados (energia_baja_01.mp3, nadie_presente_01.mp3…)
+        sin copiarlos. Quedan fijos: no cuentan para el tamaño ni se desalojan.
+        """
+        n = 0
+        for raiz, _, archivos in os.walk(directorio):
+            for nombre in sorted(archivos):
+                m = re.match(r"(energia_(?:baja|media|alta)|nadie_presente)_\d+\.mp3$", nombre)
+                if not m: continue
+                ruta = os.path.join(raiz, nombre)
+                k = hashlib.sha256(os.path.relpath(ruta, directorio).encode()).hexdigest()
+                with self._lock:
+                    if k in self._entradas: continue
+                    self._indexar(k, {"ruta": ruta, "frase": None, "persona": persona,
+                                      "situacion": m.group(1), "bytes": os.path.getsize(ruta),
+                                      "creado": time.time(), "usado": 0, "fija": True})
+                    self._entradas.move_to_end(k, last=False)
+                n += 1
+        return n
+
+    def _leer(self, meta):
+        try:
+            with open(meta["ruta"], "rb") as f:
+                return f.read()
+        except OSError as e:
+            print(f"⚠️  Clip de caché perdido ({meta['ruta']}): {e}")
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            pedidos = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_acierto": round(self.aciertos / pedidos, 3) if pedidos else 0.0,
+                "reusos": self.reusos,
+                "reuso_configurado": self.reuso,
+            }
@@ -0,0 +1,130 @@
+# camara.py
+#
+# Un solo hilo es dueño de cv2.VideoCapture. Cada frame decodificado se
+# escribe en un buffer circular preasignado y los consumidores (análisis,
+# preview, etc.) leen el más reciente sin tocar el dispositivo.
+
+import threading, time
+import cv2
+import numpy as np
+import metricas
+
+
+class Capturador:
+    """Hilo capturador con buffer circular del último frame."""
+
+    def __init__(self, fuente=0, slots=4):
+        self.fuente = fuente
+        self.slots  = max(2, slots)
+
+        self._cap   = None
+        self._buf   = None           # ndarray (slots, h, w, c), se reserva con el 1er frame
+        self._seq   = 0              # nº del último frame publicado (0 = ninguno)
+        self._ts    = [0.0] * self.slots
+        self._lock  = threading.Condition()
+        self._vivo  = threading.Event()
+        self._hilo  = None
+
+        # ---- estadísticas ----
+        self.fps                = 0.0
+        self.frames_leidos      = 0
+        self.lecturas_fallidas  = 0
+        self.frames_descartados = 0  # publicados que ningún consumidor llegó a leer
+        self._ultimo_servido    = 0
+
+    # ------------------ ciclo de vida ------------------
+    def iniciar(self) -> bool:
+        """Abre la cámara y arranca el hilo. Devuelve False si no se pudo abrir."""
+        # La fuente puede ser un índice/URL de OpenCV, cualquier objeto con la misma
+        # interfaz que VideoCapture (read/isOpened/release) o una función que lo
+        # crea (una fuente nueva por cada inicio): fuentes sintéticas, replay…
+        fuente = self.fuente() if callable(self.fuente) else self.fuente
+        self._cap = fuente if hasattr(fuente, "read") else cv2.VideoCapture(fuente)
+        if not self._cap.isOpened():
+            self._cap.release(); self._cap = None
+            return False
+        self._vivo.set()
+        self._hilo = threading.Thread(target=self._bucle, name="capturador", daemon=True)
+        self._hilo.start()
+        return True
+
+    def detener(self):
+        self._vivo.clear()
+        if self._hilo and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout=2)
+        if self._cap: self._cap.release(); self._cap = None
+        with self._lock:
+            self._lock.notify_all()
+
+    @property
+    def activo(self) -> bool:
+        return self._vivo.is_set()
+
+    # ------------------ hilo capturador ------------------
+    def _bucle(self):
+        ventana_t, ventana_n = time.monotonic(), 0
+        previo = 0.0
+        while self._vivo.is_set():
+            idx = self._seq % self.slots     # siguiente slot (el publicado es seq-1)
+            destino = self._buf[idx] if self._buf is not None else None
+            ok, frame = self._cap.read(destino)
+            if not ok:
+                self.lecturas_fallidas += 1
+                time.sleep(0.01)
+                continue
+
+            if destino is None or frame.shape != destino.shape:
+                # Primer frame (o cambio de resolución): reservamos el anillo una sola vez
+                self._buf = np.empty((self.slots,) + frame.shape, dtype=frame.dtype)
+                destino = self._buf[idx]
+            if not np.may_share_memory(frame, destino):
+                np.copyto(destino, frame)
+
+            with self._lock:
+                self._ts[idx] = time.time()
+                self._seq += 1
+                self.frames_leidos += 1
+                self._lock.notify_all()
+
+            ventana_n += 1
+            ahora = time.monotonic()
+            if previo: metricas.intervalo_frames.observar(ahora - previo)
+            previo = ahora
+            if ahora - ventana_t >= 1.0:
+                self.fps = ventana_n / (ahora - ventana_t)
+                ventana_t, ventana_n = ahora, 0
+
+    # ------------------ consumidores ------------------
+    def ultimo(self, copiar=True):
+        """
+        Devuelve (seq, frame) del frame más reciente o (0, None) si aún no hay.
+        Con copiar=False se entrega una vista del slot: sirve para usos
+        inmediatos, pero el capturador la reescribe tras `slots-1` frames.
+        """
+        with self._lock:
+            seq = self._seq
+            if seq == 0 or self._buf is None:
+                return 0, None
+            if seq > self._ultimo_servido:
+                self.frames_descartados += seq - self._ultimo_servido - 1
+                self._ultimo_servido = seq
+            frame = self._buf[(seq - 1) % self.slots]
+        return seq, (frame.copy() if copiar else frame)
+
+    def esperar(self, seq_previo: int, timeout=1.0) -> int:
+        """Bloquea hasta que haya un frame posterior a `seq_previo` (o timeout). Devuelve el seq actual."""
+        with self._lock:
+            self._lock.wait_for(lambda: self._seq > seq_previo or not self._vivo.is_set(), timeout)
+            return self._seq
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "activo": self.activo,
+                "fps": round(self.fps, 1),
+                "frames_leidos": self.frames_leidos,
+                "lecturas_fallidas": self.lecturas_fallidas,
+                "frames_descartados": self.frames_descartados,
+                "slots": self.slots,
+                "ultimo_frame_ts": self._ts[(self._seq - 1) % self.slots] if self._seq else None,
+            }
@@ -0,0 +1,199 @@
+# catalogo.py
+#
+# Catálogo local de pistas de Spotify en SQLite. Guarda las pistas de cada
+# playlist con su snapshot_id y las audio-features (tempo, energy,
+# danceability). Al arrancar se lee del disco sin tocar la red; solo se
+# refresca si el catálogo está viejo, y aun así solo se vuelven a bajar las
+# pistas si cambió el snapshot y las features de las pistas nuevas.
+
+import bisect, math, os, random, sqlite3, threading, time
+from spotipy.exceptions import SpotifyException
+from spotipy.oauth2 import SpotifyOauthError
+
+# ---------- parámetros ajustables --------------
+CATALOGO_RUTA = os.getenv("CATALOGO_RUTA", os.path.join(os.path.dirname(__file__), "data", "catalogo.sqlite"))
+CATALOGO_TTL  = float(os.getenv("CATALOGO_TTL_HORAS", 12)) * 3600   # antigüedad antes de revisar el snapshot
+VENTANA_ENERGIA = 0.1    # ± alrededor del objetivo; se ensancha si hay pocas candidatas
+MIN_CANDIDATAS  = 3
+# -----------------------------------------------
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id          TEXT PRIMARY KEY,
+    snapshot_id TEXT,
+    actualizado REAL
+);
+CREATE TABLE IF NOT EXISTS pistas (
+    playlist_id TEXT,
+    uri         TEXT,
+    posicion    INTEGER,
+    PRIMARY KEY (playlist_id, uri)
+);
+CREATE TABLE IF NOT EXISTS features (
+    uri          TEXT PRIMARY KEY,
+    tempo        REAL,
+    energy       REAL,
+    danceability REAL
+);
+"""
+
+
+class IndicePistas:
+    """Pistas de una playlist ordenadas por energy para búsquedas por rango en O(log n)."""
+
+    def __init__(self, filas):
+        # filas: (uri, posicion, tempo, energy, danceability)
+        self.uris      = [f[0] for f in sorted(filas, key=lambda f: f[1])]
+        con = sorted((f[3], f[0]) for f in filas if f[3] is not None)
+        self.energias  = [e for e, _ in con]
+        self.por_energia = [u for _, u in con]
+        self.features  = {f[0]: {"tempo": f[2], "energy": f[3], "danceability": f[4]} for f in filas}
+
+    def __len__(self):
+        return len(self.uris)
+
+    def elegir(self, nivel: int, excluir=None):
+        """
+        Pista con energy cerca de nivel/10. Sin features, vuelve al reparto por
+        tercios. `excluir`: una uri o cualquier contenedor de uris (set, ventana).
+        """
+        if not self.uris: return None
+        if isinstance(excluir, str): excluir = (excluir,)
+        if not self.energias:
+            tercio = max(1, len(self.uris) // 3)
+            i = 0 if nivel <= 4 else 1 if nivel <= 7 else 2
+            pool = self.uris[i * tercio:(i + 1) * tercio] if i < 2 else self.uris[2 * tercio:]
+            return _al_azar(pool or self.uris, excluir)
+
+        objetivo, ancho = min(1.0, max(0.0, (nivel - 0.5) / 10)), VENTANA_ENERGIA
+        while True:
+            lo = bisect.bisect_left(self.energias, objetivo - ancho)
+            hi = bisect.bisect_right(self.energias, objetivo + ancho)
+            if hi - lo >= MIN_CANDIDATAS or (lo == 0 and hi == len(self.energias)):
+                break
+            ancho *= 2
+        return _al_azar(self.por_energia, excluir, lo, hi)
+
+
+def _al_azar(pool, excluir, lo=0, hi=None):
+    hi = len(pool) if hi is None else hi
+    if hi <= lo: return None
+    for _ in range(8):
+        uri = pool[random.randrange(lo, hi)]
+        if not excluir or uri not in excluir: return uri
+    return uri
+
+
+class Catalogo:
+    """Persistencia SQLite + índices en memoria por playlist."""
+
+    def __init__(self, sp, ruta=CATALOGO_RUTA, market="PE"):
+        self.sp     = sp
+        self.market = market
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._db    = sqlite3.connect(ruta, check_same_thread=False)
+        self._db.executescript(ESQUEMA)
+        self._lock  = threading.Lock()
+        self._indices = {}
+
+    # ------------------ lectura local ------------------
+    def abrir(self, pid) -> IndicePistas:
+        """Carga la playlist desde SQLite (sin red) y arma su índice."""
+        with self._lock:
+            filas = self._db.execute(
+                "SELECT p.uri, p.posicion, f.tempo, f.energy, f.danceability "
+                "FROM pistas p LEFT JOIN features f ON f.uri = p.uri WHERE p.playlist_id = ?",
+                (pid,)).fetchall()
+        indice = IndicePistas(filas)
+        self._indices[pid] = indice
+        return indice
+
+    def indice(self, pid) -> IndicePistas:
+        return self._indices.get(pid) or self.abrir(pid)
+
+    def elegir(self, pid, nivel, excluir=None):
+        return self.indice(pid).elegir(nivel, excluir)
+
+    def features(self, uri):
+        for indice in self._indices.values():
+            if uri in indice.features:
+                return indice.features[uri]
+        return None
+
+    def antiguedad(self, pid) -> float:
+        with self._lock:
+            fila = self._db.execute("SELECT actualizado FROM playlists WHERE id = ?", (pid,)).fetchone()
+        return time.time() - fila[0] if fila and fila[0] else float("inf")
+
+    def necesita_refresco(self, pid) -> bool:
+        return self.antiguedad(pid) > CATALOGO_TTL
+
+    # ------------------ refresco incremental ------------------
+    def refrescar(self, pid) -> bool:
+        """Revisa el snapshot_id y, si cambió, sincroniza pistas y features nuevas. True si hubo cambios."""
+        try:
+            snap = self.sp.playlist(pid, fields="snapshot_id")["snapshot_id"]
+            with self._lock:
+                fila = self._db.execute("SELECT snapshot_id FROM playlists WHERE id = ?", (pid,)).fetchone()
+            if fila and fila[0] == snap:
+                self._marcar(pid, snap)
+                return False
+
+            uris = self._leer_items(pid)
+            with self._lock:
+                conocidas = {u for (u,) in self._db.execute("SELECT uri FROM features")}
+            nuevas = [u for u in dict.fromkeys(uris) if u not in conocidas and u.startswith("spotify:track:")]
+            feats = self._leer_features(nuevas)
+
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM pistas WHERE playlist_id = ?", (pid,))
+                self._db.executemany("INSERT OR IGNORE INTO pistas VALUES (?, ?, ?)",
+                                     [(pid, u, i) for i, u in enumerate(uris)])
+                self._db.executemany("INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)", feats)
+            self._marcar(pid, snap)
+            indice = self.abrir(pid)
+            print(f"📀 Catálogo {pid}: {len(indice)} pistas ({len(feats)} con features nuevas).")
+            return True
+        except SpotifyException as e:
+            print(f"⚠️  Error al refrescar la playlist ({e.http_status}): {e.msg or e.reason}")
+            return False
+        except SpotifyOauthError as e:
+            # Sin credenciales válidas: se sigue con lo que haya en disco, sin tumbar las demás playlists
+            print(f"⚠️  Spotify sin autorización al refrescar la playlist {pid}: {e}")
+            return False
+
+    def _marcar(self, pid, snap):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO playlists VALUES (?, ?, ?)", (pid, snap, time.time()))
+
+    def _leer_items(self, pid) -> list[str]:
+        """Todas las canciones de la playlist para el market configurado."""
+        res = self.sp.playlist_items(pid, market=self.market, limit=100,
+                                     fields="items.track.uri,next",
+                                     additional_types=["track"])
+        uris = [i["track"]["uri"] for i in res["items"] if i.get("track")]
+        while res.get("next"):
+            res = self.sp.next(res)
+            uris.extend([i["track"]["uri"] for i in res["items"] if i.get("track")])
+        return uris
+
+    def _leer_features(self, uris):
+        filas = []
+        for i in range(0, len(uris), 100):
+            lote = uris[i:i + 100]
+            try:
+                res = self.sp.audio_features(lote) or []
+            except SpotifyException as e:
+                # Apps nuevas no tienen acceso a /audio-features: se sigue sin features
+                print(f"⚠️  Audio features no disponibles ({e.http_status}); se usa el orden de la playlist.")
+                return filas
+            filas.extend((f["uri"], f.get("tempo"), f.get("energy"), f.get("danceability"))
+                         for f in res if f)
+        return filas
+
+    def stats(self) -> dict:
+        def _edad(pid):
+            edad = self.antiguedad(pid)
+            return round(edad) if math.isfinite(edad) else None   # nunca refrescada (sin red o sin credenciales)
+        return {pid: {"pistas": len(ix), "con_features": len(ix.energias), "antiguedad_s": _edad(pid)}
+                for pid, ix in self._indices.items()}
@@ -1,81 +1,147 @@
-import cv2, threading, time
-import os, json, google.generativeai as genai
+import os, json, threading
 from dotenv import load_dotenv
-from PIL import Image
-import os
-import json
-import base64
-import google.generativeai as genai
-from dotenv import load_dotenv
-from PIL import Image
-from elevenlabs.client import ElevenLabs
+import metricas
+from esquema import SCHEMA_GEMINI, parsear_analisis
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 
+GEMINI_MODELO = "gemini-1.5-flash-latest"
+
+# Los SDK se importan y configuran en el primer uso (o en el calentamiento de
+# arranque.py): importar este módulo no toca la red ni falla si faltan claves.
+_clientes = {}
+_lock_clientes = threading.Lock()
 
-if not GEMINI_API_KEY or not ELEVENLABS_API_KEY:
-    raise ValueError("Asegúrate de que GEMINI_API_KEY y ELEVENLABS_API_KEY están en tu .env")
+def _crear_gemini():
+    if not GEMINI_API_KEY:
+        raise ValueError("Falta GEMINI_API_KEY en tu .env")
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODELO)
 
+def _crear_elevenlabs():
+    if not ELEVENLABS_API_KEY:
+        raise ValueError("Falta ELEVENLABS_API_KEY en tu .env")
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=ELEVENLABS_API_KEY)
 
-genai.configure(api_key=GEMINI_API_KEY)
-elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+_FABRICAS = {"gemini": _crear_gemini, "elevenlabs": _crear_elevenlabs}
 
+def cliente(nombre):
+    """Cliente "gemini" o "elevenlabs", creado una sola vez. Propaga los errores de configuración."""
+    with _lock_clientes:
+        if nombre not in _clientes:
+            _clientes[nombre] = _FABRICAS[nombre]()
+        return _clientes[nombre]
 
-vision_model = genai.GenerativeModel('gemini-1.5-flash-latest')
-text_model = genai.GenerativeModel('gemini-1.5-flash-latest')
+TTS_MODEL_ID = "eleven_multilingual_v2" # Buen modelo para español
 
 VOICE_IDS = {
     "bad_bunny": "6DsgX00trsI64jl83WWS", # Ejemplo: "SOkoPBb6gm3cm657p2kE"
     "bob_sponge": "G4IAP30yc6c1gK0csDfu"  # Ejemplo: "oVo2c4VvCMvK4dt4vkaI"
 }
 
-PROMPT_ANALISIS = """
-Eres un analista de multitudes experto. Tu trabajo es observar una imagen de una fiesta y evaluar la energía. Proporciona tu análisis únicamente en formato JSON con la siguiente estructura:
-{
-  "hay_personas": boolean, "numero_personas": integer, "descripcion_general": "string",
-  "nivel_energia": integer (1-10), "personas_bailando": boolean, "personas_aburridas": boolean
+# Prompts cortos: la estructura del JSON la impone response_schema, no el texto
+CRITERIOS_ANALISIS = (
+    "nivel_energia: 1 = nadie se mueve, 10 = todos bailan. descripcion_general: una frase corta. "
+    "genero_recomendado: el que mejor suba o mantenga el ánimo."
+)
+PROMPT_ANALISIS = "Analiza esta imagen de una fiesta y evalúa la energía del público. " + CRITERIOS_ANALISIS
+# Ráfaga: varias imágenes en una sola llamada (el costo fijo por pedido se paga una vez)
+PROMPT_RAFAGA = (
+    "Estas {n} imágenes son de la misma fiesta, en orden, tomadas con pocos segundos de diferencia. "
+    "Evalúa la energía del público en el conjunto, no en una sola imagen; ignora las tapadas, "
+    "oscuras o movidas. "
+) + CRITERIOS_ANALISIS
+CONFIG_ANALISIS = {"response_mime_type": "application/json", "response_schema": SCHEMA_GEMINI,
+                   "max_output_tokens": 300}
+
+PERSONAJES = {
+    "bad_bunny": "Bad Bunny: jerga boricua, estilo urbano, relajado pero con energía "
+                 "('Mera, mano, ¿qué fue?', '¡Fuego, fuego!')",
+    "bob_sponge": "Bob Esponja: extremadamente optimista, inocente y enérgico "
+                  "('¡Estoy listo!', '¡Krabby Patty!'), risa escandalosa",
 }
-"""
-
-PROMPT_VOZ_DJ = """
-Eres un DJ animador de fiestas. Tu personalidad cambiará según el personaje que se te asigne.
-Tu objetivo es que NADIE se aburra. Has recibido un análisis JSON del ambiente actual. Tu tarea es generar UNA SOLA LÍNEA de diálogo corta y enérgica para animar a la gente.
-
-PERSONAJES DISPONIBLES:
-- "bad_bunny": Eres Bad Bunny. Usa jerga boricua, habla con un estilo urbano, relajado pero con energía. 'Mera, mano, ¿qué fue?', '¡Fuego, fuego!'.
-- "bob_sponge": Eres Bob Esponja. Eres extremadamente optimista, inocente y enérgico. Usa frases como '¡Estoy listo!', '¡Krabby Patty!', ríete de forma escandalosa.
-
-PERSONAJE ACTUAL: {personaje}
 
-REGLAS:
-- Si el nivel de energía es bajo (1-4), ¡motívalos a moverse!
-- Si la energía es media (5-7), anímalos a que suban el nivel.
-- Si la energía es alta (8-10) y están bailando, ¡celébralo con ellos!
-- Si no ves a nadie, haz un comentario gracioso sobre una fiesta fantasma.
-- Si ves gente aburrida, dirígete a ellos directamente de forma divertida.
+PROMPT_VOZ_DJ = """Eres {personaje}. Como DJ animador, di UNA sola línea corta y enérgica para que nadie se aburra.
+Energía 1-4: motívalos a moverse. 5-7: que suban el nivel. 8-10 bailando: celébralo. Sin gente: chiste de fiesta fantasma. Gente aburrida: háblales directo.
+Ambiente: {reporte_json}
+Responde SOLO la frase."""
+CONFIG_FRASE = {"max_output_tokens": 80}
 
-Aquí está el reporte del ambiente:
-{reporte_json}
-
-Basado en el reporte y actuando como {personaje}, dame solo la frase que dirías. Sin introducciones, ni explicaciones, SOLO LA FRASE.
-"""
-
-timer = None
-cap = None
+# Lo que la frase necesita del análisis (el resto solo gasta tokens de entrada)
+CAMPOS_FRASE = ("hay_personas", "numero_personas", "nivel_energia", "personas_bailando",
+                "personas_aburridas", "descripcion_general")
 
 def analizar_ambiente(frame_image):
+    """
+    frame_image: imagen PIL o blob {"mime_type", "data"} ya codificado (ver
+    preproceso.py), o una lista de ellas (ráfaga, de la más vieja a la más
+    nueva) que se analiza en un solo pedido.
+    Devuelve el análisis validado con esquema.AnalisisAmbiente, o None.
+    """
+    imagenes = frame_image if isinstance(frame_image, list) else [frame_image]
+    prompt = PROMPT_ANALISIS if len(imagenes) == 1 else PROMPT_RAFAGA.format(n=len(imagenes))
     try:
-        print("Enviando imagen para análisis de ambiente...")
-        response = vision_model.generate_content([PROMPT_ANALISIS, frame_image])
-        json_text = response.text.strip().replace("```json", "").replace("```", "")
-        analisis = json.loads(json_text)
+        print(f"Enviando {len(imagenes)} imagen(es) para análisis de ambiente...")
+        response = cliente("gemini").generate_content([prompt, *imagenes],
+                                                      generation_config=CONFIG_ANALISIS)
+        analisis = parsear_analisis(response.text)
+        if analisis is None:
+            print("⚠️  La respuesta de visión no trae un análisis utilizable.")
+            metricas.errores_api.inc(servicio="gemini_vision_json")
         return analisis
     except Exception as e:
         print(f"Error en el análisis de ambiente: {e}")
+        metricas.errores_api.inc(servicio="gemini_vision")
         return None
 
+FRASE_RESPALDO = "¡Se me cruzaron los cables! ¡Pero la fiesta sigue!"
+
+def generar_frase(analisis_dict, personaje="bad_bunny"):
+    """Genera con Gemini la línea que diría el DJ. Propaga los errores."""
+    print(f"Generando frase del DJ como: {personaje}...")
+    reporte_str = json.dumps({k: analisis_dict[k] for k in CAMPOS_FRASE if k in analisis_dict},
+                             ensure_ascii=False, separators=(",", ":"))
+    prompt_final = PROMPT_VOZ_DJ.format(reporte_json=reporte_str,
+                                        personaje=PERSONAJES.get(personaje, PERSONAJES["bad_bunny"]))
+    response = cliente("gemini").generate_content(prompt_final, generation_config=CONFIG_FRASE)
+    return response.text.strip().strip('"“”')
+
+# Banco de frases (banco_frases.py): muchas líneas por situación en un solo pedido
+PROMPT_BANCO = """Eres {personaje}. Como DJ animador de una fiesta, escribe {n} frases cortas y distintas entre sí (una línea cada una) para esta situación: {situacion}.
+Varía el tono, las palabras y la estructura. No repitas ninguna de estas: {evitar}"""
+CONFIG_BANCO = {"response_mime_type": "application/json",
+                "response_schema": {"type": "ARRAY", "items": {"type": "STRING"}},
+                "temperature": 1.0}
+
+def generar_frases(personaje, situacion, n, evitar=()):
+    """Lista de hasta `n` frases para `situacion` (texto). Propaga los errores."""
+    prompt = PROMPT_BANCO.format(personaje=PERSONAJES.get(personaje, PERSONAJES["bad_bunny"]), n=n,
+                                 situacion=situacion,
+                                 evitar=json.dumps(list(evitar)[-40:], ensure_ascii=False) if evitar else "-")
+    response = cliente("gemini").generate_content(prompt, generation_config=CONFIG_BANCO)
+    frases = json.loads(response.text)
+    return [f.strip().strip('"“”') for f in frases if isinstance(f, str) and f.strip()][:n]
+
+def sintetizar_voz_stream(frase_dj, personaje="bad_bunny"):
+    """Itera los chunks MP3 de ElevenLabs a medida que se sintetizan. Propaga los errores."""
+    print(f"Generando audio para la frase: '{frase_dj}'")
+    voice_id = VOICE_IDS.get(personaje, VOICE_IDS["bad_bunny"]) # Usa Bad Bunny por defecto si no encuentra el ID
+
+    return cliente("elevenlabs").text_to_speech.stream(
+        text=frase_dj,
+        voice_id=voice_id,
+        model_id=TTS_MODEL_ID
+    )
+
+def sintetizar_voz(frase_dj, personaje="bad_bunny"):
+    """Sintetiza la frase con ElevenLabs y devuelve el MP3 en bytes. Propaga los errores."""
+    # Concatenamos los chunks de audio en un solo objeto de bytes
+    return b"".join(sintetizar_voz_stream(frase_dj, personaje))
+
 # --- FUNCIÓN DE GENERAR VOZ ACTUALIZADA ---
 def generar_voz_dj(analisis_dict, personaje="bad_bunny"):
     """
@@ -83,29 +149,9 @@ def generar_voz_dj(analisis_dict, personaje="bad_bunny"):
     Devuelve una tupla: (frase_del_dj, audio_en_bytes)
     """
     try:
-        # 1. Generar la frase con Gemini
-        print(f"Generando frase del DJ como: {personaje}...")
-        reporte_str = json.dumps(analisis_dict, indent=2)
-        prompt_final = PROMPT_VOZ_DJ.format(reporte_json=reporte_str, personaje=personaje)
-        response = text_model.generate_content(prompt_final)
-        frase_dj = response.text.strip()
-        
-        # 2. Generar el audio con ElevenLabs
-        print(f"Generando audio para la frase: '{frase_dj}'")
-        voice_id = VOICE_IDS.get(personaje, VOICE_IDS["bad_bunny"]) # Usa Bad Bunny por defecto si no encuentra el ID
-        
-        audio_stream = elevenlabs_client.text_to_speech.convert(
-            text=frase_dj,
-            voice_id=voice_id,
-            model_id="eleven_multilingual_v2" # Buen modelo para español
-        )
-        
-        # Concatenamos los chunks de audio en un solo objeto de bytes
-        audio_bytes = b"".join(audio_stream)
-        
-        return frase_dj, audio_bytes
+        frase_dj = generar_frase(analisis_dict, personaje)
+        return frase_dj, sintetizar_voz(frase_dj, personaje)
 
     except Exception as e:
         print(f"Error al generar la voz o el audio del DJ: {e}")
-        fallback_phrase = "¡Se me cruzaron los cables! ¡Pero la fiesta sigue!"
-        return fallback_phrase, None
+        return FRASE_RESPALDO, None
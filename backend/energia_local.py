@@ -0,0 +1,198 @@
+# energia_local.py
+#
+# Estimador de `nivel_energia` en el propio equipo. Corre a la tasa de la
+# cámara midiendo cuánto se mueve la imagen entre frames consecutivos y
+# promediando en una ventana deslizante. Sirve de camino rápido entre los
+# análisis de Gemini y de reemplazo completo cuando la nube no responde.
+
+import threading, time, json, os
+from collections import deque
+import cv2
+import numpy as np
+from escena import reducir
+
+# ---------- parámetros ajustables --------------
+ENERGIA_VENTANA      = float(os.getenv("ENERGIA_VENTANA", 10))   # s de historia para el promedio
+ENERGIA_ESTABLE      = float(os.getenv("ENERGIA_ESTABLE", 5))    # s que una cubeta nueva debe sostenerse
+ENERGIA_PIXEL        = int(os.getenv("ENERGIA_PIXEL", 20))       # umbral por píxel para "se movió"
+ENERGIA_CALIBRAR     = os.getenv("ENERGIA_CALIBRAR", "0") == "1" # arrancar en modo calibración
+ENERGIA_MIN_MUESTRAS = 8                                         # etiquetas mínimas para ajustar la escala
+ENERGIA_CALIBRACION  = os.getenv("ENERGIA_CALIBRACION",
+                                 os.path.join(os.path.dirname(__file__), "data", "energia_calibracion.json"))
+MOVIMIENTO_MINIMO    = 0.002                                     # por debajo, la imagen está quieta (no implica sala vacía)
+# Escala por defecto: ~15 % de píxeles en movimiento ya es una pista llena
+ESCALA_DEFECTO = {"a": 60.0, "b": 1.0}
+# -----------------------------------------------
+
+
+def cubeta(nivel: int) -> int:
+    """0 = baja (1-4), 1 = media (5-7), 2 = alta (8-10); igual que los pools de Spotify."""
+    return 0 if nivel <= 4 else 1 if nivel <= 7 else 2
+
+
+class EstimadorEnergia:
+    """Movimiento por diferencia de frames -> nivel 1-10 con escala calibrable."""
+
+    def __init__(self, al_cambiar=None, ventana=ENERGIA_VENTANA, ruta=ENERGIA_CALIBRACION, selector=None,
+                 detector=None):
+        self.al_cambiar = al_cambiar      # callback(nivel) cuando la cubeta local cambia de forma estable
+        self.selector   = selector        # escena.SelectorClaves: reusa el frame reducido de este hilo
+        self.detector   = detector        # personas.DetectorPersonas: se le ofrece cada frame
+        self.ventana    = ventana
+        self.ruta       = ruta
+
+        self._muestras  = deque()         # (ts, movimiento)
+        self._suma      = 0.0
+        self._lock      = threading.Lock()
+        self._vivo      = threading.Event()
+        self._hilo      = None
+
+        self.escala     = dict(ESCALA_DEFECTO)
+        self.etiquetas  = deque(maxlen=500)   # (movimiento, nivel_gemini)
+        self.calibrando = ENERGIA_CALIBRAR
+        self._cubeta      = None              # cubeta vigente (local o de la nube)
+        self._candidata   = None
+        self._candidata_t = 0.0
+        self.frames_procesados = 0
+        self._mapa = None                     # EMA por píxel (resolución reducida) de dónde hay movimiento
+        self._cargar()
+
+    # ------------------ ciclo de vida ------------------
+    def iniciar(self, camara):
+        self.detener()
+        self._vivo.set()
+        self._hilo = threading.Thread(target=self._bucle, args=(camara,), name="energia", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._vivo.clear()
+        if self._hilo: self._hilo.join(timeout=2); self._hilo = None
+        with self._lock:
+            self._muestras.clear(); self._suma = 0.0
+            self._mapa = None
+
+    def _bucle(self, camara):
+        seq, previo = 0, None
+        while self._vivo.is_set():
+            seq = camara.esperar(seq, timeout=1.0)
+            if not self._vivo.is_set() or not camara.activo: break
+            _, frame = camara.ultimo(copiar=False)
+            if frame is None: continue
+            peq = reducir(frame)
+            if self.selector: self.selector.observar(frame, peq)
+            if self.detector: self.detector.ofrecer(frame)
+            if previo is not None:
+                diff = cv2.absdiff(peq, previo)
+                mascara = diff > ENERGIA_PIXEL
+                self._acumular_mapa(mascara)
+                self._agregar(float(np.count_nonzero(mascara)) / diff.size)
+            previo = peq
+
+    def _agregar(self, movimiento):
+        ahora = time.time()
+        with self._lock:
+            self._muestras.append((ahora, movimiento))
+            self._suma += movimiento
+            while self._muestras and ahora - self._muestras[0][0] > self.ventana:
+                self._suma -= self._muestras.popleft()[1]
+            self.frames_procesados += 1
+        self._vigilar_cubeta(ahora)
+
+    def _acumular_mapa(self, mascara):
+        with self._lock:
+            if self._mapa is None or self._mapa.shape != mascara.shape:
+                self._mapa = np.zeros(mascara.shape, dtype=np.float32)
+            # ~3 s de memoria a 30 fps
+            cv2.accumulateWeighted(mascara.astype(np.float32), self._mapa, 0.01)
+
+    def _vigilar_cubeta(self, ahora):
+        c = cubeta(self.nivel())
+        if c == self._cubeta:
+            self._candidata = None; return
+        if c != self._candidata:
+            self._candidata, self._candidata_t = c, ahora; return
+        if ahora - self._candidata_t >= ENERGIA_ESTABLE:
+            self._cubeta, self._candidata = c, None
+            if self.al_cambiar:
+                try: self.al_cambiar(self.nivel())
+                except Exception as e: print(f"Error en callback de energía local: {e}")
+
+    # ------------------ lectura ------------------
+    def movimiento(self) -> float:
+        with self._lock:
+            return self._suma / len(self._muestras) if self._muestras else 0.0
+
+    def mapa_movimiento(self):
+        """Copia del mapa de movimiento reciente (0-1, resolución reducida) o None."""
+        with self._lock:
+            return None if self._mapa is None else self._mapa.copy()
+
+    def nivel(self) -> int:
+        n = self.escala["a"] * self.movimiento() + self.escala["b"]
+        return int(min(10, max(1, round(n))))
+
+    def analisis_local(self) -> dict:
+        """
+        Análisis mínimo con la forma del JSON de Gemini, para cuando la nube falla.
+        El movimiento mide actividad, no presencia: un público quieto no es una
+        sala vacía, así que hay_personas queda en None (lo completa el detector).
+        """
+        nivel = self.nivel()
+        return {
+            "hay_personas": None,
+            "numero_personas": None,
+            "descripcion_general": "Estimación local por movimiento (sin análisis en la nube).",
+            "nivel_energia": nivel,
+            "personas_bailando": nivel >= 7,
+            "personas_aburridas": nivel <= 3,
+            "fuente": "local",
+        }
+
+    # ------------------ calibración ------------------
+    def registrar_etiqueta(self, nivel_gemini: int):
+        """Llega un nivel de la nube: sincroniza la cubeta y, si calibramos, guarda el par."""
+        self._cubeta, self._candidata = cubeta(nivel_gemini), None
+        if not self.calibrando or not self._muestras: return
+        self.etiquetas.append((self.movimiento(), int(nivel_gemini)))
+        self.calibrar()
+
+    def calibrar(self) -> bool:
+        """Ajuste lineal nivel ≈ a·movimiento + b sobre las etiquetas de Gemini acumuladas."""
+        if len(self.etiquetas) < ENERGIA_MIN_MUESTRAS: return False
+        x, y = np.array(self.etiquetas, dtype=float).T
+        if np.ptp(x) < 1e-6: return False
+        a, b = np.polyfit(x, y, 1)
+        if a <= 0: return False          # un ajuste invertido es ruido, no señal
+        self.escala = {"a": float(a), "b": float(b)}
+        self._guardar()
+        print(f"📐 Energía local recalibrada: nivel ≈ {a:.1f}·mov + {b:.2f} ({len(self.etiquetas)} muestras)")
+        return True
+
+    def _cargar(self):
+        try:
+            with open(self.ruta) as f:
+                datos = json.load(f)
+            self.escala = datos.get("escala", self.escala)
+            self.etiquetas.extend(tuple(e) for e in datos.get("etiquetas", []))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️  No se pudo leer la calibración de energía: {e}")
+
+    def _guardar(self):
+        try:
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            with open(self.ruta, "w") as f:
+                json.dump({"escala": self.escala, "etiquetas": list(self.etiquetas)}, f)
+        except OSError as e:
+            print(f"⚠️  No se pudo guardar la calibración de energía: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "nivel": self.nivel(),
+            "movimiento": round(self.movimiento(), 4),
+            "frames_procesados": self.frames_procesados,
+            "escala": self.escala,
+            "calibrando": self.calibrando,
+            "etiquetas": len(self.etiquetas),
+        }
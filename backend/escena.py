@@ -0,0 +1,157 @@
+# escena.py
+#
+# Pre-filtro local delante de Gemini Vision. Trabaja sobre frames reducidos
+# en escala de grises y decide si la escena cambió lo suficiente desde el
+# último análisis como para pagar otra llamada remota. Además elige los
+# fotogramas clave de la ráfaga que acompaña al frame actual en el análisis
+# multi-imagen (VISION_RAFAGA > 1).
+
+import os, threading, time
+from collections import deque
+import cv2
+import numpy as np
+
+# ---------- parámetros ajustables --------------
+ESCENA_TAM        = (64, 48)                                    # resolución de trabajo
+ESCENA_DIFF       = float(os.getenv("ESCENA_DIFF", 8.0))        # diferencia media absoluta (0-255)
+ESCENA_MOVIMIENTO = float(os.getenv("ESCENA_MOVIMIENTO", 0.03)) # fracción de píxeles que cambian
+ESCENA_HIST       = float(os.getenv("ESCENA_HIST", 0.12))       # distancia de Bhattacharyya (0-1)
+ESCENA_PIXEL      = int(os.getenv("ESCENA_PIXEL", 25))          # umbral por píxel para "se movió"
+ESCENA_MAX_SALTOS = int(os.getenv("ESCENA_MAX_SALTOS", 5))      # forzar análisis tras N saltos seguidos
+VISION_RAFAGA     = int(os.getenv("VISION_RAFAGA", 1))          # imágenes por análisis; 1 = solo el frame actual
+RAFAGA_ESPACIO    = float(os.getenv("RAFAGA_ESPACIO", 4.0))     # s mínimos entre fotogramas clave
+RAFAGA_CONTRASTE  = 12.0    # desvío mínimo del frame reducido; por debajo, cámara tapada u oscura
+# -----------------------------------------------
+
+
+def reducir(frame, tam=ESCENA_TAM):
+    """BGR a resolución completa -> gris reducido y suavizado (uint8)."""
+    gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    peq  = cv2.resize(gris, tam, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(peq, (3, 3), 0)
+
+
+def histograma(peq):
+    h = cv2.calcHist([peq], [0], None, [32], [0, 256])
+    return cv2.normalize(h, h).flatten()
+
+
+def comparar(peq, ref, hist_ref) -> dict:
+    """Métricas de cambio entre dos frames reducidos."""
+    diff = cv2.absdiff(peq, ref)
+    return {
+        "diff": float(diff.mean()),
+        "movimiento": float(np.count_nonzero(diff > ESCENA_PIXEL)) / diff.size,
+        "hist": float(cv2.compareHist(histograma(peq), hist_ref, cv2.HISTCMP_BHATTACHARYYA)),
+    }
+
+
+class FiltroEscena:
+    """Decide si un frame merece análisis remoto comparándolo con el último analizado."""
+
+    def __init__(self, diff=ESCENA_DIFF, movimiento=ESCENA_MOVIMIENTO,
+                 hist=ESCENA_HIST, max_saltos=ESCENA_MAX_SALTOS):
+        self.umbrales   = {"diff": diff, "movimiento": movimiento, "hist": hist}
+        self.max_saltos = max_saltos
+
+        self._ref = self._hist_ref = None   # frame reducido del último análisis aceptado
+        self._candidato = None
+        self._saltos_seguidos = 0
+
+        self.evaluados = 0
+        self.saltados  = 0
+        self.ultimas_metricas = None
+
+    def evaluar(self, frame) -> bool:
+        """
+        True si hay que llamar al modelo; False si la escena sigue igual. El
+        salto no se cuenta acá: el llamador puede analizar igual (p. ej. si aún
+        no hay análisis previo) y, si de verdad reusa el anterior, llama a saltar().
+        """
+        self.evaluados += 1
+        peq = reducir(frame)
+        self._candidato = peq
+
+        if self._ref is None or self._saltos_seguidos >= self.max_saltos:
+            self._saltos_seguidos = 0
+            return True
+
+        m = comparar(peq, self._ref, self._hist_ref)
+        self.ultimas_metricas = m
+        if any(m[k] >= self.umbrales[k] for k in self.umbrales):
+            self._saltos_seguidos = 0
+            return True
+        return False
+
+    def saltar(self):
+        """El último candidato no se analizó y se reusó el análisis anterior."""
+        self._saltos_seguidos += 1
+        self.saltados += 1
+
+    def aceptar(self):
+        """El análisis remoto del último candidato salió bien: pasa a ser la referencia."""
+        if self._candidato is not None:
+            self._ref, self._hist_ref = self._candidato, histograma(self._candidato)
+
+    def stats(self) -> dict:
+        return {
+            "evaluados": self.evaluados,
+            "saltados": self.saltados,
+            "tasa_salto": round(self.saltados / self.evaluados, 3) if self.evaluados else 0.0,
+            "umbrales": self.umbrales,
+            "ultimas_metricas": self.ultimas_metricas,
+        }
+
+
+class SelectorClaves:
+    """
+    Guarda hasta VISION_RAFAGA-1 fotogramas clave entre análisis. Lo alimenta
+    el hilo de energía local con cada frame ya reducido: un frame entra si
+    pasaron RAFAGA_ESPACIO s desde el anterior y no es una imagen tapada; si
+    se parece demasiado al último guardado, lo reemplaza. Así la ráfaga cubre
+    el intervalo con imágenes distintas y la copia a resolución completa se
+    hace a lo sumo una vez cada RAFAGA_ESPACIO s.
+    """
+
+    def __init__(self, n=VISION_RAFAGA - 1, espacio=RAFAGA_ESPACIO, diff=ESCENA_DIFF / 2):
+        self.espacio, self.diff = espacio, diff
+        self._claves = deque(maxlen=max(0, n))   # (monotonic, frame BGR, reducido)
+        self._lock = threading.Lock()
+        self.guardados = self.reemplazados = self.tapados = self.entregados = 0
+
+    @property
+    def activo(self) -> bool:
+        return self._claves.maxlen > 0
+
+    def observar(self, frame, peq):
+        """`frame` puede ser una vista del anillo de la cámara: se copia solo si se guarda."""
+        if not self.activo: return
+        ahora = time.monotonic()
+        with self._lock:
+            ultimo = self._claves[-1] if self._claves else None
+        if ultimo and ahora - ultimo[0] < self.espacio: return
+        if float(peq.std()) < RAFAGA_CONTRASTE:
+            self.tapados += 1; return
+        parecido = ultimo is not None and float(cv2.absdiff(peq, ultimo[2]).mean()) < self.diff
+        clave = (ahora, frame.copy(), peq)
+        with self._lock:
+            if parecido and self._claves and self._claves[-1] is ultimo:
+                self._claves[-1] = clave
+                self.reemplazados += 1
+            else:
+                self._claves.append(clave)
+                self.guardados += 1
+
+    def tomar(self) -> list:
+        """Fotogramas clave desde el último análisis, del más viejo al más nuevo. Vacía el selector."""
+        with self._lock:
+            frames = [f for _, f, _ in self._claves]
+            self._claves.clear()
+            self.entregados += len(frames)
+        return frames
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"max": self._claves.maxlen, "en_espera": len(self._claves),
+                    "guardados": self.guardados, "reemplazados": self.reemplazados,
+                    "tapados": self.tapados, "entregados": self.entregados}
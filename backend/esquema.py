@@ -0,0 +1,148 @@
+# esquema.py
+#
+# Esquema único del análisis de ambiente. Se usa dos veces:
+#   - como `response_schema` de Gemini (salida JSON estructurada), y
+#   - para validar lo que vuelve, con un extractor tolerante para cuando el
+#     modelo igual agrega texto, fences de Markdown o corta el JSON.
+# Los valores fuera de rango se recortan en vez de tirar el análisis: una
+# llamada pagada con nivel_energia=11 sigue sirviendo.
+
+import json, re, unicodedata
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator, model_validator
+
+GENEROS = ("reggaeton", "edm", "chill", "salsa", "rock", "kpop", "lofi", "disco", "techno", "meditacion")
+DESCRIPCION_MAX = 200   # caracteres; la descripción también viaja en el prompt de la frase
+
+
+class AnalisisAmbiente(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    hay_personas: Optional[bool] = None
+    numero_personas: int = 0
+    descripcion_general: str = ""
+    nivel_energia: int = 5
+    personas_bailando: bool = False
+    personas_aburridas: bool = False
+    genero_recomendado: Optional[str] = None
+
+    @field_validator("nivel_energia", mode="before")
+    @classmethod
+    def _nivel(cls, v):
+        try:
+            return min(10, max(1, round(float(v))))
+        except (TypeError, ValueError):
+            return 5
+
+    @field_validator("numero_personas", mode="before")
+    @classmethod
+    def _personas(cls, v):
+        try:
+            return max(0, round(float(v)))
+        except (TypeError, ValueError):
+            return 0
+
+    @field_validator("hay_personas", "personas_bailando", "personas_aburridas", mode="before")
+    @classmethod
+    def _bool(cls, v, info):
+        if isinstance(v, str):
+            v = {"true": True, "si": True, "sí": True, "yes": True, "1": True,
+                 "false": False, "no": False, "0": False}.get(v.strip().lower())
+        if v is None and info.field_name != "hay_personas":
+            return False
+        return v
+
+    @field_validator("descripcion_general", mode="before")
+    @classmethod
+    def _descripcion(cls, v):
+        return str(v or "").strip()[:DESCRIPCION_MAX]
+
+    @field_validator("genero_recomendado", mode="before")
+    @classmethod
+    def _genero(cls, v):
+        if not v: return None
+        g = unicodedata.normalize("NFKD", str(v)).encode("ascii", "ignore").decode().lower().strip()
+        g = g.replace("-", "").replace(" ", "")
+        return g if g in GENEROS else None
+
+    @model_validator(mode="after")
+    def _coherente(self):
+        if self.hay_personas is None:
+            # Sin el campo (JSON cortado): se deduce del conteo; ante la duda, hay gente
+            self.hay_personas = self.numero_personas > 0 or "numero_personas" not in self.model_fields_set
+        if not self.hay_personas:
+            self.numero_personas = 0
+            self.personas_bailando = self.personas_aburridas = False
+        return self
+
+
+# Esquema para la salida estructurada de Gemini (subconjunto OpenAPI que acepta la API)
+SCHEMA_GEMINI = {
+    "type": "OBJECT",
+    "properties": {
+        "hay_personas":        {"type": "BOOLEAN"},
+        "numero_personas":     {"type": "INTEGER"},
+        "descripcion_general": {"type": "STRING"},
+        "nivel_energia":       {"type": "INTEGER", "description": "1 = nadie se mueve, 10 = todos bailan"},
+        "personas_bailando":   {"type": "BOOLEAN"},
+        "personas_aburridas":  {"type": "BOOLEAN"},
+        "genero_recomendado":  {"type": "STRING", "format": "enum", "enum": list(GENEROS)},
+    },
+    "required": ["hay_personas", "numero_personas", "nivel_energia", "personas_bailando",
+                 "personas_aburridas", "genero_recomendado"],
+}
+
+_PAR = re.compile(r'"(\w+)"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?|true|false|null)', re.IGNORECASE)
+
+
+def extraer_json(texto: str):
+    """
+    Primer objeto JSON dentro de `texto` (con o sin fences y charla alrededor).
+    Si está cortado o mal formado, se rescatan los pares clave/valor completos.
+    Devuelve un dict o None.
+    """
+    if not texto: return None
+    texto = re.sub(r"```(?:json)?", "", texto)
+    inicio = texto.find("{")
+    if inicio < 0: return None
+
+    prof, en_str, escape = 0, False, False
+    for i in range(inicio, len(texto)):
+        c = texto[i]
+        if en_str:
+            if escape: escape = False
+            elif c == "\\": escape = True
+            elif c == '"': en_str = False
+        elif c == '"': en_str = True
+        elif c == "{": prof += 1
+        elif c == "}":
+            prof -= 1
+            if prof == 0:
+                try:
+                    return json.loads(texto[inicio:i + 1])
+                except json.JSONDecodeError:
+                    break
+
+    pares = {}
+    for k, v in _PAR.findall(texto[inicio:]):
+        v = v.lower() if v.lower() in ("true", "false", "null") else v
+        try:
+            pares[k] = json.loads(v)
+        except json.JSONDecodeError:
+            pass
+    return pares or None
+
+
+def validar(datos):
+    """dict crudo -> dict validado y normalizado, o None si no trae nada del análisis."""
+    if not isinstance(datos, dict) or not ({"nivel_energia", "hay_personas"} & datos.keys()):
+        return None
+    try:
+        return AnalisisAmbiente.model_validate(datos).model_dump()
+    except ValidationError as e:
+        print(f"⚠️  Análisis inválido: {e.error_count()} errores de esquema")
+        return None
+
+
+def parsear_analisis(texto: str):
+    return validar(extraer_json(texto))
@@ -0,0 +1,260 @@
+# grabacion.py
+#
+# Grabación y replay de sesiones para medir el sistema sin cámara ni
+# servicios en vivo.
+#
+#   GRABAR_EN=data/grabaciones/fiesta1 python app.py
+#       guarda frames de la cámara, respuestas de Gemini (visión y frases),
+#       audio de ElevenLabs con el tiempo de cada chunk y las respuestas de
+#       Spotify, todo con su latencia medida.
+#
+#   REPLAY_DE=data/grabaciones/fiesta1 python app.py
+#       reemplaza cámara, Gemini, ElevenLabs y spotipy por dobles locales que
+#       devuelven lo grabado, con latencias muestreadas de la distribución
+#       que se midió al grabar.
+#
+# Formato de una grabación (directorio):
+#   eventos.jsonl   una línea por evento {"t", "tipo", "ms", ...}
+#   frames/NNNNNN.jpg
+#   audio/NNNNNN.mp3
+
+import itertools, json, os, random, threading, time
+import cv2
+import numpy as np
+from spotipy.exceptions import SpotifyException
+
+# ---------- parámetros ajustables --------------
+GRABAR_CADA    = int(os.getenv("GRABAR_CADA", 3))      # se guarda 1 de cada N frames de la cámara
+GRABAR_CALIDAD = 90                                    # JPEG de los frames guardados
+# -----------------------------------------------
+
+
+def _json(valor):
+    """Lo que no es serializable (objetos de SDK) se guarda como texto."""
+    return json.loads(json.dumps(valor, default=str))
+
+
+# ================== grabación ==================
+class Grabadora:
+    """Escribe los eventos de una sesión en vivo en `ruta`."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        os.makedirs(os.path.join(ruta, "frames"), exist_ok=True)
+        os.makedirs(os.path.join(ruta, "audio"), exist_ok=True)
+        self._f = open(os.path.join(ruta, "eventos.jsonl"), "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self._n = itertools.count()
+
+    def evento(self, tipo, ms, **datos):
+        linea = json.dumps({"t": round(time.monotonic() - self._t0, 3), "tipo": tipo,
+                            "ms": round(ms, 1), **datos}, ensure_ascii=False, default=str)
+        with self._lock:
+            self._f.write(linea + "\n")
+            self._f.flush()
+
+    def cronometrar(self, tipo, fn, **extra):
+        """Envuelve `fn`: cada llamada queda grabada con su resultado (o error) y latencia."""
+        def envuelta(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                res = fn(*args, **kwargs)
+            except Exception as e:
+                self.evento(tipo, (time.perf_counter() - t0) * 1000, error=repr(e),
+                            http_status=getattr(e, "http_status", None), **extra)
+                raise
+            self.evento(tipo, (time.perf_counter() - t0) * 1000, resultado=_json(res), **extra)
+            return res
+        envuelta.__name__ = getattr(fn, "__name__", tipo)
+        return envuelta
+
+    def audio_stream(self, fn):
+        """Envuelve un sintetizador por chunks: guarda el MP3 y el instante de cada chunk."""
+        def envuelta(*args, **kwargs):
+            t0 = time.perf_counter()
+            partes, tiempos = [], []
+            try:
+                for chunk in fn(*args, **kwargs):
+                    tiempos.append(round((time.perf_counter() - t0) * 1000, 1))
+                    partes.append(chunk)
+                    yield chunk
+            except Exception as e:
+                self.evento("tts", (time.perf_counter() - t0) * 1000, error=repr(e))
+                raise
+            archivo = f"{next(self._n):06d}.mp3"
+            with open(os.path.join(self.ruta, "audio", archivo), "wb") as f:
+                f.write(b"".join(partes))
+            self.evento("tts", (time.perf_counter() - t0) * 1000, archivo=archivo,
+                        chunks=[len(p) for p in partes], chunks_ms=tiempos)
+        return envuelta
+
+    def frame(self, frame):
+        t0 = time.perf_counter()
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, GRABAR_CALIDAD])
+        if not ok: return
+        archivo = f"{next(self._n):06d}.jpg"
+        with open(os.path.join(self.ruta, "frames", archivo), "wb") as f:
+            f.write(buf)
+        self.evento("frame", (time.perf_counter() - t0) * 1000, archivo=archivo)
+
+    def fuente(self, real):
+        return FuenteGrabadora(real, self)
+
+    def spotify(self, real):
+        return SpotifyGrabado(real, self)
+
+
+class FuenteGrabadora:
+    """Misma interfaz que cv2.VideoCapture; guarda 1 de cada GRABAR_CADA frames leídos."""
+
+    def __init__(self, real, grabadora, cada=GRABAR_CADA):
+        self.real, self.grabadora, self.cada = real, grabadora, max(1, cada)
+        self._n = 0
+
+    def isOpened(self): return self.real.isOpened()
+    def release(self):  self.real.release()
+
+    def read(self, destino=None):
+        ok, frame = self.real.read(destino)
+        if ok:
+            if self._n % self.cada == 0:
+                self.grabadora.frame(frame)
+            self._n += 1
+        return ok, frame
+
+
+class SpotifyGrabado:
+    """Proxy de spotipy.Spotify que graba cada llamada (método, resultado, latencia)."""
+
+    def __init__(self, real, grabadora):
+        self._real, self._grabadora = real, grabadora
+
+    def __getattr__(self, nombre):
+        attr = getattr(self._real, nombre)
+        if nombre.startswith("_") or not callable(attr): return attr
+        return self._grabadora.cronometrar("spotify", attr, metodo=nombre)
+
+
+# ==================== replay ====================
+class Replay:
+    """
+    Dobles locales a partir de una grabación. Los resultados se devuelven en
+    el orden grabado (en bucle); la latencia de cada llamada se sortea de las
+    medidas para ese tipo. `velocidad` > 1 acelera todas las esperas.
+    """
+
+    def __init__(self, ruta, velocidad=1.0, semilla=None):
+        self.ruta, self.velocidad = ruta, velocidad
+        self._rnd = random.Random(semilla)
+        self._eventos = {}
+        with open(os.path.join(ruta, "eventos.jsonl"), encoding="utf-8") as f:
+            for linea in f:
+                ev = json.loads(linea)
+                clave = ev["tipo"] if ev["tipo"] != "spotify" else f"spotify.{ev.get('metodo')}"
+                self._eventos.setdefault(clave, []).append(ev)
+        self._ciclos = {k: itertools.cycle(v) for k, v in self._eventos.items()}
+        self._lock = threading.Lock()
+        self.llamadas = {}
+
+    def _siguiente(self, clave):
+        """(evento a devolver, latencia sorteada en s) o (None, 0) si no hay nada grabado."""
+        with self._lock:
+            muestras = self._eventos.get(clave)
+            if not muestras: return None, 0.0
+            self.llamadas[clave] = self.llamadas.get(clave, 0) + 1
+            return next(self._ciclos[clave]), self._rnd.choice(muestras)["ms"] / 1000 / self.velocidad
+
+    # ---- Gemini ----
+    def analizar_ambiente(self, imagen):
+        ev, espera = self._siguiente("vision")
+        time.sleep(espera)
+        return dict(ev["resultado"]) if ev and ev.get("resultado") else None
+
+    def generar_frase(self, analisis, personaje="bad_bunny"):
+        ev, espera = self._siguiente("frase")
+        time.sleep(espera)
+        if ev is None or "error" in ev:
+            raise RuntimeError(ev["error"] if ev else "sin frases grabadas")
+        return ev["resultado"]
+
+    # ---- ElevenLabs ----
+    def sintetizar_voz_stream(self, frase, personaje="bad_bunny"):
+        ev, espera = self._siguiente("tts")
+        if ev is None or "error" in ev:
+            time.sleep(espera)
+            raise RuntimeError(ev["error"] if ev else "sin audio grabado")
+        with open(os.path.join(self.ruta, "audio", ev["archivo"]), "rb") as f:
+            audio = f.read()
+        # Se respeta la forma del stream grabado, escalada a la latencia sorteada
+        escala = espera / (ev["ms"] / 1000) if ev["ms"] else 0
+        previo, i = 0.0, 0
+        for n, ms in zip(ev["chunks"], ev["chunks_ms"]):
+            time.sleep(max(0.0, (ms / 1000) * escala - previo))
+            previo = (ms / 1000) * escala
+            yield audio[i:i + n]
+            i += n
+
+    def sintetizar_voz(self, frase, personaje="bad_bunny"):
+        return b"".join(self.sintetizar_voz_stream(frase, personaje))
+
+    # ---- cámara y Spotify ----
+    def fuente(self):
+        """Fábrica de fuentes para Capturador: una FuenteReplay nueva por cámara."""
+        frames = [(ev["t"], ev["archivo"]) for ev in self._eventos.get("frame", [])]
+        return FuenteReplay(self.ruta, frames, self.velocidad)
+
+    def spotify(self):
+        return SpotifyReplay(self)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"grabados": {k: len(v) for k, v in self._eventos.items()}, "llamadas": dict(self.llamadas)}
+
+
+class FuenteReplay:
+    """Frames grabados al ritmo en que se grabaron, en bucle. Interfaz de cv2.VideoCapture."""
+
+    def __init__(self, ruta, frames, velocidad=1.0):
+        self._datos = []
+        for _, archivo in frames:
+            with open(os.path.join(ruta, "frames", archivo), "rb") as f:
+                self._datos.append(np.frombuffer(f.read(), dtype=np.uint8))   # JPEG en memoria
+        ts = [t for t, _ in frames]
+        paso = (ts[-1] - ts[0]) / (len(ts) - 1) if len(ts) > 1 else 1 / 30
+        self._deltas = [max(0.0, b - a) for a, b in zip(ts, ts[1:])] + [paso]
+        self.velocidad = velocidad
+        self._i, self._prox = 0, time.monotonic()
+        self._abierta = bool(self._datos)
+
+    def isOpened(self): return self._abierta
+    def release(self):  self._abierta = False
+
+    def read(self, destino=None):
+        if not self._abierta: return False, None
+        espera = self._prox - time.monotonic()
+        if espera > 0: time.sleep(espera)
+        i = self._i % len(self._datos)
+        self._prox = max(self._prox, time.monotonic() - 1) + self._deltas[i] / self.velocidad
+        self._i += 1
+        # Decodificar cuesta lo mismo que en una webcam MJPEG
+        return True, cv2.imdecode(self._datos[i], cv2.IMREAD_COLOR)
+
+
+class SpotifyReplay:
+    """Doble de spotipy.Spotify: responde lo grabado por método; sin grabación, un 404."""
+
+    def __init__(self, replay):
+        self._replay = replay
+
+    def __getattr__(self, nombre):
+        if nombre.startswith("_"): raise AttributeError(nombre)
+        def llamada(*args, **kwargs):
+            ev, espera = self._replay._siguiente(f"spotify.{nombre}")
+            time.sleep(espera)
+            if ev is None:
+                raise SpotifyException(404, -1, f"sin grabación de {nombre}")
+            if "error" in ev:
+                raise SpotifyException(ev.get("http_status") or 500, -1, ev["error"])
+            return ev.get("resultado")
+        return llamada
@@ -0,0 +1,199 @@
+# historial.py
+#
+# Historial persistente de la fiesta en SQLite (modo WAL): análisis (energía,
+# personas, género), pistas puestas y frases del DJ con la referencia a su
+# audio. Solo se agregan filas. Los registros se encolan desde el ciclo sin
+# tocar el disco y un hilo escritor los baja por lotes, en una transacción
+# cada HISTORIAL_FLUSH_S. Las consultas van por rango de tiempo sobre el
+# índice (sala, ts) y la línea de tiempo de energía sale ya reducida a
+# `puntos` cubetas con un GROUP BY, para los clientes que se suman tarde.
+
+import os, sqlite3, threading, time
+from collections import deque
+
+# ---------- parámetros ajustables --------------
+HISTORIAL_DB      = os.getenv("HISTORIAL_DB", os.path.join(os.path.dirname(__file__), "data", "historial.db"))
+HISTORIAL_FLUSH_S = float(os.getenv("HISTORIAL_FLUSH_S", 2))   # cada cuánto baja un lote a disco
+HISTORIAL_LOTE    = 500                                        # filas que adelantan el lote
+HISTORIAL_DIAS    = float(os.getenv("HISTORIAL_DIAS", 30))     # retención
+HISTORIAL_PUNTOS  = 120                                        # cubetas por defecto de la línea de tiempo
+# -----------------------------------------------
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS analisis (
+    ts REAL NOT NULL, sala TEXT NOT NULL, nivel INTEGER, nivel_crudo INTEGER,
+    personas INTEGER, hay_personas INTEGER, genero TEXT, fuente TEXT);
+CREATE INDEX IF NOT EXISTS analisis_sala_ts ON analisis (sala, ts);
+CREATE TABLE IF NOT EXISTS pistas (
+    ts REAL NOT NULL, sala TEXT NOT NULL, uri TEXT, genero TEXT);
+CREATE INDEX IF NOT EXISTS pistas_sala_ts ON pistas (sala, ts);
+CREATE TABLE IF NOT EXISTS frases (
+    ts REAL NOT NULL, sala TEXT NOT NULL, persona TEXT, frase TEXT, audio TEXT);
+CREATE INDEX IF NOT EXISTS frases_sala_ts ON frases (sala, ts);
+"""
+
+INSERTAR = {
+    "analisis": "INSERT INTO analisis VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    "pistas":   "INSERT INTO pistas VALUES (?, ?, ?, ?)",
+    "frases":   "INSERT INTO frases VALUES (?, ?, ?, ?, ?)",
+}
+
+
+def _bit(valor):
+    return None if valor is None else int(bool(valor))
+
+
+class Historial:
+    """Escritor por lotes en un hilo + lecturas con una conexión por hilo (WAL admite ambas a la vez)."""
+
+    def __init__(self, ruta=HISTORIAL_DB, flush_s=HISTORIAL_FLUSH_S):
+        self.ruta, self.flush_s = ruta, flush_s
+        self._cola  = deque()             # (tabla, fila); append/popleft son atómicos
+        self._hay   = threading.Event()
+        self._local = threading.local()
+        self._lock  = threading.Lock()
+        self._hilo  = None
+        self._listo = False
+
+        self.escritas = self.lotes = self.errores = 0
+        self.ultimo_lote_ms = None
+
+    # ------------------ esquema / conexiones ------------------
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        con = sqlite3.connect(self.ruta, timeout=5)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")   # WAL: se puede perder el último lote ante un corte, no corromper
+        return con
+
+    def _asegurar(self):
+        """Crea la base y arranca el escritor la primera vez que se usa."""
+        if self._listo: return
+        with self._lock:
+            if self._listo: return
+            con = self._conectar()
+            con.executescript(ESQUEMA)
+            con.close()
+            self._hilo = threading.Thread(target=self._bucle, name="historial", daemon=True)
+            self._hilo.start()
+            self._listo = True
+
+    def _lectura(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            self._asegurar()
+            con = self._local.con = sqlite3.connect(self.ruta, timeout=5)
+            con.execute("PRAGMA query_only=1")
+        return con
+
+    # ------------------ escritura ------------------
+    def _encolar(self, tabla, fila):
+        self._asegurar()
+        self._cola.append((tabla, fila))
+        if len(self._cola) >= HISTORIAL_LOTE:
+            self._hay.set()
+
+    def registrar_analisis(self, sala, analisis):
+        self._encolar("analisis", (time.time(), sala, analisis.get("nivel_energia"),
+                                   analisis.get("nivel_energia_crudo", analisis.get("nivel_energia")),
+                                   analisis.get("numero_personas"), _bit(analisis.get("hay_personas")),
+                                   analisis.get("genero_recomendado"), analisis.get("fuente", "nube")))
+
+    def registrar_pista(self, sala, uri, genero=None):
+        self._encolar("pistas", (time.time(), sala, uri, genero))
+
+    def registrar_frase(self, sala, persona, frase, audio=None):
+        """`audio`: URL que el cliente puede pedir (banco o /audio/<clave>), o None."""
+        self._encolar("frases", (time.time(), sala, persona, frase, audio))
+
+    def _bucle(self):
+        con = self._conectar()
+        purga = 0.0
+        while True:
+            self._hay.wait(self.flush_s)
+            self._hay.clear()
+            if time.time() - purga > 3600:
+                purga = time.time()
+                self._purgar(con)
+            if not self._cola: continue
+            lote = {}
+            while self._cola:
+                tabla, fila = self._cola.popleft()
+                lote.setdefault(tabla, []).append(fila)
+            t0 = time.perf_counter()
+            try:
+                with con:   # una transacción por lote
+                    for tabla, filas in lote.items():
+                        con.executemany(INSERTAR[tabla], filas)
+                self.escritas += sum(len(f) for f in lote.values())
+                self.lotes += 1
+            except sqlite3.Error as e:
+                self.errores += 1
+                print(f"⚠️  No se pudo escribir el historial: {e}")
+            self.ultimo_lote_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    def _purgar(self, con):
+        limite = time.time() - HISTORIAL_DIAS * 86400
+        try:
+            with con:
+                for tabla in INSERTAR:
+                    con.execute(f"DELETE FROM {tabla} WHERE ts < ?", (limite,))
+        except sqlite3.Error as e:
+            print(f"⚠️  No se pudo purgar el historial: {e}")
+
+    # ------------------ consultas ------------------
+    def linea_tiempo(self, sala, desde, hasta=None, puntos=HISTORIAL_PUNTOS):
+        """
+        Energía de la sala entre `desde` y `hasta` (epoch s) en a lo sumo
+        `puntos` cubetas: promedio, mínimo y máximo de nivel, máximo de
+        personas y el último género de cada cubeta.
+        """
+        hasta = hasta or time.time()
+        paso = max((hasta - desde) / max(1, puntos), 1.0)
+        # El género de cada cubeta es el de su fila más reciente (ROW_NUMBER por ts
+        # descendente); una columna suelta junto a varios MIN/MAX sería arbitraria
+        filas = self._lectura().execute(
+            """SELECT cubeta, MAX(ts), AVG(nivel), MIN(nivel), MAX(nivel), MAX(personas),
+                      MAX(CASE WHEN orden = 1 THEN genero END), COUNT(*)
+               FROM (SELECT cubeta, ts, nivel, personas, genero,
+                            ROW_NUMBER() OVER (PARTITION BY cubeta ORDER BY ts DESC) AS orden
+                     FROM (SELECT CAST((ts - ?) / ? AS INTEGER) AS cubeta, ts, nivel, personas, genero
+                           FROM analisis WHERE sala = ? AND ts >= ? AND ts < ?))
+               GROUP BY cubeta ORDER BY cubeta""",
+            (desde, paso, sala, desde, hasta)).fetchall()
+        return [{"ts": round(ts, 1), "nivel": round(prom, 2) if prom is not None else None,
+                 "min": mn, "max": mx, "personas": personas, "genero": genero, "n": n}
+                for _, ts, prom, mn, mx, personas, genero, n in filas]
+
+    def frases(self, sala, desde=0.0, hasta=None, limite=20):
+        """Frases más recientes primero, con la URL de su audio si la hay."""
+        filas = self._lectura().execute(
+            "SELECT ts, persona, frase, audio FROM frases WHERE sala = ? AND ts >= ? AND ts < ? "
+            "ORDER BY ts DESC LIMIT ?", (sala, desde, hasta or time.time(), limite)).fetchall()
+        return [{"ts": round(ts, 1), "persona": p, "frase": f, "audio_url": a} for ts, p, f, a in filas]
+
+    def pistas(self, sala, desde=0.0, hasta=None, limite=50):
+        filas = self._lectura().execute(
+            "SELECT ts, uri, genero FROM pistas WHERE sala = ? AND ts >= ? AND ts < ? "
+            "ORDER BY ts DESC LIMIT ?", (sala, desde, hasta or time.time(), limite)).fetchall()
+        return [{"ts": round(ts, 1), "uri": u, "genero": g} for ts, u, g in filas]
+
+    def resumen(self, sala, desde, hasta=None, puntos=HISTORIAL_PUNTOS, frases=10):
+        """Lo que necesita un cliente que se conecta a mitad de la fiesta."""
+        return {"sala": sala, "desde": desde, "hasta": hasta or time.time(),
+                "linea_tiempo": self.linea_tiempo(sala, desde, hasta, puntos),
+                "frases": self.frases(sala, desde, hasta, frases),
+                "pistas": self.pistas(sala, desde, hasta)}
+
+    def stats(self) -> dict:
+        try:
+            tamaño = os.path.getsize(self.ruta) + (os.path.getsize(self.ruta + "-wal")
+                                                   if os.path.exists(self.ruta + "-wal") else 0)
+        except OSError:
+            tamaño = 0
+        return {"ruta": self.ruta, "pendientes": len(self._cola), "escritas": self.escritas,
+                "lotes": self.lotes, "errores": self.errores, "ultimo_lote_ms": self.ultimo_lote_ms,
+                "bytes": tamaño}
+
+
+historial = Historial()
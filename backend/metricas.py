@@ -0,0 +1,260 @@
+# metricas.py
+#
+# Métricas del proceso en formato de texto de Prometheus, sin dependencias:
+# contadores y histogramas con etiquetas, medidores que leen los stats() de
+# cada componente al momento del scrape, y un perfilador por muestreo que se
+# prende y apaga en caliente. Todo se expone en /metrics y /profiler (app.py).
+#
+# Registrar una observación es un bisect + dos sumas bajo un lock: se puede
+# llamar por frame sin que se note.
+
+import bisect, json, os, sys, threading, time
+from collections import Counter
+
+# ---------- parámetros ajustables --------------
+PREFIJO               = "dj"
+PROFILER              = os.getenv("PROFILER", "0") == "1"       # arrancar con el perfilador prendido
+PROFILER_INTERVALO_MS = float(os.getenv("PROFILER_INTERVALO_MS", 10))
+PROFILER_MAX_PILAS    = 5000        # pilas distintas guardadas antes de dejar de agregar nuevas
+EMISION_MUESTREO      = int(os.getenv("EMISION_MUESTREO", 16))   # 1 de cada N emisiones por evento mide su JSON
+# -----------------------------------------------
+
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CUBETAS_BYTES    = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+CUBETAS_FRAME    = (0.01, 0.02, 0.033, 0.05, 0.075, 0.1, 0.2, 0.5, 1)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres, valores) -> str:
+    if not nombres: return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = f"{PREFIJO}_{nombre}", ayuda, tuple(etiquetas)
+        self._lock = threading.Lock()
+        REGISTRO.append(self)
+
+    def _clave(self, valores):
+        return tuple(valores.get(n, "") for n in self.etiquetas)
+
+    def cabecera(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores = Counter()
+
+    def inc(self, n=1, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] += n
+
+    def exponer(self):
+        with self._lock:
+            items = list(self._valores.items())
+        return self.cabecera() + [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {v}" for k, v in items]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, cubetas=CUBETAS_SEGUNDOS, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.cubetas = tuple(sorted(cubetas))
+        self._series = {}   # clave -> [conteos por cubeta (no acumulados) + inf, suma]
+
+    def observar(self, valor, **etiquetas):
+        i = bisect.bisect_left(self.cubetas, valor)
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.cubetas) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    def exponer(self):
+        with self._lock:
+            series = [(k, list(c), s) for k, (c, s) in self._series.items()]
+        lineas = self.cabecera()
+        for clave, conteos, suma in series:
+            acum = 0
+            for limite, n in zip(self.cubetas + ("+Inf",), conteos):
+                acum += n
+                lineas.append(f"{self.nombre}_bucket"
+                              f"{_etiquetas(self.etiquetas + ('le',), clave + (limite,))} {acum}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {suma}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {acum}")
+        return lineas
+
+
+class Medidor(_Metrica):
+    """
+    Valor leído en cada scrape. `fn()` devuelve un número o un dict
+    {tupla_de_etiquetas: número}. Con tipo="counter" sirve para exponer
+    contadores que ya lleva otro componente en su stats().
+    """
+
+    def __init__(self, nombre, ayuda, fn, etiquetas=(), tipo="gauge"):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.fn, self.tipo = fn, tipo
+
+    def exponer(self):
+        try:
+            valor = self.fn()
+        except Exception as e:
+            return [f"# {self.nombre}: error al leer ({e!r})"]
+        if not isinstance(valor, dict):
+            valor = {(): valor}
+        return self.cabecera() + [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {float(v)}"
+                                  for k, v in valor.items() if v is not None]
+
+
+REGISTRO = []
+
+# ---- métricas del ciclo (se usan desde pipeline.py, app.py, dj_ai2.py…) ----
+etapa_segundos = Histograma("etapa_segundos", "Duración de cada etapa del ciclo de análisis",
+                            etiquetas=("etapa",))
+errores_api    = Contador("errores_api_total", "Errores de servicios externos", ("servicio",))
+respaldos      = Contador("respaldos_total", "Veces que se usó un camino de respaldo", ("tipo",))
+saltados       = Contador("analisis_saltados_total", "Análisis en la nube evitados", ("motivo",))
+bytes_subidos  = Histograma("vision_bytes", "Bytes de imagen subidos por análisis", CUBETAS_BYTES)
+intervalo_frames = Histograma("intervalo_frames_segundos", "Tiempo entre frames de cámara", CUBETAS_FRAME)
+emision_bytes  = Histograma("socket_emision_bytes", "Tamaño de los payloads emitidos por Socket.IO",
+                            CUBETAS_BYTES, ("evento",))
+
+
+def exponer() -> str:
+    lineas = []
+    for m in list(REGISTRO):
+        lineas.extend(m.exponer())
+    return "\n".join(lineas) + "\n"
+
+
+BINARIOS = (bytes, bytearray, memoryview)
+
+
+def _partes(datos):
+    """(bytes binarios, resto a serializar o None). Los binarios se miden con len()."""
+    if isinstance(datos, BINARIOS): return len(datos), None
+    if isinstance(datos, dict):
+        binarios = sum(len(v) for v in datos.values() if isinstance(v, BINARIOS))
+        if not binarios: return 0, datos
+        return binarios, {k: v for k, v in datos.items() if not isinstance(v, BINARIOS)}
+    return 0, datos
+
+
+def tamaño_payload(datos) -> int:
+    """Bytes que ocupa un payload de Socket.IO (los binarios van aparte del JSON)."""
+    binarios, resto = _partes(datos)
+    return binarios + (len(json.dumps(resto, default=str)) if resto is not None else 0)
+
+
+def medir_emisiones(emit, muestreo=EMISION_MUESTREO):
+    """
+    Envuelve socketio.emit para observar el tamaño de cada payload por evento.
+    Los binarios (frames JPEG) se miden siempre con len(); la parte JSON solo
+    se serializa en 1 de cada `muestreo` emisiones de cada evento y las demás
+    reusan ese último tamaño, así el ciclo no paga un json.dumps por emisión.
+    """
+    muestreo = max(1, muestreo)
+    ultimos = {}   # evento -> [emisiones, último tamaño JSON]
+    lock = threading.Lock()   # emiten los hilos de todas las salas
+
+    def emit_medido(evento, datos=None, *args, **kwargs):
+        binarios, resto = _partes(datos)
+        if resto is not None:
+            with lock:
+                estado = ultimos.get(evento)
+                if estado is None:
+                    estado = ultimos[evento] = [0, 0]
+                medir = estado[0] % muestreo == 0 or not estado[1]   # aún sin medida
+                estado[0] += 1
+                tamaño = estado[1]
+            if medir:   # el json.dumps va fuera del lock
+                tamaño = len(json.dumps(resto, default=str))
+                with lock:
+                    estado[1] = tamaño
+            binarios += tamaño
+        emision_bytes.observar(binarios, evento=evento)
+        return emit(evento, datos, *args, **kwargs)
+    return emit_medido
+
+
+# ================ perfilador por muestreo ================
+class Perfilador:
+    """
+    Cada `intervalo_ms` toma la pila de todos los hilos (sys._current_frames)
+    y cuenta pilas iguales. El resultado sale en formato "colapsado"
+    (func1;func2;func3 N), listo para flamegraph.pl o speedscope. Apagado no
+    cuesta nada: el hilo solo existe mientras está activo.
+    """
+
+    def __init__(self, intervalo_ms=PROFILER_INTERVALO_MS):
+        self.intervalo = intervalo_ms / 1000
+        self._pilas = Counter()
+        self._lock  = threading.Lock()
+        self._vivo  = threading.Event()
+        self._hilo  = None
+        self.muestras = 0
+        self.desde = None
+
+    @property
+    def activo(self) -> bool:
+        return self._vivo.is_set()
+
+    def iniciar(self, reiniciar=True):
+        if self.activo: return
+        if reiniciar:
+            with self._lock:
+                self._pilas.clear(); self.muestras = 0
+        self.desde = time.time()
+        self._vivo.set()
+        self._hilo = threading.Thread(target=self._bucle, name="perfilador", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._vivo.clear()
+        if self._hilo: self._hilo.join(timeout=1); self._hilo = None
+
+    def _bucle(self):
+        propio = threading.get_ident()
+        nombres = {}
+        while self._vivo.is_set():
+            nombres.update((t.ident, t.name) for t in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == propio: continue
+                pila = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                pila.append(nombres.get(ident, str(ident)))
+                clave = ";".join(reversed(pila))
+                with self._lock:
+                    if clave in self._pilas or len(self._pilas) < PROFILER_MAX_PILAS:
+                        self._pilas[clave] += 1
+            self.muestras += 1
+            time.sleep(self.intervalo)
+
+    def colapsado(self) -> str:
+        with self._lock:
+            return "\n".join(f"{pila} {n}" for pila, n in self._pilas.most_common()) + "\n"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"activo": self.activo, "muestras": self.muestras, "pilas": len(self._pilas),
+                    "intervalo_ms": self.intervalo * 1000, "desde": self.desde}
+
+
+perfilador = Perfilador()
@@ -0,0 +1,218 @@
+# personas.py
+#
+# Detector de personas en el propio equipo, con el OpenCV que ya usamos:
+# HOG + SVM de personas (sin archivos extra) o una red chica por cv2.dnn
+# (MobileNet-SSD u otra con salida de detección estilo SSD). Corre en su
+# propio hilo detrás de una cola acotada: el hilo de energía le ofrece 1 de
+# cada DETECTOR_CADA frames ya reducidos y, si el detector va atrasado, se
+# descarta el más viejo. Con eso:
+#   - el análisis (de la nube o local) se completa con hay_personas /
+#     numero_personas locales, así una llamada lenta o fallida no silencia
+#     una sala con gente, y
+#   - una sala vacía (sin detecciones ni movimiento) no paga análisis remoto.
+
+import os, queue, threading, time
+from collections import deque
+import cv2
+import numpy as np
+
+# ---------- parámetros ajustables --------------
+DETECTOR            = os.getenv("DETECTOR", "hog")              # hog | dnn | 0 (apagado)
+DETECTOR_CADA       = int(os.getenv("DETECTOR_CADA", 15))       # 1 de cada N frames (~2/s a 30 fps)
+DETECTOR_LADO       = int(os.getenv("DETECTOR_LADO", 480))      # px del lado largo al detectar
+DETECTOR_COLA       = 2                                         # frames en espera como máximo
+DETECTOR_VENTANA    = float(os.getenv("DETECTOR_VENTANA", 10))  # s de detecciones para el conteo
+DETECTOR_VACIO      = float(os.getenv("DETECTOR_VACIO", 20))    # s sin nadie para declarar la sala vacía
+DETECTOR_MIN_PASADAS = 5                                        # detecciones mínimas en esa ventana
+DETECTOR_CONFIANZA  = float(os.getenv("DETECTOR_CONFIANZA", 0.5))
+# Red para DETECTOR=dnn (p. ej. MobileNetSSD_deploy.caffemodel + .prototxt; clase 15 = persona en VOC)
+DETECTOR_MODELO     = os.getenv("DETECTOR_MODELO", "")
+DETECTOR_CONFIG     = os.getenv("DETECTOR_CONFIG", "")
+DETECTOR_CLASE      = int(os.getenv("DETECTOR_CLASE", 15))
+DETECTOR_ENTRADA    = (300, 300)
+# -----------------------------------------------
+
+
+def reducir_a(frame, lado=DETECTOR_LADO):
+    """Copia reducida al lado largo `lado` (el original puede ser una vista del anillo de la cámara)."""
+    alto, ancho = frame.shape[:2]
+    f = lado / max(alto, ancho)
+    if not lado or f >= 1: return frame.copy()
+    return cv2.resize(frame, (round(ancho * f), round(alto * f)), interpolation=cv2.INTER_AREA)
+
+
+class _HOG:
+    nombre = "hog"
+
+    def __init__(self):
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def contar(self, img) -> int:
+        rects, pesos = self.hog.detectMultiScale(img, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0: return 0
+        pesos = np.asarray(pesos, dtype=float).ravel()
+        # El SVM devuelve un margen, no una probabilidad: el umbral va en esa escala
+        return len(cv2.dnn.NMSBoxes([list(map(int, r)) for r in rects], pesos.tolist(),
+                                    DETECTOR_CONFIANZA, 0.4))
+
+
+class _DNN:
+    nombre = "dnn"
+
+    def __init__(self, modelo=DETECTOR_MODELO, config=DETECTOR_CONFIG):
+        self.net = cv2.dnn.readNet(modelo, config)
+
+    def contar(self, img) -> int:
+        blob = cv2.dnn.blobFromImage(img, 0.007843, DETECTOR_ENTRADA, 127.5)
+        self.net.setInput(blob)
+        salida = self.net.forward().reshape(-1, 7)   # [_, clase, confianza, x0, y0, x1, y1]
+        return int(np.count_nonzero((salida[:, 1] == DETECTOR_CLASE) & (salida[:, 2] >= DETECTOR_CONFIANZA)))
+
+
+def crear_backend(modo=DETECTOR):
+    """Backend de detección para `modo`; la red DNN cae a HOG si no hay modelo."""
+    if modo == "dnn":
+        if DETECTOR_MODELO and os.path.exists(DETECTOR_MODELO):
+            return _DNN()
+        print("⚠️  DETECTOR=dnn sin DETECTOR_MODELO válido, se usa HOG.")
+    return _HOG()
+
+
+class DetectorPersonas:
+    """Hilo detector con cola acotada y un historial corto de conteos."""
+
+    def __init__(self, modo=DETECTOR, cada=DETECTOR_CADA, cola=DETECTOR_COLA):
+        self.modo  = modo if modo in ("hog", "dnn") else None
+        self.cada  = max(1, cada)
+        self._cola = queue.Queue(maxsize=max(1, cola))
+        self._backend = None          # se construye en el hilo (cargar la red puede tardar)
+        self._conteos = deque()       # (monotonic, n)
+        self._lock  = threading.Lock()
+        self._vivo  = threading.Event()
+        self._hilo  = None
+        self._n     = 0
+
+        # ---- estadísticas ----
+        self.pasadas = self.descartados = 0
+        self._costos = deque(maxlen=100)   # (s de reloj, s de CPU del hilo) por frame
+
+    @property
+    def activo(self) -> bool:
+        return self._vivo.is_set()
+
+    # ------------------ ciclo de vida ------------------
+    def iniciar(self):
+        if self.modo is None: return
+        self.detener()
+        self._vivo.set()
+        self._hilo = threading.Thread(target=self._bucle, name="personas", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._vivo.clear()
+        try: self._cola.put_nowait(None)      # despierta al hilo si está esperando
+        except queue.Full: pass
+        if self._hilo: self._hilo.join(timeout=2); self._hilo = None
+        while not self._cola.empty():
+            try: self._cola.get_nowait()
+            except queue.Empty: break
+        with self._lock:
+            self._conteos.clear()
+
+    # ------------------ productor ------------------
+    def ofrecer(self, frame):
+        """Llamado por frame desde el hilo de energía; encola 1 de cada `cada`."""
+        if not self.activo: return
+        self._n += 1
+        if self._n % self.cada: return
+        img = reducir_a(frame)
+        try:
+            self._cola.put_nowait(img)
+        except queue.Full:
+            # Atrasado: el frame más viejo ya no sirve, entra el nuevo
+            try: self._cola.get_nowait()
+            except queue.Empty: pass
+            self.descartados += 1
+            try: self._cola.put_nowait(img)
+            except queue.Full: pass
+
+    # ------------------ hilo detector ------------------
+    def _bucle(self):
+        try:
+            if self._backend is None:
+                self._backend = crear_backend(self.modo)
+        except Exception as e:
+            print(f"⚠️  No se pudo iniciar el detector de personas: {e}")
+            self._vivo.clear(); return
+        while self._vivo.is_set():
+            try:
+                img = self._cola.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if img is None: continue
+            t0, c0 = time.perf_counter(), time.thread_time()
+            try:
+                n = self._backend.contar(img)
+            except Exception as e:
+                print(f"Error en el detector de personas: {e}"); continue
+            self._costos.append((time.perf_counter() - t0, time.thread_time() - c0))
+            ahora = time.monotonic()
+            with self._lock:
+                self.pasadas += 1
+                self._conteos.append((ahora, n))
+                while self._conteos and ahora - self._conteos[0][0] > max(DETECTOR_VENTANA, DETECTOR_VACIO):
+                    self._conteos.popleft()
+
+    # ------------------ lectura ------------------
+    def _recientes(self, segundos):
+        limite = time.monotonic() - segundos
+        with self._lock:
+            return [n for t, n in self._conteos if t >= limite]
+
+    def numero(self):
+        """Personas estimadas en la ventana reciente, o None sin detecciones frescas."""
+        conteos = sorted(self._recientes(DETECTOR_VENTANA))
+        if not conteos: return None
+        # HOG pierde a la gente de costado o tapada: se toma el percentil 75, no la media
+        return conteos[int(0.75 * (len(conteos) - 1))]
+
+    def vacia(self) -> bool:
+        """True si en DETECTOR_VACIO s hubo suficientes detecciones y ninguna encontró a nadie."""
+        conteos = self._recientes(DETECTOR_VACIO)
+        return len(conteos) >= DETECTOR_MIN_PASADAS and not any(conteos)
+
+    def fusionar(self, analisis: dict) -> dict:
+        """
+        Completa el análisis con lo detectado: si el detector ve gente, la sala
+        no queda marcada como vacía por un análisis remoto equivocado, y el
+        análisis local (sin conteo ni presencia) recibe uno. Solo una sala
+        vacía sostenida (`vacia()`) completa hay_personas=False.
+        """
+        n = self.numero()
+        if n is None: return analisis
+        analisis = dict(analisis, personas_locales=n)
+        if n > 0:
+            analisis["hay_personas"] = True
+            if not analisis.get("numero_personas"):
+                analisis["numero_personas"] = n
+        else:
+            if analisis.get("numero_personas") is None:
+                analisis["numero_personas"] = 0
+            if analisis.get("hay_personas") is None and self.vacia():
+                analisis["hay_personas"] = False
+        return analisis
+
+    def stats(self) -> dict:
+        costos = list(self._costos)
+        return {
+            "modo": self._backend.nombre if self._backend else self.modo,
+            "activo": self.activo,
+            "cada": self.cada,
+            "pasadas": self.pasadas,
+            "descartados": self.descartados,
+            "numero": self.numero(),
+            "vacia": self.vacia(),
+            "ms_medio": round(sum(t for t, _ in costos) / len(costos) * 1000, 1) if costos else None,
+            "cpu_ms_medio": round(sum(c for _, c in costos) / len(costos) * 1000, 1) if costos else None,
+        }
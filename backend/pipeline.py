@@ -0,0 +1,80 @@
+# pipeline.py
+#
+# Pools de trabajo por etapa del ciclo de análisis y registro de tiempos.
+# Visión, voz (frase + TTS) y Spotify corren en pools separados para que la
+# música cambie en cuanto llega el análisis, sin esperar a que termine el
+# audio, y para que el siguiente análisis no espere al TTS anterior.
+
+import threading, time, os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import metricas
+
+# ---------- parámetros ajustables --------------
+VOZ_WORKERS     = int(os.getenv("VOZ_WORKERS", 2))   # frases/TTS en vuelo a la vez
+VISION_WORKERS  = int(os.getenv("VISION_WORKERS", 2)) # análisis en vuelo (de salas distintas)
+HISTORIA_TIEMPOS = 200                                # muestras guardadas por etapa
+# -----------------------------------------------
+
+# Cada sala encadena su siguiente análisis al terminar la visión, así que dos
+# análisis en vuelo siempre son de salas distintas. Spotify va con un solo
+# worker: nunca hay dos comandos de reproducción pisándose.
+POOL_VISION  = ThreadPoolExecutor(max_workers=VISION_WORKERS, thread_name_prefix="vision")
+POOL_VOZ     = ThreadPoolExecutor(max_workers=VOZ_WORKERS, thread_name_prefix="voz")
+POOL_SPOTIFY = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spotify")
+
+
+def lanzar(pool, fn, *args, **kwargs):
+    """submit() que no se traga las excepciones del worker."""
+    fut = pool.submit(fn, *args, **kwargs)
+    def _revisar(f):
+        if f.exception():
+            print(f"Error en {fn.__name__}: {f.exception()!r}")
+    fut.add_done_callback(_revisar)
+    return fut
+
+
+def _percentil(ordenados, p):
+    if not ordenados: return None
+    i = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[i]
+
+
+class TiemposEtapas:
+    """Duraciones recientes por etapa (s) con resumen en ms."""
+
+    def __init__(self, historia=HISTORIA_TIEMPOS):
+        self._datos = {}
+        self._historia = historia
+        self._lock = threading.Lock()
+
+    def registrar(self, etapa: str, segundos: float):
+        metricas.etapa_segundos.observar(segundos, etapa=etapa)
+        with self._lock:
+            self._datos.setdefault(etapa, deque(maxlen=self._historia)).append(segundos)
+
+    @contextmanager
+    def medir(self, etapa: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - t0)
+
+    def resumen(self) -> dict:
+        with self._lock:
+            copia = {k: sorted(v) for k, v in self._datos.items()}
+        return {
+            etapa: {
+                "n": len(v),
+                "p50_ms": round(_percentil(v, 50) * 1000, 1),
+                "p95_ms": round(_percentil(v, 95) * 1000, 1),
+                "p99_ms": round(_percentil(v, 99) * 1000, 1),
+                "media_ms": round(sum(v) / len(v) * 1000, 1),
+            }
+            for etapa, v in copia.items() if v
+        }
+
+
+tiempos = TiemposEtapas()
@@ -0,0 +1,123 @@
+# preproceso.py
+#
+# Etapa entre la captura y Gemini Vision: achica lo que se sube. Recorta
+# (opcional) a la zona donde hubo movimiento, reduce al lado largo objetivo y
+# re-codifica a JPEG o WebP. El recorte es una vista del frame y el buffer del
+# resize se reserva una vez mientras no cambie la resolución. Cada llamada deja bytes y
+# latencia para poder ajustar calidad vs. precisión con el replay de
+# benchmarks/replay_preproceso.py.
+
+import os, threading, time
+from collections import deque
+import cv2
+import numpy as np
+
+# ---------- parámetros ajustables --------------
+VISION_LADO     = int(os.getenv("VISION_LADO", 768))        # px del lado largo; 0 = sin reducir
+VISION_FORMATO  = os.getenv("VISION_FORMATO", "jpeg")       # jpeg | webp
+VISION_CALIDAD  = int(os.getenv("VISION_CALIDAD", 80))      # 1-100
+VISION_RECORTE  = os.getenv("VISION_RECORTE", "0") == "1"   # recortar a la zona con movimiento
+RECORTE_UMBRAL  = 0.05    # valor del mapa de movimiento que cuenta como "zona activa"
+RECORTE_MARGEN  = 0.15    # margen alrededor de la zona, en fracción de su tamaño
+RECORTE_MIN     = 0.25    # el recorte nunca es menor a esta fracción de cada lado
+HISTORIA        = 200
+# -----------------------------------------------
+
+FORMATOS = {
+    "jpeg": (".jpg",  "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+def zona_activa(mapa, forma, umbral=RECORTE_UMBRAL, margen=RECORTE_MARGEN, minimo=RECORTE_MIN):
+    """
+    Rectángulo (y0, y1, x0, x1) en coordenadas de `forma` que cubre el
+    movimiento del mapa reducido, o None si no hay zona clara (sin
+    movimiento o movimiento en casi toda la imagen).
+    """
+    if mapa is None: return None
+    ys, xs = np.nonzero(mapa >= umbral)
+    if len(ys) == 0: return None
+    mh, mw = mapa.shape
+    alto, ancho = forma[:2]
+    y0, y1 = ys.min() / mh, (ys.max() + 1) / mh
+    x0, x1 = xs.min() / mw, (xs.max() + 1) / mw
+    # Margen y tamaño mínimo alrededor del centro de la zona
+    dy = max(minimo, (y1 - y0) * (1 + 2 * margen)) / 2
+    dx = max(minimo, (x1 - x0) * (1 + 2 * margen)) / 2
+    cy, cx = (y0 + y1) / 2, (x0 + x1) / 2
+    y0, y1 = max(0.0, cy - dy), min(1.0, cy + dy)
+    x0, x1 = max(0.0, cx - dx), min(1.0, cx + dx)
+    if (y1 - y0) * (x1 - x0) > 0.8:
+        return None                  # casi todo el cuadro: no vale la pena recortar
+    return int(y0 * alto), int(y1 * alto), int(x0 * ancho), int(x1 * ancho)
+
+
+class Preprocesador:
+    """Recorte + resize + codificación con buffers reutilizados y métricas por llamada."""
+
+    def __init__(self, lado=VISION_LADO, formato=VISION_FORMATO, calidad=VISION_CALIDAD,
+                 recorte=VISION_RECORTE):
+        if formato not in FORMATOS:
+            raise ValueError(f"formato de visión desconocido: {formato}")
+        self.lado, self.formato, self.calidad, self.recorte = lado, formato, calidad, recorte
+        self._ext, self.mime, flag = FORMATOS[formato]
+        self._params = [flag, calidad]
+        self._destino = None         # buffer del resize, se reserva con la 1ra forma de salida
+        self._lock = threading.Lock()
+
+        self.procesados = 0
+        self.recortados = 0
+        self.bytes_original = 0      # bytes del frame BGR sin comprimir
+        self.bytes_subidos  = 0
+        self._historia = deque(maxlen=HISTORIA)   # (bytes, segundos)
+
+    def _reducir(self, frame):
+        alto, ancho = frame.shape[:2]
+        largo = max(alto, ancho)
+        if not self.lado or largo <= self.lado:
+            return frame
+        f = self.lado / largo
+        forma = (max(1, round(alto * f)), max(1, round(ancho * f))) + frame.shape[2:]
+        if self._destino is None or self._destino.shape != forma:
+            self._destino = np.empty(forma, dtype=frame.dtype)
+        cv2.resize(frame, (forma[1], forma[0]), dst=self._destino, interpolation=cv2.INTER_AREA)
+        return self._destino
+
+    def procesar(self, frame, mapa=None) -> dict:
+        """
+        frame BGR -> {"mime_type", "data"} listo para Gemini, con "bytes",
+        "ms" y "recorte" (rectángulo usado o None) para las métricas.
+        """
+        t0 = time.perf_counter()
+        with self._lock:
+            self.bytes_original += frame.nbytes
+            zona = zona_activa(mapa, frame.shape) if self.recorte else None
+            if zona:
+                y0, y1, x0, x1 = zona
+                frame = frame[y0:y1, x0:x1]   # vista, sin copia
+            ok, buf = cv2.imencode(self._ext, self._reducir(frame), self._params)
+            if not ok:
+                raise RuntimeError(f"no se pudo codificar el frame a {self.formato}")
+            datos = buf.tobytes()
+            dt = time.perf_counter() - t0
+
+            self.procesados += 1
+            self.recortados += zona is not None
+            self.bytes_subidos  += len(datos)
+            self._historia.append((len(datos), dt))
+        return {"mime_type": self.mime, "data": datos, "bytes": len(datos),
+                "ms": round(dt * 1000, 1), "recorte": zona}
+
+    def stats(self) -> dict:
+        with self._lock:
+            h = list(self._historia)
+            return {
+                "lado": self.lado, "formato": self.formato, "calidad": self.calidad,
+                "recorte": self.recorte,
+                "procesados": self.procesados,
+                "recortados": self.recortados,
+                "bytes_medio": round(sum(b for b, _ in h) / len(h)) if h else 0,
+                "ms_medio": round(sum(t for _, t in h) / len(h) * 1000, 1) if h else 0.0,
+                "compresion": round(self.bytes_original / self.bytes_subidos, 1) if self.bytes_subidos else None,
+            }
@@ -0,0 +1,94 @@
+# presupuesto.py
+#
+# Presupuesto global de llamadas a la nube y política de intervalos del
+# planificador. Cada servicio (Gemini, ElevenLabs) tiene un tope por hora en
+# ventana deslizante; el intervalo entre análisis de cada sala se calcula para
+# repartir ese tope entre las salas activas y luego se acorta o alarga según
+# lo movida que esté la escena, la tendencia de energía y el consumo real.
+
+import os, threading, time
+from collections import deque
+
+# ---------- parámetros ajustables --------------
+GEMINI_POR_HORA     = int(os.getenv("GEMINI_POR_HORA", 360))      # visión + frases
+ELEVENLABS_POR_HORA = int(os.getenv("ELEVENLABS_POR_HORA", 120))  # síntesis de voz
+INTERVALO_MIN       = float(os.getenv("INTERVALO_MIN", 10))       # s entre análisis de una sala
+INTERVALO_MAX       = float(os.getenv("INTERVALO_MAX", 120))
+VENTANA             = 3600                                        # s del presupuesto
+# Llamadas que cuesta un ciclo completo (visión + frase en Gemini, un TTS)
+COSTO_CICLO = {"gemini": 2, "elevenlabs": 1}
+# -----------------------------------------------
+
+
+class Presupuesto:
+    """Tope de llamadas por hora en ventana deslizante. Thread-safe."""
+
+    def __init__(self, nombre, por_hora, ventana=VENTANA):
+        self.nombre, self.por_hora, self.ventana = nombre, por_hora, ventana
+        self._llamadas = deque()
+        self._lock = threading.Lock()
+        self._inicio = time.monotonic()
+        self.rechazadas = 0
+
+    def _purgar(self, ahora):
+        while self._llamadas and ahora - self._llamadas[0] > self.ventana:
+            self._llamadas.popleft()
+
+    def consumir(self) -> bool:
+        """Anota una llamada si queda presupuesto. False = no llamar al servicio."""
+        with self._lock:
+            ahora = time.monotonic()
+            self._purgar(ahora)
+            if len(self._llamadas) >= self.por_hora:
+                self.rechazadas += 1
+                return False
+            self._llamadas.append(ahora)
+            return True
+
+    def usadas(self) -> int:
+        with self._lock:
+            self._purgar(time.monotonic())
+            return len(self._llamadas)
+
+    def uso_relativo(self) -> float:
+        """
+        Consumo de la ventana frente al que tocaría a ritmo constante. 1.0 = en
+        objetivo, <1 sobra presupuesto, >1 se está gastando de más. Durante el
+        primer minuto devuelve 1.0: hay muy pocas muestras para opinar.
+        """
+        transcurrido = min(self.ventana, time.monotonic() - self._inicio)
+        if transcurrido < 60: return 1.0
+        return self.usadas() / (self.por_hora * transcurrido / self.ventana)
+
+    def stats(self) -> dict:
+        return {"por_hora": self.por_hora, "usadas_ultima_hora": self.usadas(),
+                "uso_relativo": round(self.uso_relativo(), 2), "rechazadas": self.rechazadas}
+
+
+gemini     = Presupuesto("gemini", GEMINI_POR_HORA)
+elevenlabs = Presupuesto("elevenlabs", ELEVENLABS_POR_HORA)
+SERVICIOS  = {"gemini": gemini, "elevenlabs": elevenlabs}
+
+
+def intervalo_base(n_salas: int) -> float:
+    """Intervalo por sala que gasta justo el presupuesto más escaso si todos los ciclos llaman a la nube."""
+    return max(VENTANA * COSTO_CICLO[k] * max(1, n_salas) / p.por_hora for k, p in SERVICIOS.items())
+
+
+def intervalo(n_salas: int, volatilidad: float, tendencia: float) -> float:
+    """
+    Segundos hasta el próximo análisis de una sala.
+      volatilidad: 0 (escena quieta) .. 1 (cambia mucho entre análisis)
+      tendencia:   niveles de energía por minuto (signo = sube/baja)
+    """
+    s = intervalo_base(n_salas)
+    s *= 1.5 - min(1.0, max(0.0, volatilidad))        # quieta ×1.5, muy movida ×0.5
+    s /= 1 + min(1.0, abs(tendencia) / 2)             # energía cambiando: mirar más seguido
+    # Corrección por consumo real (los saltos del filtro de escena no gastan)
+    uso = max(p.uso_relativo() for p in SERVICIOS.values())
+    s *= min(3.0, max(0.5, uso))
+    return min(INTERVALO_MAX, max(INTERVALO_MIN, s))
+
+
+def stats() -> dict:
+    return {k: p.stats() for k, p in SERVICIOS.items()}
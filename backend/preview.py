@@ -0,0 +1,135 @@
+# preview.py
+#
+# Preview de video por push: cada frame nuevo del capturador se codifica a
+# JPEG UNA sola vez y se reparte a todos los clientes suscritos, ya sea como
+# payload binario de Socket.IO o por el endpoint MJPEG. Un cliente lento no
+# acumula cola: mientras no confirme el frame anterior se le saltan frames.
+
+import threading, time, os
+import cv2
+
+# ---------- parámetros ajustables --------------
+PREVIEW_CALIDAD = int(os.getenv("PREVIEW_CALIDAD", 70))    # calidad JPEG (1-100)
+PREVIEW_ANCHO   = int(os.getenv("PREVIEW_ANCHO", 640))     # px; 0 = resolución original
+PREVIEW_FPS     = float(os.getenv("PREVIEW_FPS", 15))      # tope de codificación
+ACK_TIMEOUT     = 2.0                                      # s antes de dar un frame por perdido
+# -----------------------------------------------
+
+
+class DifusorPreview:
+    """Codifica una vez por frame y hace fan-out a Socket.IO y MJPEG."""
+
+    def __init__(self, socketio, calidad=PREVIEW_CALIDAD, ancho=PREVIEW_ANCHO, fps=PREVIEW_FPS):
+        self.socketio = socketio
+        self.calidad  = calidad
+        self.ancho    = ancho
+        self.fps      = fps
+
+        self._camara    = None
+        self._hilo      = None
+        self._vivo      = threading.Event()
+        self._cond      = threading.Condition()
+        self._jpeg      = None         # último JPEG codificado (bytes)
+        self._jpeg_seq  = 0
+        self._subs      = set()        # sids suscritos
+        self._pendiente = {}           # sid -> ts del frame aún sin ack
+
+        self.frames_codificados = 0
+        self.envios             = 0
+        self.saltos             = 0    # frames no enviados a un cliente por estar ocupado
+
+    # ------------------ ciclo de vida ------------------
+    def iniciar(self, camara):
+        self.detener()
+        self._camara = camara
+        self._vivo.set()
+        self._hilo = threading.Thread(target=self._bucle, name="preview", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._vivo.clear()
+        if self._hilo: self._hilo.join(timeout=2); self._hilo = None
+        with self._cond:
+            self._camara, self._jpeg, self._jpeg_seq = None, None, 0
+            self._pendiente.clear()
+            self._cond.notify_all()
+
+    # ------------------ suscriptores ------------------
+    def suscribir(self, sid):
+        with self._cond: self._subs.add(sid)
+
+    def desuscribir(self, sid):
+        with self._cond:
+            self._subs.discard(sid)
+            self._pendiente.pop(sid, None)
+
+    def _ack(self, sid):
+        with self._cond: self._pendiente.pop(sid, None)
+
+    # ------------------ codificación + fan-out ------------------
+    def _bucle(self):
+        camara, seq = self._camara, 0
+        intervalo = 1.0 / self.fps if self.fps > 0 else 0
+        ultimo_t = 0.0
+        while self._vivo.is_set():
+            seq = camara.esperar(seq, timeout=1.0)
+            if not self._vivo.is_set() or not camara.activo: break
+            espera = intervalo - (time.monotonic() - ultimo_t)
+            if espera > 0:
+                time.sleep(espera)
+            ultimo_t = time.monotonic()
+
+            seq, frame = camara.ultimo(copiar=False)
+            if frame is None: continue
+            if self.ancho and frame.shape[1] > self.ancho:
+                alto = int(frame.shape[0] * self.ancho / frame.shape[1])
+                frame = cv2.resize(frame, (self.ancho, alto), interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+            if not ok: continue
+            jpeg = buf.tobytes()
+            self.frames_codificados += 1
+
+            with self._cond:
+                self._jpeg, self._jpeg_seq = jpeg, seq
+                self._cond.notify_all()
+                ahora = time.time()
+                libres = []
+                for sid in self._subs:
+                    ts = self._pendiente.get(sid)
+                    if ts is not None and ahora - ts < ACK_TIMEOUT:
+                        self.saltos += 1
+                        continue
+                    self._pendiente[sid] = ahora
+                    libres.append(sid)
+
+            for sid in libres:
+                self.socketio.emit("frame_jpeg", jpeg, to=sid,
+                                   callback=lambda *_, sid=sid: self._ack(sid))
+                self.envios += 1
+
+    def ultimo_jpeg(self):
+        with self._cond:
+            return self._jpeg
+
+    def mjpeg(self):
+        """Generador multipart/x-mixed-replace: siempre entrega el JPEG más reciente."""
+        seq = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._jpeg_seq != seq or not self._vivo.is_set(), 5)
+                if not self._vivo.is_set(): return
+                jpeg, seq = self._jpeg, self._jpeg_seq
+            if jpeg is None: continue
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                   + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "suscriptores": len(self._subs),
+                "frames_codificados": self.frames_codificados,
+                "envios": self.envios,
+                "saltos_cliente_lento": self.saltos,
+                "bytes_ultimo_frame": len(self._jpeg) if self._jpeg else 0,
+                "calidad": self.calidad, "ancho": self.ancho, "fps_max": self.fps,
+            }
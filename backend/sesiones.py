@@ -0,0 +1,267 @@
+# sesiones.py
+#
+# Varias salas en un solo proceso. Cada `Sesion` guarda lo que antes era
+# global en app.py: fuente de cámara, persona del DJ, dispositivo de Spotify,
+# filtro de escena, estimador de energía, preview y el estado del último
+# análisis. Un único `Planificador` (un hilo con un heap de vencimientos)
+# dispara los ciclos de todas las salas sobre los pools compartidos de
+# pipeline.py, en vez de un threading.Timer por sala.
+
+import heapq, itertools, os, threading, time
+from collections import deque
+from camara import Capturador
+from preview import DifusorPreview
+from escena import FiltroEscena, SelectorClaves
+from preproceso import Preprocesador
+from energia_local import EstimadorEnergia, ENERGIA_CALIBRACION, MOVIMIENTO_MINIMO
+from suavizado import Suavizador
+from personas import DetectorPersonas
+from spotify_controller import ControladorMusica
+from historial import historial
+
+# ---------- parámetros ajustables --------------
+SALA_DEFECTO = os.getenv("SALA_DEFECTO", "principal")
+MAX_SALAS    = int(os.getenv("MAX_SALAS", 8))
+# Fuente de cámara y dispositivo de Spotify por sala: "cocina=1,terraza=rtsp://…"
+# (las fuentes numéricas son índices de OpenCV; sin entrada se usa la cámara 0)
+SALAS_FUENTES      = os.getenv("SALAS_FUENTES", "")
+SALAS_DISPOSITIVOS = os.getenv("SALAS_DISPOSITIVOS", "")
+# -----------------------------------------------
+
+
+def _por_sala(texto):
+    pares = (p.split("=", 1) for p in texto.split(",") if "=" in p)
+    return {k.strip(): v.strip() for k, v in pares}
+
+FUENTES      = {k: int(v) if v.isdigit() else v for k, v in _por_sala(SALAS_FUENTES).items()}
+DISPOSITIVOS = _por_sala(SALAS_DISPOSITIVOS)
+
+
+def _ruta_calibracion(sala):
+    # Cada cámara tiene su propia escala movimiento -> energía
+    if sala == SALA_DEFECTO: return ENERGIA_CALIBRACION
+    base, ext = os.path.splitext(ENERGIA_CALIBRACION)
+    return f"{base}_{sala}{ext}"
+
+
+class Sesion:
+    """Estado de una sala. Los eventos de Socket.IO van a la room `sala`."""
+
+    def __init__(self, sala, socketio, fuente=0, persona="bad_bunny", dispositivo=None,
+                 al_cambiar_energia=None):
+        self.sala     = sala
+        self.socketio = socketio
+        self.fuente   = fuente
+        self.persona  = persona
+        self.musica   = ControladorMusica(
+            dispositivo, al_saltar=lambda uri, genero: historial.registrar_pista(sala, uri, genero))
+
+        self.camara    = None
+        self.filtro    = FiltroEscena()
+        self.preview   = DifusorPreview(socketio)
+        self.preproceso = Preprocesador()
+        self.claves    = SelectorClaves()
+        self.suavizador = Suavizador()
+        self.detector  = DetectorPersonas()
+        self.estimador = EstimadorEnergia(
+            al_cambiar=(lambda nivel: al_cambiar_energia(self, nivel)) if al_cambiar_energia else None,
+            ruta=_ruta_calibracion(sala), selector=self.claves, detector=self.detector)
+
+        self.lock       = threading.Lock()
+        self.analisis   = None
+        self.frase      = None
+        self.audio_url  = None    # dónde volver a pedir el audio de `frase` (banco o /audio/<clave>)
+        self.conteo     = 0       # análisis hechos en este ciclo de cámara
+        self.ultima_voz = 0       # ciclo de la última frase emitida
+        self.gen        = 0       # cambia con cada start/stop; invalida trabajos en vuelo
+        self.clientes   = set()
+        self.ultima_subida = None  # bytes y latencias del último análisis enviado a la nube
+
+        # ---- entradas del intervalo adaptativo ----
+        self.t_ciclo     = 0.0                 # monotonic del inicio del ciclo en curso
+        self.volatilidad = 0.5                 # EMA 0-1 del cambio de escena entre análisis
+        self.niveles     = deque(maxlen=6)     # (monotonic, nivel_energia) recientes
+
+    @property
+    def activa(self) -> bool:
+        return self.camara is not None and self.camara.activo
+
+    def vacia(self) -> bool:
+        """Nadie detectado en un buen rato y la imagen quieta: no hace falta preguntarle a la nube."""
+        return self.detector.vacia() and self.estimador.movimiento() <= MOVIMIENTO_MINIMO
+
+    def anotar_escena(self):
+        """Actualiza la volatilidad con las métricas que dejó el filtro de escena."""
+        m = self.filtro.ultimas_metricas
+        if m is None: return
+        # Cuántas veces el umbral más sensible se superó (1.0 = justo en el umbral)
+        r = max(m[k] / u for k, u in self.filtro.umbrales.items() if u)
+        self.volatilidad = 0.7 * self.volatilidad + 0.3 * min(1.0, r / 2)
+
+    def anotar_nivel(self, nivel):
+        self.niveles.append((time.monotonic(), nivel))
+
+    def tendencia(self) -> float:
+        """Pendiente de la energía reciente en niveles por minuto (0 con menos de 2 muestras)."""
+        if len(self.niveles) < 2: return 0.0
+        n = len(self.niveles)
+        tm = sum(t for t, _ in self.niveles) / n
+        nm = sum(v for _, v in self.niveles) / n
+        var = sum((t - tm) ** 2 for t, _ in self.niveles)
+        if var == 0: return 0.0
+        return 60 * sum((t - tm) * (v - nm) for t, v in self.niveles) / var
+
+    def emitir(self, evento, datos=None, **kwargs):
+        self.socketio.emit(evento, datos, to=self.sala, **kwargs)
+
+    # ------------------ ciclo de vida ------------------
+    def iniciar(self, fuente=None) -> bool:
+        self.detener()
+        if fuente is not None: self.fuente = fuente
+        with self.lock:
+            self.conteo = self.ultima_voz = 0
+            self.gen += 1
+        self.filtro = FiltroEscena()
+        self.claves.tomar()
+        self.suavizador.reiniciar()
+        self.volatilidad = 0.5
+        self.niveles.clear()
+        camara = Capturador(self.fuente)
+        if not camara.iniciar():
+            return False
+        self.camara = camara
+        self.preview.iniciar(camara)
+        self.detector.iniciar()
+        self.estimador.iniciar(camara)
+        return True
+
+    def detener(self):
+        with self.lock:
+            self.gen += 1
+        self.preview.detener()
+        self.estimador.detener()
+        self.detector.detener()
+        if self.camara: self.camara.detener(); self.camara = None
+
+    def stats(self) -> dict:
+        return {
+            "fuente": self.fuente if isinstance(self.fuente, (int, str))
+                      else getattr(self.fuente, "__qualname__", type(self.fuente).__name__),
+            "persona": self.persona,
+            "clientes": len(self.clientes),
+            "analisis": self.conteo,
+            "volatilidad": round(self.volatilidad, 2),
+            "tendencia_por_min": round(self.tendencia(), 2),
+            "camara": self.camara.stats() if self.camara else None,
+            "preview": self.preview.stats(),
+            "escena": self.filtro.stats(),
+            "preproceso": self.preproceso.stats(),
+            "claves": self.claves.stats(),
+            "suavizado": self.suavizador.stats(),
+            "ultima_subida": self.ultima_subida,
+            "energia_local": self.estimador.stats(),
+            "personas": self.detector.stats(),
+            "musica": self.musica.stats(),
+        }
+
+
+class Planificador:
+    """
+    Un hilo para todas las salas. `programar(sesion, s, desde)` deja una entrada
+    (vence, n, gen, sesion) en un heap; al vencer se llama `tarea(sesion)`.
+    Cada sala tiene a lo sumo una entrada viva: programar de nuevo reemplaza la
+    anterior, y un start/stop (que sube `sesion.gen`) invalida las que hubiera,
+    así que nunca corren dos cadenas de análisis de la misma sala.
+    La tarea debe ser corta: lo pesado va a los pools de pipeline.py.
+    """
+
+    def __init__(self, tarea):
+        self.tarea  = tarea
+        self._heap  = []
+        self._n     = itertools.count()
+        self._viva  = {}              # sala -> n de su única entrada válida
+        self._cond  = threading.Condition()
+        self._hilo  = threading.Thread(target=self._bucle, name="planificador", daemon=True)
+        self._hilo.start()
+        self.disparos = self.descartados = 0
+        self._retrasos = deque(maxlen=200)   # s entre el vencimiento y el disparo real
+
+    def programar(self, sesion, segundos, gen=None, desde=None):
+        """
+        Programa el próximo ciclo `segundos` después de `desde` (monotonic). Al
+        medir desde el inicio del ciclo anterior, lo que tardó el análisis no
+        alarga el período; si ya venció, dispara enseguida.
+        """
+        gen = sesion.gen if gen is None else gen
+        if gen != sesion.gen: return   # cadena de una cámara anterior
+        vence = (time.monotonic() if desde is None else desde) + segundos
+        with self._cond:
+            n = next(self._n)
+            self._viva[sesion.sala] = n
+            heapq.heappush(self._heap, (vence, n, gen, sesion))
+            self._cond.notify()
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                vence, n, gen, sesion = heapq.heappop(self._heap)
+                viva = self._viva.get(sesion.sala) == n
+                if viva: del self._viva[sesion.sala]
+            if not viva or gen != sesion.gen:
+                self.descartados += 1
+                continue
+            self.disparos += 1
+            self._retrasos.append(time.monotonic() - vence)
+            try:
+                self.tarea(sesion)
+            except Exception as e:
+                print(f"Error en el ciclo de la sala {sesion.sala}: {e!r}")
+
+    def stats(self) -> dict:
+        with self._cond:
+            retrasos = sorted(self._retrasos)
+            return {"pendientes": len(self._viva), "disparos": self.disparos,
+                    "descartados": self.descartados,
+                    "retraso_p95_ms": round(retrasos[int(0.95 * (len(retrasos) - 1))] * 1000, 1)
+                                      if retrasos else None}
+
+
+class Salas:
+    """Registro sala -> Sesion, con la sala por defecto siempre presente."""
+
+    def __init__(self, socketio, **defaults_sesion):
+        self.socketio = socketio
+        self.defaults = defaults_sesion
+        self._salas   = {}
+        self._lock    = threading.Lock()
+        self.obtener(SALA_DEFECTO)
+
+    def obtener(self, sala=None) -> Sesion:
+        sala = sala or SALA_DEFECTO
+        with self._lock:
+            sesion = self._salas.get(sala)
+            if sesion is None:
+                if len(self._salas) >= MAX_SALAS:
+                    raise ValueError(f"máximo de salas alcanzado ({MAX_SALAS})")
+                config = dict(self.defaults)
+                if sala in FUENTES: config["fuente"] = FUENTES[sala]
+                if sala in DISPOSITIVOS: config["dispositivo"] = DISPOSITIVOS[sala]
+                sesion = self._salas[sala] = Sesion(sala, self.socketio, **config)
+            return sesion
+
+    def buscar(self, sala=None):
+        """La Sesion de `sala` si ya existe, o None; a diferencia de obtener() no crea ninguna."""
+        with self._lock:
+            return self._salas.get(sala or SALA_DEFECTO)
+
+    def activas(self) -> int:
+        return sum(1 for s in self if s.activa)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._salas.values()))
+
+    def stats(self) -> dict:
+        return {s.sala: s.stats() for s in self}
@@ -0,0 +1,4 @@
+# spotify_controller: único punto de control de Spotify (pistas, géneros, reproducción)
+from .controller import (sp, catalogo, ControladorMusica, GENERO_PLAYLISTS, PLAYLIST_DEFECTO, cargar_generos,
+                         reproducir_cancion, actualizar_musica_spotify, estado_reproduccion,
+                         convertir_link_a_uri, stats)
@@ -0,0 +1,205 @@
+# cliente.py
+#
+# Envoltorio del cliente spotipy para uso concurrente:
+#   - una sola requests.Session con pool de conexiones para todo el proceso,
+#   - presupuesto de llamadas del lado cliente (cubeta de tokens),
+#   - reintentos con backoff + jitter que respetan Retry-After en los 429,
+#   - comandos de reproducción coalescidos: si llegan varios seguidos, solo
+#     se envía el último (salvo add_to_queue, que se acumula).
+# La URL base es configurable para probarlo contra un Spotify falso local.
+
+import os, random, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+from spotipy import Spotify
+from spotipy.exceptions import SpotifyException
+
+# ---------- parámetros ajustables --------------
+SPOTIFY_API_PREFIX = os.getenv("SPOTIFY_API_PREFIX", "https://api.spotify.com/v1/")
+SPOTIFY_TASA       = float(os.getenv("SPOTIFY_TASA", 5))     # llamadas/s sostenidas
+SPOTIFY_RAFAGA     = int(os.getenv("SPOTIFY_RAFAGA", 10))    # llamadas seguidas permitidas
+SPOTIFY_REINTENTOS = int(os.getenv("SPOTIFY_REINTENTOS", 4))
+BACKOFF_BASE       = 0.5                                     # s; se duplica por intento
+BACKOFF_MAX        = 30.0
+POOL_CONEXIONES    = 10
+# -----------------------------------------------
+
+COMANDOS_REPRODUCCION = {"start_playback", "pause_playback", "next_track", "add_to_queue", "seek_track"}
+COMANDOS_ACUMULABLES  = {"add_to_queue"}   # cada uno suma una pista: nunca se reemplazan entre sí
+# Repetirlos cambia el resultado (encola o salta dos veces): un 5xx o un corte a
+# mitad de camino pudo haberse aplicado, así que solo se reintentan los 429 y
+# los fallos de conexión previos al envío
+NO_IDEMPOTENTES       = {"add_to_queue", "next_track", "previous_track"}
+
+
+class CubetaTokens:
+    """Limitador de tasa simple y thread-safe. `pausar()` congela a todos tras un 429."""
+
+    def __init__(self, tasa, capacidad):
+        self.tasa, self.capacidad = tasa, capacidad
+        self._tokens = float(capacidad)
+        self._t = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.capacidad, self._tokens + (ahora - self._t) * self.tasa)
+                self._t = ahora
+                espera = self._pausa_hasta - ahora
+                if espera <= 0 and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                if espera <= 0:
+                    espera = (1 - self._tokens) / self.tasa
+            time.sleep(espera)
+
+    def pausar(self, segundos):
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+
+
+def _retry_after(e: SpotifyException):
+    headers = getattr(e, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After") or headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ClienteSpotify:
+    """
+    Drop-in para `spotipy.Spotify`: cualquier método (`playlist`, `current_playback`…)
+    pasa por el limitador y los reintentos. Los comandos de reproducción van por
+    `comando()`, que es asíncrono y coalescente.
+
+    El spotipy.Spotify de adentro se crea en la primera llamada; `auth_manager`
+    puede ser una función que lo construye, para no leer credenciales al importar.
+    """
+
+    def __init__(self, prefijo=SPOTIFY_API_PREFIX, tasa=SPOTIFY_TASA, rafaga=SPOTIFY_RAFAGA,
+                 reintentos=SPOTIFY_REINTENTOS, **kwargs_spotify):
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_CONEXIONES)
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+        self.prefijo = prefijo
+        self.sp = None
+        self._kwargs_sp = kwargs_spotify
+        self._lock_sp = threading.Lock()
+
+        self.cubeta     = CubetaTokens(tasa, rafaga)
+        self.reintentos = reintentos
+
+        self._cmd_cond   = threading.Condition()
+        self._pendientes = OrderedDict()   # clave -> (nombre, args, kwargs, Future)
+        self._hilo_cmd  = threading.Thread(target=self._bucle_comandos, name="spotify_cmd", daemon=True)
+        self._hilo_cmd.start()
+
+        self.llamadas = self.reintentos_429 = self.errores = 0
+        self.comandos_enviados = self.comandos_coalescidos = 0
+
+    def inicializar(self):
+        """Crea (una vez) y devuelve el spotipy.Spotify interno."""
+        with self._lock_sp:
+            if self.sp is None:
+                kwargs = dict(self._kwargs_sp)
+                if callable(kwargs.get("auth_manager")):
+                    kwargs["auth_manager"] = kwargs["auth_manager"]()
+                # Con una Session propia spotipy no monta su adaptador de reintentos: los 429 son nuestros
+                sp = Spotify(requests_session=self.session, **kwargs)
+                sp.prefix = self.prefijo
+                self.sp = sp
+            return self.sp
+
+    @property
+    def listo(self) -> bool:
+        return self.sp is not None
+
+    # ------------------ llamadas síncronas ------------------
+    def llamar(self, nombre, *args, **kwargs):
+        metodo = getattr(self.sp or self.inicializar(), nombre)
+        idempotente = nombre not in NO_IDEMPOTENTES
+        for intento in range(self.reintentos + 1):
+            self.cubeta.tomar()
+            self.llamadas += 1
+            try:
+                return metodo(*args, **kwargs)
+            except SpotifyException as e:
+                reintentable = e.http_status == 429 or (idempotente and (e.http_status or 0) >= 500)
+                if not reintentable or intento == self.reintentos:
+                    self.errores += 1
+                    raise
+                espera = self._backoff(intento, _retry_after(e))
+                if e.http_status == 429:
+                    self.reintentos_429 += 1
+                    self.cubeta.pausar(espera)   # que nadie más golpee mientras tanto
+                print(f"⏳ Spotify {e.http_status} en {nombre}; reintento en {espera:.1f}s")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if intento == self.reintentos or not (idempotente or isinstance(e, requests.ConnectTimeout)):
+                    self.errores += 1
+                    raise
+                espera = self._backoff(intento, None)
+                print(f"⏳ Spotify sin conexión en {nombre} ({e.__class__.__name__}); reintento en {espera:.1f}s")
+            time.sleep(espera)
+
+    @staticmethod
+    def _backoff(intento, retry_after):
+        base = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** intento)
+        # El jitter se suma: nunca esperamos menos de lo que pide Retry-After
+        return max(retry_after or 0, base) + random.uniform(0, base)
+
+    def __getattr__(self, nombre):
+        # Sin inicializar no sabemos si `nombre` existe: lo resuelve llamar()
+        if nombre.startswith("_") or not callable(getattr(Spotify, nombre, None)):
+            raise AttributeError(nombre)
+        return lambda *a, **kw: self.llamar(nombre, *a, **kw)
+
+    # ------------------ comandos coalescidos ------------------
+    def comando(self, nombre, *args, clave=None, **kwargs) -> Future:
+        """
+        Encola un comando de reproducción. Si todavía había uno esperando con la
+        misma `clave` (p. ej. el device_id de una sala), se descarta y su Future
+        termina con "reemplazado": solo cuenta el último, que sale en el lugar
+        del reemplazado (un start_playback no pasa detrás de los add_to_queue
+        encolados después). Los acumulables (add_to_queue) no se coalescen y
+        salen en orden con el resto.
+        """
+        assert nombre in COMANDOS_REPRODUCCION, nombre
+        if nombre in COMANDOS_ACUMULABLES:
+            clave = object()
+        fut = Future()
+        with self._cmd_cond:
+            previo = self._pendientes.get(clave)   # reasignar la clave conserva su posición
+            if previo is not None:
+                previo[3].set_result("reemplazado")
+                self.comandos_coalescidos += 1
+            self._pendientes[clave] = (nombre, args, kwargs, fut)
+            self._cmd_cond.notify()
+        return fut
+
+    def _bucle_comandos(self):
+        while True:
+            with self._cmd_cond:
+                self._cmd_cond.wait_for(lambda: self._pendientes)
+                _, (nombre, args, kwargs, fut) = self._pendientes.popitem(last=False)
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(self.llamar(nombre, *args, **kwargs))
+                self.comandos_enviados += 1
+            except Exception as e:
+                fut.set_exception(e)
+
+    def stats(self) -> dict:
+        return {
+            "llamadas": self.llamadas,
+            "reintentos_429": self.reintentos_429,
+            "errores": self.errores,
+            "comandos_enviados": self.comandos_enviados,
+            "comandos_coalescidos": self.comandos_coalescidos,
+        }
@@ -2,21 +2,33 @@
 
 import os
 import time
-from spotipy import Spotify
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from spotipy.oauth2 import SpotifyOAuth
+from catalogo import Catalogo
+from .cliente import ClienteSpotify
+from .transiciones import (TRANSICIONES, TRANSICION_ANTICIPO, TRANSICION_ESPERA_FORZADA,
+                           VentanaSinRepetir, Previas, hasta_corte)
 
 # --- Configuración de Spotify ---
-sp = Spotify(auth_manager=SpotifyOAuth(
+# Cliente compartido: sesión HTTP con pool, límite de tasa y reintentos 429.
+# El OAuth se arma en la primera llamada, no al importar.
+sp = ClienteSpotify(auth_manager=lambda: SpotifyOAuth(
     client_id=os.getenv("SPOTIPY_CLIENT_ID"),
     client_secret=os.getenv("SPOTIPY_CLIENT_SECRET"),
-    redirect_uri=os.getenv("SPOTIPY_REDIRECT_URI"),
-    scope="user-modify-playback-state user-read-playback-state"
+    redirect_uri=os.getenv("SPOTIPY_REDIRECT_URI"),   # p. ej.  http://localhost:8888/callback
+    scope=("user-modify-playback-state user-read-playback-state "
+           "playlist-read-private playlist-read-collaborative")
 ))
 
 # --- Variables de control ---
-ultimo_estado = None
-ultimo_cambio = 0
 COOLDOWN_SEGUNDOS = 45 # Aumentamos un poco para no cambiar tan rápido
+COOLDOWN_SALTO    = 15 # segundos mínimos entre saltos de pista dentro de un género
+PLAYBACK_TTL      = float(os.getenv("SPOTIFY_PLAYBACK_TTL", 30))  # s que vale el current_playback cacheado
+SPOTIFY_WORKERS   = 4  # playlists de género cargándose a la vez
+
+PLAYLIST_DEFECTO = "spotify:playlist:37i9dQZF1DX9C8KzGEUKV4"  # cuando el análisis no trae género
 
 GENERO_PLAYLISTS = {
     "reggaeton": "spotify:playlist:37i9dQZF1DX10zKzsJ2jva", # Perreo
@@ -31,6 +43,8 @@ GENERO_PLAYLISTS = {
     "meditacion": "spotify:playlist:37i9dQZF1DWZqd5JICZI0u"
 }
 
+catalogo = Catalogo(sp)
+
 def convertir_link_a_uri(link):
     if "track/" in link:
         return "spotify:track:" + link.split("track/")[1].split("?")[0]
@@ -40,53 +54,341 @@ def convertir_link_a_uri(link):
         return "spotify:album:" + link.split("album/")[1].split("?")[0]
     return None
 
-# --- FUNCIÓN MODIFICADA ---
-def actualizar_musica_spotify(analisis, modo_usuario):
-    global ultimo_estado, ultimo_cambio
+def _pid(uri):
+    return uri.rsplit(":", 1)[-1]
 
-    if modo_usuario:
-        print("🧑‍🎤 Modo usuario activo. Spotify no se controla automáticamente.")
-        return
+def _uri_playlist(pid):
+    return "spotify:playlist:" + pid
 
-    if not analisis or not analisis.get("hay_personas"):
-        if ultimo_estado != "pausa":
-            print("🎧 No hay personas, pausando música en Spotify.")
-            try:
-                sp.pause_playback()
-                ultimo_estado = "pausa"
-            except Exception as e:
-                print(f"Error al pausar Spotify: {e}")
-        return
+def _playlist_de(genero):
+    return GENERO_PLAYLISTS.get(genero, PLAYLIST_DEFECTO)
+
+# --- Carga de playlists ---
+def _cargar_playlist(uri):
+    pid = _pid(uri)
+    catalogo.abrir(pid)                   # disco, sin red
+    if catalogo.necesita_refresco(pid):
+        catalogo.refrescar(pid)
+    return len(catalogo.indice(pid))
+
+def cargar_generos(esperar=False):
+    """
+    Carga todas las playlists (defecto + géneros) desde el catálogo y refresca
+    las viejas con un pool acotado. Por defecto corre en segundo plano; con
+    `esperar` lanza RuntimeError si el catálogo quedó vacío (refresco fallido
+    y nada en disco), así la tarea de arranque reintenta y /readyz no miente.
+    """
+    def _todas():
+        uris = [PLAYLIST_DEFECTO] + list(GENERO_PLAYLISTS.values())
+        with ThreadPoolExecutor(max_workers=SPOTIFY_WORKERS, thread_name_prefix="playlists") as pool:
+            total = sum(pool.map(_cargar_playlist, uris))
+        print(f"📀 {len(uris)} playlists listas ({total} pistas en catálogo).")
+        return total
+    if esperar:
+        if not _todas():
+            raise RuntimeError("ninguna playlist tiene pistas en el catálogo")
+    else:
+        threading.Thread(target=_todas, name="cargar_generos", daemon=True).start()
+
+# --- Control por sala ---
+class ControladorMusica:
+    """
+    Estado de música de una sala: género vigente, última pista, cooldowns y
+    current_playback cacheado. El cliente y el catálogo son compartidos; los
+    comandos se coalescen por dispositivo. `al_saltar(uri, genero)` se llama
+    con cada pista ordenada (uri None al pausar), por ejemplo para el historial.
+
+    Transiciones (SPOTIFY_TRANSICIONES=1): con algo sonando, un cambio de
+    energía no corta la canción; la siguiente pista se encola (add_to_queue)
+    TRANSICION_ANTICIPO s antes del final, calculado con el progreso del
+    current_playback cacheado. Solo un cambio forzado lejos del final corta,
+    y lo hace en el próximo fin de frase según el tempo del catálogo.
+    """
+
+    def __init__(self, dispositivo=None, al_saltar=None):
+        self.dispositivo   = dispositivo
+        self.al_saltar     = al_saltar
+        self.ultimo_estado = None   # género sonando, "pausa" o None
+        self.ultimo_cambio = 0
+        self.ultima_pista  = None
+        self.ultimo_salto  = 0
+        self.consultas_playback = 0
+        self._playback = {"estado": None, "ts": 0.0}
+        self._lock = threading.Lock()
+
+        # ---- transiciones ----
+        self.recientes = VentanaSinRepetir()
+        self.previas   = Previas(catalogo, self.recientes)
+        self._transicion    = threading.RLock()   # análisis, estimador local y temporizador deciden de a uno
+        self._temporizador  = None
+        self._objetivo      = None   # (pid, nivel, genero) a encolar cuando se acerque el final
+        self._encolada_tras = None   # uri de la pista tras la cual ya encolamos una
+        self.encoladas = self.cortes = self.diferidas = 0
+
+    # --- Estado de reproducción cacheado ---
+    def estado_reproduccion(self, max_edad=PLAYBACK_TTL):
+        """current_playback() con caché: solo consulta a Spotify si el dato tiene más de `max_edad` s."""
+        with self._lock:
+            if time.time() - self._playback["ts"] < max_edad:
+                return self._playback["estado"]
+        estado = sp.current_playback()
+        with self._lock:
+            self._playback["estado"], self._playback["ts"] = estado, time.time()
+            self.consultas_playback += 1
+        return estado
 
-    genero = analisis.get("genero_recomendado", "chill").lower().strip()
-    playlist = GENERO_PLAYLISTS.get(genero)
+    def _anotar_reproduccion(self, is_playing, uri=None, contexto=None):
+        # Lo que acabamos de ordenar es el estado más fresco que podemos tener
+        with self._lock:
+            self._playback["estado"] = {"is_playing": is_playing, "progress_ms": 0 if is_playing else None,
+                                        "item": {"uri": uri} if uri else None,
+                                        "context": {"uri": contexto} if contexto else None}
+            self._playback["ts"] = time.time()
 
-    if not playlist:
-        print(f"🎵 Género '{genero}' no reconocido, usando 'chill' por defecto.")
-        playlist = GENERO_PLAYLISTS["chill"]
-        genero = "chill"
+    def _olvidar_reproduccion(self):
+        with self._lock:
+            self._playback["ts"] = 0.0
 
-    ahora = time.time()
+    def _enviar(self, nombre, **kwargs):
+        """Comando de reproducción asíncrono y coalescido; si al final falla, el estado cacheado se invalida."""
+        def _revisar(fut):
+            if fut.exception():
+                print(f"Spotify error ({nombre}):", fut.exception())
+                self._olvidar_reproduccion()
+        if self.dispositivo:
+            kwargs["device_id"] = self.dispositivo
+        sp.comando(nombre, clave=self.dispositivo, **kwargs).add_done_callback(_revisar)
 
-    if genero == ultimo_estado:
-        # Si estamos en el mismo género, nos aseguramos de que la música esté sonando
+    def _posicion(self, reintento=False):
+        """(uri, progreso_ms, restante_ms) extrapolados del current_playback cacheado, o None si no se sabe."""
         try:
-            current_playback = sp.current_playback()
-            if not current_playback or not current_playback.get('is_playing'):
-                 print(f"▶️ Reactivando reproducción para género '{genero}'.")
-                 sp.start_playback(context_uri=playlist)
+            estado = self.estado_reproduccion()
         except Exception as e:
             print(f"Error al verificar reproducción de Spotify: {e}")
-        return
-
-    if ahora - ultimo_cambio < COOLDOWN_SEGUNDOS:
-        print(f"⏳ Cooldown de Spotify activo. Esperando para cambiar de género.")
-        return
-
-    print(f"🎶 Cambiando música en Spotify al género: {genero}")
-    try:
-        sp.start_playback(context_uri=playlist)
-        ultimo_estado = genero
-        ultimo_cambio = ahora
-    except Exception as e:
-        print(f"Error al iniciar reproducción en Spotify: {e}")
\ No newline at end of file
+            return None
+        item = (estado or {}).get("item") or {}
+        if not estado or not estado.get("is_playing") or not item.get("duration_ms") \
+                or estado.get("progress_ms") is None:
+            return None
+        with self._lock:
+            edad = time.time() - self._playback["ts"]
+        progreso = estado["progress_ms"] + edad * 1000
+        restante = item["duration_ms"] - progreso
+        if restante <= 0:
+            if reintento: return None
+            self._olvidar_reproduccion()   # ya terminó: se consulta una vez la pista que siguió
+            return self._posicion(reintento=True)
+        return item.get("uri"), progreso, restante
+
+    def _contexto(self):
+        """URI de la playlist (contexto) que suena según el current_playback cacheado, o None."""
+        with self._lock:
+            estado = self._playback["estado"]
+        return ((estado or {}).get("context") or {}).get("uri")
+
+    def _sonando(self) -> bool:
+        try:
+            estado = self.estado_reproduccion()
+        except Exception as e:
+            print(f"Error al verificar reproducción de Spotify: {e}")
+            return False
+        return bool(estado and estado.get("is_playing"))
+
+    def _programar(self, segundos, fn, *args):
+        """Un solo temporizador por sala: programar de nuevo reemplaza lo pendiente."""
+        def correr():
+            with self._transicion:
+                if self._temporizador is not t: return   # reemplazado justo cuando vencía
+                self._temporizador = None
+                fn(*args)
+        if self._temporizador: self._temporizador.cancel()
+        t = self._temporizador = threading.Timer(max(0.0, segundos), correr)
+        t.daemon = True
+        t.start()
+
+    def _cancelar(self):
+        with self._transicion:
+            if self._temporizador: self._temporizador.cancel()
+            self._temporizador = self._objetivo = None
+
+    def _poner(self, pid, nivel, track, genero, tras=None):
+        """Encola `track` detrás de la pista `tras`, o lo pone ya si `tras` es None."""
+        self.previas.usar(pid, nivel, track)
+        if tras is not None:
+            self._enviar("add_to_queue", uri=track)
+            self._encolada_tras = tras
+            self.encoladas += 1
+            print("🎵 Spotify → en cola", track)
+        else:
+            self._enviar("start_playback", uris=[track])
+            self._anotar_reproduccion(True, track)
+            print("🎵 Spotify →", track)
+        self.ultima_pista, self.ultimo_salto = track, time.time()
+        if self.al_saltar: self.al_saltar(track, genero)
+
+    def _poner_playlist(self, pid, genero):
+        """Catálogo vacío: sin pistas para elegir, arranca la playlist en una posición aleatoria."""
+        playlist = _uri_playlist(pid)
+        self._enviar("start_playback", context_uri=playlist, offset={"position": random.randint(0, 99)})
+        self._anotar_reproduccion(True, contexto=playlist)
+        print(f"🎵 Spotify → salto aleatorio dentro de {playlist}")
+        self.ultima_pista, self.ultimo_salto = playlist, time.time()
+        if self.al_saltar: self.al_saltar(playlist, genero)
+
+    def _playlist_tras(self, pid, genero, pos):
+        """Una playlist no entra en la cola de Spotify: se arranca cuando termina la pista `pos`."""
+        self._programar(pos[2] / 1000, self._poner_playlist, pid, genero)
+        self._encolada_tras = pos[0]
+        self.ultimo_salto = time.time()
+        self.encoladas += 1
+
+    def _diferir(self, pid, nivel, genero, pos):
+        """Deja el cambio para TRANSICION_ANTICIPO s antes del final (o para cuando se sepa el final)."""
+        self._objetivo = (pid, nivel, genero)
+        espera = pos[2] / 1000 - TRANSICION_ANTICIPO if pos else PLAYBACK_TTL
+        self._programar(espera, self._al_final)
+        self.diferidas += 1
+
+    def _al_final(self):
+        objetivo, self._objetivo = self._objetivo, None
+        if objetivo is None: return
+        pos = self._posicion()
+        if pos is None:
+            if self._sonando(): self._diferir(*objetivo, None)   # sin duración todavía: reintentar
+            return   # pausada o sin estado: decide el próximo análisis
+        if pos[2] > (TRANSICION_ANTICIPO + 5) * 1000:
+            self._diferir(*objetivo, pos)   # la pista cambió o la adelantaron/atrasaron
+        elif self._encolada_tras != pos[0]:
+            pid, nivel, genero = objetivo
+            track = self.previas.ver(pid, nivel)
+            if track: self._poner(pid, nivel, track, genero, tras=pos[0])
+            else: self._playlist_tras(pid, genero, pos)
+
+    def _cortar(self, pid, nivel, track, genero, pos):
+        """Cambio forzado lejos del final: en el próximo fin de frase de la pista actual."""
+        self._objetivo = None
+        tempo = (catalogo.features(pos[0]) or {}).get("tempo") if pos else None
+        espera = hasta_corte(tempo, pos[1]) if pos else 0.0
+        if track is None:
+            self._programar(espera, self._poner_playlist, pid, genero)
+        else:
+            self.previas.usar(pid, nivel, track)   # reservada: que no la tome otra transición
+            self._programar(espera, self._poner, pid, nivel, track, genero)
+        self.ultimo_salto = time.time()
+        self.cortes += 1
+
+    # --- Reproducción por género + energía ---
+    def reproducir_cancion(self, nivel: int, genero=None, force=False):
+        """
+        Cambia a una pista del género (o el vigente) con energía acorde a
+        `nivel`. True si el cambio quedó hecho o planificado (puesta, encolada,
+        o programada para el fin de frase o de pista); False si no hizo nada o
+        si un cambio no forzado quedó diferido al final de la pista. Con el
+        catálogo vacío se pone la playlist entera con los mismos tiempos, y
+        si ya es la que suena no se toca.
+        """
+        ahora = time.time()
+        if not force and (ahora - self.ultimo_salto) < COOLDOWN_SALTO:
+            return False
+
+        if genero is None:
+            if self.ultimo_estado == "pausa": return False   # sala vacía: solo un análisis la reactiva
+            genero = self.ultimo_estado
+        playlist = _playlist_de(genero)
+        pid = _pid(playlist)
+
+        with self._transicion:
+            track = self.previas.ver(pid, nivel)   # lookahead local, sin las recientes
+            if track is None and self._sonando() and self._contexto() == playlist:
+                # Catálogo vacío pero la playlist ya suena: Spotify sigue solo, no hay pista que elegir
+                return force
+
+            if not TRANSICIONES or not self._sonando():
+                # Nada sonando (o transiciones apagadas): no hay canción que cortar
+                self._cancelar()
+                if track is None: self._poner_playlist(pid, genero)
+                else: self._poner(pid, nivel, track, genero)
+                return True
+
+            pos = self._posicion()
+            if pos and pos[2] <= TRANSICION_ANTICIPO * 1000:
+                # Ya hay una esperando (la cola de Spotify no se puede editar): un cambio
+                # forzado de género se da por hecho y el próximo análisis sigue desde ahí
+                if self._encolada_tras == pos[0]: return force
+                self._cancelar()
+                if track is None: self._playlist_tras(pid, genero, pos)
+                else: self._poner(pid, nivel, track, genero, tras=pos[0])
+                return True
+            if force and not (pos and pos[2] <= TRANSICION_ESPERA_FORZADA * 1000):
+                self._cortar(pid, nivel, track, genero, pos)
+                return True
+            self._diferir(pid, nivel, genero, pos)
+            return force   # forzado y cerca del final: queda planificado para el borde de la pista
+
+    def actualizar_musica_spotify(self, analisis, modo_usuario=False, force=False):
+        if modo_usuario:
+            print("🧑‍🎤 Modo usuario activo. Spotify no se controla automáticamente.")
+            return
+
+        if not analisis or not analisis.get("hay_personas"):
+            if self.ultimo_estado != "pausa":
+                print("🎧 No hay personas, pausando música en Spotify.")
+                self._enviar("pause_playback")
+                self.ultimo_estado = "pausa"
+                self._cancelar()
+                self._anotar_reproduccion(False)
+                if self.al_saltar: self.al_saltar(None, "pausa")
+            return
+
+        nivel = analisis.get("nivel_energia", 5)
+        genero = (analisis.get("genero_recomendado") or "").lower().strip() or None
+        if genero and genero not in GENERO_PLAYLISTS:
+            print(f"🎵 Género '{genero}' no reconocido, usando 'chill' por defecto.")
+            genero = "chill"
+
+        ahora = time.time()
+
+        if genero == self.ultimo_estado or (genero is None and self.ultimo_estado not in (None, "pausa")):
+            # Mismo género: nos aseguramos de que suene (estado cacheado) y ajustamos por energía
+            try:
+                current_playback = self.estado_reproduccion()
+                if not current_playback or not current_playback.get('is_playing'):
+                    print(f"▶️ Reactivando reproducción para género '{self.ultimo_estado}'.")
+                    force = True
+            except Exception as e:
+                print(f"Error al verificar reproducción de Spotify: {e}")
+            self.reproducir_cancion(nivel, force=force)
+            return
+
+        if self.ultimo_estado not in (None, "pausa") and ahora - self.ultimo_cambio < COOLDOWN_SEGUNDOS:
+            print(f"⏳ Cooldown de Spotify activo. Esperando para cambiar de género.")
+            self.reproducir_cancion(nivel, force=force)
+            return
+
+        print(f"🎶 Cambiando música en Spotify al género: {genero or 'defecto'}")
+        if self.reproducir_cancion(nivel, genero or "defecto", force=True):
+            self.ultimo_estado = genero or "defecto"
+            self.ultimo_cambio = ahora
+
+    def stats(self) -> dict:
+        return {
+            "dispositivo": self.dispositivo,
+            "genero": self.ultimo_estado,
+            "ultima_pista": self.ultima_pista,
+            "transiciones": {"encoladas": self.encoladas, "cortes": self.cortes,
+                             "diferidas": self.diferidas, "previas": len(self.previas),
+                             "recientes": len(self.recientes)},
+            "consultas_playback": self.consultas_playback,
+        }
+
+# Controlador de la sala por defecto (un solo dispositivo: el activo de la cuenta)
+_defecto = ControladorMusica()
+reproducir_cancion        = _defecto.reproducir_cancion
+actualizar_musica_spotify = _defecto.actualizar_musica_spotify
+estado_reproduccion       = _defecto.estado_reproduccion
+
+def stats() -> dict:
+    return {
+        "cliente": sp.stats(),
+        "catalogo": catalogo.stats(),
+    }
@@ -0,0 +1,95 @@
+# transiciones.py
+#
+# Piezas del motor de transiciones de ControladorMusica:
+#   - VentanaSinRepetir: las últimas N pistas puestas (deque + set: agregar,
+#     olvidar la más vieja y `in` en O(1)),
+#   - Previas: por (playlist, cubeta de energía) unas pocas candidatas ya
+#     elegidas del catálogo local, sin red, listas para encolar,
+#   - hasta_corte(): cuánto falta para el próximo límite de frase musical (o
+#     de compás) según el tempo del catálogo, para que un cambio urgente no
+#     corte la canción a mitad de frase.
+# La lógica de cuándo encolar y cuándo cortar vive en controller.py.
+
+import os
+from collections import deque
+from energia_local import cubeta   # la misma regla de cubetas que el suavizado y la caché de voz
+
+# ---------- parámetros ajustables --------------
+TRANSICIONES        = os.getenv("SPOTIFY_TRANSICIONES", "1") == "1"   # 0: saltos inmediatos como antes
+TRANSICION_ANTICIPO = float(os.getenv("TRANSICION_ANTICIPO", 15))    # s antes del final en que se encola la siguiente
+TRANSICION_PREVIAS  = 3       # candidatas preparadas por playlist y cubeta
+TRANSICION_MEMORIA  = int(os.getenv("TRANSICION_MEMORIA", 50))       # pistas recientes que no se repiten
+TRANSICION_COMPASES = 8       # una frase musical: 8 compases de 4 tiempos
+TRANSICION_ESPERA_MAX = 6.0   # s que un cambio urgente espera al fin de frase; si no, al fin de compás
+TRANSICION_ESPERA_FORZADA = 45.0   # un cambio forzado espera el final de la pista si falta menos que esto
+# -----------------------------------------------
+
+
+class VentanaSinRepetir:
+    """Conjunto de las últimas `n` pistas, en orden de llegada."""
+
+    def __init__(self, n=TRANSICION_MEMORIA):
+        self.n = n
+        self._orden = deque()
+        self._vistas = set()
+
+    def agregar(self, uri):
+        if not uri or uri in self._vistas: return
+        self._orden.append(uri)
+        self._vistas.add(uri)
+        if len(self._orden) > self.n:
+            self._vistas.discard(self._orden.popleft())
+
+    def __contains__(self, uri):
+        return uri in self._vistas
+
+    def __len__(self):
+        return len(self._orden)
+
+
+class Previas:
+    """Cola corta de candidatas por (playlist, cubeta), rellenada desde el catálogo en memoria."""
+
+    def __init__(self, catalogo, recientes, n=TRANSICION_PREVIAS):
+        self.catalogo, self.recientes, self.n = catalogo, recientes, n
+        self._colas = {}   # (pid, cubeta) -> deque de uris
+
+    def _rellenar(self, pid, nivel):
+        cola = self._colas.setdefault((pid, cubeta(nivel)), deque())
+        while cola and cola[0] in self.recientes:   # ya sonó por otra cubeta
+            cola.popleft()
+        for _ in range(2 * self.n):
+            if len(cola) >= self.n: break
+            uri = self.catalogo.elegir(pid, nivel, excluir=self.recientes)
+            if uri is None: break
+            if uri not in cola: cola.append(uri)
+        return cola
+
+    def ver(self, pid, nivel):
+        """La próxima candidata (sin consumirla), o None con el catálogo vacío."""
+        cola = self._rellenar(pid, nivel)
+        return cola[0] if cola else None
+
+    def usar(self, pid, nivel, uri):
+        """Marca `uri` como puesta: sale de su cola y entra en la ventana sin repetir."""
+        cola = self._colas.get((pid, cubeta(nivel)))
+        if cola and cola[0] == uri: cola.popleft()
+        self.recientes.agregar(uri)
+
+    def __len__(self):
+        return sum(len(c) for c in self._colas.values())
+
+
+def hasta_corte(tempo, progreso_ms, espera_max=TRANSICION_ESPERA_MAX, compases=TRANSICION_COMPASES):
+    """
+    Segundos hasta el próximo fin de frase (`compases` compases de 4 tiempos)
+    si llega dentro de `espera_max`, si no hasta el próximo fin de compás.
+    Supone la grilla en fase con el inicio de la pista (el catálogo no trae la
+    posición del primer tiempo). Sin tempo, 0: se corta enseguida.
+    """
+    if not tempo or tempo <= 0: return 0.0
+    compas = 4 * 60.0 / tempo
+    t = progreso_ms / 1000
+    frase = compas * compases
+    espera = frase - t % frase
+    return espera if espera <= espera_max else compas - t % compas
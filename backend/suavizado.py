@@ -0,0 +1,109 @@
+# suavizado.py
+#
+# Filtro temporal entre el análisis de visión y las decisiones de música y
+# voz. Un análisis cada 20-60 s es una muestra ruidosa: alguien que tapa la
+# cámara o un frame movido no debería forzar un salto de pista. Se aplica:
+#   - EMA sobre nivel_energia (los análisis locales pesan menos),
+#   - histéresis sobre la cubeta baja/media/alta: para cambiar, la EMA tiene
+#     que pasar el límite por SUAVIZADO_BANDA niveles,
+#   - confirmación de hay_personas y del género: N análisis coincidentes.
+# El resultado tiene la misma forma que el análisis crudo.
+
+import os, threading
+from collections import Counter, deque
+from energia_local import cubeta
+
+# ---------- parámetros ajustables --------------
+SUAVIZADO_ALFA       = float(os.getenv("SUAVIZADO_ALFA", 0.5))   # peso del análisis nuevo en la EMA (1 = sin suavizar)
+SUAVIZADO_BANDA      = float(os.getenv("SUAVIZADO_BANDA", 0.5))  # niveles más allá del límite para cambiar de cubeta
+SUAVIZADO_CONFIRMAR  = int(os.getenv("SUAVIZADO_CONFIRMAR", 2))  # análisis seguidos para cambiar hay_personas/género
+SUAVIZADO_PESO_LOCAL = 0.5                                       # factor del alfa para la estimación local
+# -----------------------------------------------
+
+LIMITES = (4.5, 7.5)                  # fronteras continuas entre cubetas (ver energia_local.cubeta)
+RANGOS  = ((1, 4), (5, 7), (8, 10))   # niveles enteros de cada cubeta
+
+
+class Suavizador:
+    """Estado suavizado de una sala. `actualizar(analisis)` -> (analisis_suavizado, cambio)."""
+
+    def __init__(self, alfa=SUAVIZADO_ALFA, banda=SUAVIZADO_BANDA, confirmar=SUAVIZADO_CONFIRMAR):
+        self.alfa, self.banda, self.confirmar = alfa, banda, max(1, confirmar)
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.ema      = None
+            self.cubeta   = None
+            self.personas = None
+            self.genero   = None
+            self._contra_personas = 0
+            self._generos = deque(maxlen=2 * self.confirmar - 1)
+            self.analisis = self.cambios = self.filtrados = 0
+
+    def _cubeta(self, ema):
+        if self.cubeta is None:
+            return sum(ema >= l for l in LIMITES)
+        arriba = sum(ema - self.banda >= l for l in LIMITES)
+        if arriba > self.cubeta: return arriba
+        abajo = sum(ema + self.banda >= l for l in LIMITES)
+        if abajo < self.cubeta: return abajo
+        return self.cubeta
+
+    def _personas(self, hay):
+        if self.personas is None or hay == self.personas:
+            self._contra_personas = 0
+            return hay
+        self._contra_personas += 1
+        if self._contra_personas >= self.confirmar:
+            self._contra_personas = 0
+            return hay
+        return self.personas
+
+    def _genero(self, genero):
+        if genero: self._generos.append(genero)
+        if not self._generos: return self.genero
+        g, n = Counter(self._generos).most_common(1)[0]
+        if self.genero is None or (g != self.genero and n >= self.confirmar):
+            return g
+        return self.genero
+
+    def actualizar(self, analisis):
+        """
+        Devuelve una copia del análisis con nivel, hay_personas y género
+        suavizados (el crudo queda en "nivel_energia_crudo") y True si cambió
+        algo que justifique actuar ya: cubeta, presencia o género.
+        """
+        nivel = analisis.get("nivel_energia") or 5
+        alfa = self.alfa * (SUAVIZADO_PESO_LOCAL if analisis.get("fuente") == "local" else 1)
+        with self._lock:
+            self.analisis += 1
+            self.ema = nivel if self.ema is None else alfa * nivel + (1 - alfa) * self.ema
+            c = self._cubeta(self.ema)
+            hay = analisis.get("hay_personas")
+            # Sin dato de presencia (estimación local sin detector): se mantiene lo confirmado
+            personas = self._personas(bool(hay)) if hay is not None else \
+                       (True if self.personas is None else self.personas)
+            genero = self._genero(analisis.get("genero_recomendado"))
+
+            cambio = (c, personas, genero) != (self.cubeta, self.personas, self.genero)
+            self.cambios += cambio
+            self.filtrados += cubeta(nivel) != c
+            self.cubeta, self.personas, self.genero = c, personas, genero
+
+            bajo, alto = RANGOS[c]
+            suave = dict(analisis, nivel_energia=min(alto, max(bajo, round(self.ema))),
+                         nivel_energia_crudo=nivel, hay_personas=personas, genero_recomendado=genero)
+        if not personas:
+            suave.update(personas_bailando=False, personas_aburridas=False)
+        return suave, cambio
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ema": round(self.ema, 2) if self.ema is not None else None,
+                "cubeta": self.cubeta, "hay_personas": self.personas, "genero": self.genero,
+                "analisis": self.analisis, "cambios": self.cambios,
+                "filtrados": self.filtrados,   # análisis cuya cubeta cruda no se aplicó
+            }
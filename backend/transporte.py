@@ -0,0 +1,168 @@
+# transporte.py
+#
+# Socket.IO con dos modos de servidor (SERVIDOR_MODO):
+#   dev   Flask-SocketIO en modo threading sobre el servidor de Werkzeug
+#         (lo de siempre, con recarga y mensajes de depuración).
+#   asgi  python-socketio AsyncServer sobre asyncio, servido por uvicorn; las
+#         rutas HTTP de Flask van montadas detrás con a2wsgi (pool de hilos, así
+#         un /video_feed abierto no frena al resto).
+#
+# En modo asgi el resto del servidor no cambia: cámara, OpenCV, pools y
+# planificador siguen en hilos (un loop cooperativo se trabaría con cada
+# imencode o read de la cámara). Lo que cambia es el borde:
+#   - los handlers de Socket.IO corren en hilos con asyncio.to_thread,
+#   - cada emit desde un hilo se agenda en el loop y no espera al socket:
+#     cada cliente tiene su propia cola y su propia tarea de escritura,
+#   - a un cliente con la cola llena se le saltan los eventos de estado
+#     (el siguiente reemplaza al anterior); audio y respuestas siempre van.
+# Los bytes (JPEG, MP3) viajan como adjuntos binarios de Socket.IO, sin base64.
+#
+# app.py usa la misma superficie en los dos modos: crear(), socketio.on,
+# socketio.emit, emit, join_room, leave_room y sid_actual().
+
+import asyncio, inspect, os, threading
+
+# ---------- parámetros ajustables --------------
+SERVIDOR_MODO    = os.getenv("SERVIDOR_MODO", "dev")        # dev | asgi
+EMISION_MAX_COLA = int(os.getenv("EMISION_MAX_COLA", 64))   # paquetes en cola de un cliente antes de saltarle estado
+HTTP_HILOS       = int(os.getenv("HTTP_HILOS", 16))         # rutas Flask (incluye streams MJPEG) en modo asgi
+DESCARTABLES     = {"analysis_update"}                      # eventos de estado: el último es el que vale
+# -----------------------------------------------
+
+_puente = None               # PuenteAsgi en modo asgi
+_local  = threading.local()  # sid del handler que corre en este hilo (modo asgi)
+
+
+class PuenteAsgi:
+    """AsyncServer de python-socketio con la interfaz que app.py espera de Flask-SocketIO."""
+
+    def __init__(self, app_wsgi, cors="*"):
+        import socketio
+        from a2wsgi import WSGIMiddleware
+        self.sio  = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins=cors)
+        self.asgi = socketio.ASGIApp(self.sio, other_asgi_app=WSGIMiddleware(app_wsgi, workers=HTTP_HILOS),
+                                     on_startup=self._al_iniciar)
+        self._loop = None
+        self.emisiones = self.saltos = self.errores = 0
+
+    async def _al_iniciar(self):
+        self._loop = asyncio.get_running_loop()
+
+    # ------------------ handlers ------------------
+    def on(self, evento):
+        """Decorador: el handler síncrono de app.py corre en un hilo con su sid a mano."""
+        def registrar(fn):
+            async def manejador(sid, *args):
+                self._loop = self._loop or asyncio.get_running_loop()
+                # connect recibe (environ, auth) y disconnect el motivo: los handlers de app.py no los usan
+                datos = () if evento in ("connect", "disconnect") else args
+                # Lo que devuelve el handler vuelve al cliente como ack, como en Flask-SocketIO
+                return await asyncio.to_thread(self._correr, sid, fn, datos)
+            self.sio.on(evento, manejador)
+            return fn
+        return registrar
+
+    @staticmethod
+    def _correr(sid, fn, args):
+        _local.sid = sid
+        try:
+            return fn(*args)
+        finally:
+            _local.sid = None
+
+    # ------------------ emisión ------------------
+    def emit(self, evento, datos=None, to=None, callback=None, **kwargs):
+        """Desde cualquier hilo: se agenda en el loop y vuelve enseguida."""
+        if self._loop is None: return   # todavía no arrancó el servidor: no hay clientes
+        fut = asyncio.run_coroutine_threadsafe(self._emitir(evento, datos, to, callback, kwargs), self._loop)
+        fut.add_done_callback(self._revisar)
+
+    def _revisar(self, fut):
+        if fut.exception():
+            self.errores += 1
+            print(f"Error emitiendo por Socket.IO: {fut.exception()!r}")
+
+    async def _emitir(self, evento, datos, to, callback, kwargs):
+        saltar = self._lentos(to) if evento in DESCARTABLES and to is not None else []
+        self.emisiones += 1
+        self.saltos += len(saltar)
+        await self.sio.emit(evento, datos, to=to, skip_sid=saltar or None, callback=callback, **kwargs)
+
+    def _lentos(self, sala):
+        """sids de la sala con más de EMISION_MAX_COLA paquetes sin escribir."""
+        lentos = []
+        try:
+            for sid, eio_sid in self.sio.manager.get_participants("/", sala):
+                socket = self.sio.eio.sockets.get(eio_sid)
+                if socket is not None and socket.queue.qsize() > EMISION_MAX_COLA:
+                    lentos.append(sid)
+        except Exception:
+            return []   # internos de python-socketio que cambiaron: se emite a todos
+        return lentos
+
+    def _en_loop(self, fn, *args):
+        """Corre fn(*args) en el loop (await si hace falta) y espera el resultado."""
+        async def llamar():
+            r = fn(*args)
+            return await r if inspect.isawaitable(r) else r
+        return asyncio.run_coroutine_threadsafe(llamar(), self._loop).result(timeout=5)
+
+    # ------------------ rooms / servidor ------------------
+    def unir(self, sala):
+        self._en_loop(self.sio.enter_room, sid_actual(), sala)
+
+    def salir(self, sala):
+        self._en_loop(self.sio.leave_room, sid_actual(), sala)
+
+    def stats(self) -> dict:
+        return {"modo": "asgi", "emisiones": self.emisiones,
+                "saltos_cliente_lento": self.saltos, "errores": self.errores}
+
+    def run(self, app=None, host="0.0.0.0", port=5000, **_):
+        import uvicorn
+        uvicorn.run(self.asgi, host=host, port=port, log_level="warning")
+
+
+def crear(app, cors="*"):
+    """Servidor de Socket.IO del modo configurado."""
+    global _puente
+    if SERVIDOR_MODO == "asgi":
+        _puente = PuenteAsgi(app, cors)
+        return _puente
+    from flask_socketio import SocketIO
+    return SocketIO(app, cors_allowed_origins=cors)
+
+
+def asgi():
+    """Aplicación ASGI para `uvicorn app:asgi` (None en modo dev)."""
+    return _puente.asgi if _puente else None
+
+
+# ---- misma API que flask_socketio dentro de un handler ----
+def sid_actual():
+    if _puente: return _local.sid
+    from flask import request
+    return request.sid
+
+
+def emit(evento, datos=None, **kwargs):
+    """Responde solo al cliente del handler en curso."""
+    if _puente: return _puente.emit(evento, datos, to=sid_actual(), **kwargs)
+    from flask_socketio import emit as emit_flask
+    return emit_flask(evento, datos, **kwargs)
+
+
+def join_room(sala):
+    if _puente: return _puente.unir(sala)
+    from flask_socketio import join_room as unir
+    return unir(sala)
+
+
+def leave_room(sala):
+    if _puente: return _puente.salir(sala)
+    from flask_socketio import leave_room as salir
+    return salir(sala)
+
+
+def stats() -> dict:
+    return _puente.stats() if _puente else {"modo": SERVIDOR_MODO}